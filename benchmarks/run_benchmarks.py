@@ -0,0 +1,226 @@
+"""签到系统基准测试
+
+在临时目录中按规模（small / medium / semester，见 checkin.datagen）生成数据库，启动本地服务器，
+测量扫码签到（表单和批量接口）、管理页面、签到汇总、批量改状态、导出、二维码生成和打印文件
+等热点路径，结果写成 JSON，可与之前某次提交的结果比较并按阈值判定退化。
+
+用法：
+    python benchmarks/run_benchmarks.py --size small --output bench-small.json
+    python benchmarks/run_benchmarks.py --size medium --compare bench-old.json --threshold 0.2
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from checkin import database, datagen  # noqa: E402
+from checkin.checkinhandler import CheckinHandler  # noqa: E402
+from checkin.ratelimit import RateLimit  # noqa: E402
+from http.server import ThreadingHTTPServer  # noqa: E402
+
+SIZES = ("small", "medium", "semester")
+
+
+def build_database(size, seed=0):
+    """在当前目录按 datagen 规模配置生成 checkin.db，返回 (教室, 该教室班级学生)"""
+    datagen.generate_database(database.DATABASE_PATH, profile=size, seed=seed)
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    room, class_name = conn.execute(
+        'SELECT classroom_id, class_name FROM "checkin-temp" ORDER BY classroom_id LIMIT 1').fetchone()
+    students = conn.execute("SELECT student_id FROM students WHERE class_name = ? ORDER BY student_id",
+                            (class_name,)).fetchall()
+    course = conn.execute("SELECT course FROM checkin_records WHERE class_name = ? LIMIT 1", (class_name,)).fetchone()[0]
+    conn.execute("INSERT INTO checkin_windows (classroom_id, enabled) VALUES (?, 1)", (room,))
+    conn.commit()
+    conn.close()
+    return room, [s[0] for s in students], course
+
+
+def measure(func, repeat, warmup=2):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "n": len(samples),
+        "mean": statistics.fmean(samples),
+        "min": samples[0],
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+class Client:
+    """保持连接的 HTTP 客户端"""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def request(self, method, path, body=None, content_type="application/x-www-form-urlencoded"):
+        headers = {"Content-Type": content_type} if body is not None else {}
+        self.conn.request(method, path, body=body, headers=headers)
+        resp = self.conn.getresponse()
+        data = resp.read()
+        if resp.status >= 500:
+            raise RuntimeError(f"{method} {path} -> {resp.status}")
+        return resp.status, data
+
+
+def run(size, repeat, seed=0):
+    results = {}
+    room, students, course = build_database(size, seed)
+    handler = CheckinHandler.__new__(CheckinHandler)
+    # 基准测试从同一地址反复提交少量学号，关闭限流
+    RateLimit.enabled = False
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CheckinHandler)
+    CheckinHandler.log_message = lambda *args: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Client(server.server_address[1])
+    try:
+        counter = iter(range(10 ** 9))
+
+        def scan():
+            student_id = students[next(counter) % len(students)]
+            seat = next(counter) % 48 + 1
+            client.request("POST", f"/checkin/{room}/checkin-{seat:02d}.html",
+                           urllib.parse.urlencode({"student_id": student_id}))
+        results["scan_post"] = measure(scan, repeat * 5)
+
+        def scan_batch(size):
+            records = []
+            for _ in range(size):
+                n = next(counter)
+                records.append({"key": f"bench-{n}", "classroom_id": room, "seat": n % 48 + 1,
+                                "student_id": students[n % len(students)], "scanned_at": time.time()})
+            client.request("POST", "/checkin/scan/batch", json.dumps(records), content_type="application/json")
+        # 签到页面每次提交一条；教室中继设备或离线缓存一次补交多条
+        results["scan_batch"] = measure(lambda: scan_batch(1), repeat * 5)
+        results["scan_batch_50"] = measure(lambda: scan_batch(50), repeat)
+
+        results["admin_table_html"] = measure(lambda: handler._build_table_html(room), repeat)
+        results["admin_page"] = measure(lambda: client.request("GET", f"/checkin/{room}/admin.html"), repeat)
+        results["checkin_summary"] = measure(lambda: database.get_checkin_summary_by_course(course), repeat)
+
+        form = {}
+        for seat, student_id in enumerate(students, start=1):
+            form[f"status_{student_id}"] = "已签" if seat <= 48 else "缺勤"
+            form[f"seat_{student_id}"] = str(seat) if seat <= 48 else "-"
+        update_body = urllib.parse.urlencode(form)
+        results["update_student_status"] = measure(
+            lambda: client.request("POST", f"/checkin/{room}/update-student-status", update_body), repeat)
+
+        summary = database.get_checkin_summary_by_course(course)[:10]
+        export_body = urllib.parse.urlencode({"export_record": [str(r["session_id"]) for r in summary]}, doseq=True)
+        results["export_record"] = measure(
+            lambda: client.request("POST", "/checkin/export-record", export_body), repeat)
+
+        try:
+            from checkin.qrcode_utils import generate_qr_codes, generate_latex_file, compile_latex_to_pdf
+            results["generate_qr_codes"] = measure(lambda: generate_qr_codes(handler, room), max(1, repeat // 10), warmup=0)
+            results["generate_latex_file"] = measure(lambda: generate_latex_file(handler, room), repeat)
+            if shutil.which("pdflatex"):
+                tex_file = generate_latex_file(handler, room)
+                results["compile_latex_to_pdf"] = measure(lambda: compile_latex_to_pdf(tex_file), 1, warmup=0)
+        except ImportError as e:
+            print(f"skip QR benchmarks: {e}")
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(current, baseline, threshold):
+    """按 p50 比较，返回退化的基准名列表"""
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        old = baseline.get("results", {}).get(name)
+        if not old or not old["p50"]:
+            print(f"{name:28s} {result['p50'] * 1000:10.3f} ms   (no baseline)")
+            continue
+        ratio = result["p50"] / old["p50"]
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:28s} {result['p50'] * 1000:10.3f} ms   {old['p50'] * 1000:10.3f} ms   x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run check-in benchmarks against a generated database.")
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--repeat", type=int, default=20, help="Iterations per benchmark (default: 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed p50 slowdown ratio before flagging a regression (default: 0.2)")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="checkin-bench-")
+    os.chdir(workdir)
+    try:
+        results = run(args.size, args.repeat, args.seed)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "size": args.size,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("size") != args.size:
+            print("warning: baseline was recorded with a different --size")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for name, result in sorted(results.items()):
+            print(f"{name:28s} p50 {result['p50'] * 1000:10.3f} ms   p95 {result['p95'] * 1000:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,19 @@
-from . import server
 from typing import Optional
 
-def checkin_server(host: str = "127.0.0.1", port: int = 8000, config: Optional[str] = None):
+def checkin_server(host: str = "127.0.0.1", port: int = 8000, config: Optional[str] = None,
+                   prune_classrooms: bool = False,
+                   profile_rate: Optional[float] = None, maintenance_window: Optional[str] = None,
+                   backup_interval: Optional[float] = None, backup_keep: int = 14,
+                   rate_limit: bool = True, trusted_proxies: Optional[str] = None,
+                   max_active: int = 16, prewarm: bool = True):
     """Start the checkin HTTP server (blocking)."""
-    return server.run_server(host=host, port=port, room_info_path=config)
\ No newline at end of file
+    # 延迟导入服务器模块，gen-data / archive 等子命令不需要加载整个 Web 服务
+    from . import server
+    from .startup import startup
+    startup.mark("import server modules")
+    return server.run_server(host=host, port=port, room_info_path=config,
+                             prune_classrooms=prune_classrooms, profile_rate=profile_rate,
+                             maintenance_window=maintenance_window,
+                             backup_interval=backup_interval, backup_keep=backup_keep,
+                             rate_limit=rate_limit, trusted_proxies=trusted_proxies, max_active=max_active,
+                             prewarm=prewarm)
\ No newline at end of file
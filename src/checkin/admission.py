@@ -0,0 +1,101 @@
+import collections
+import threading
+
+from .metrics import metrics
+
+# 优先级：数值越小越先处理
+PRIORITY_SCAN = 0    # 学生扫码
+PRIORITY_ADMIN = 1   # 管理页面
+PRIORITY_BULK = 2    # 导出、二维码、打印文件、名单导入等耗时任务
+PRIORITY_NAMES = {PRIORITY_SCAN: "scan", PRIORITY_ADMIN: "admin", PRIORITY_BULK: "bulk"}
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    """有界、分优先级的准入队列
+
+    同时处理的请求数不超过 max_active，其中耗时任务不超过 max_bulk。超出时请求按
+    优先级排队，每个优先级的队列长度和最长等待时间都有上限；队列已满或等待超时
+    立即拒绝，由调用方返回 503，避免请求堆积到手机端超时后再重试。
+    """
+
+    def __init__(self, max_active=16, max_bulk=2, max_queue=None, max_wait=None):
+        self.max_active = max_active
+        self.max_bulk = max_bulk
+        self.max_queue = max_queue or {PRIORITY_SCAN: 512, PRIORITY_ADMIN: 64, PRIORITY_BULK: 8}
+        self.max_wait = max_wait or {PRIORITY_SCAN: 3.0, PRIORITY_ADMIN: 5.0, PRIORITY_BULK: 10.0}
+        self._lock = threading.Lock()
+        self._queues = {p: collections.deque() for p in PRIORITY_NAMES}
+        self._active = 0
+        self._bulk = 0
+
+    def _can_run(self, priority):
+        return self._active < self.max_active and (priority != PRIORITY_BULK or self._bulk < self.max_bulk)
+
+    def _take(self, priority):
+        self._active += 1
+        if priority == PRIORITY_BULK:
+            self._bulk += 1
+        metrics.set_gauge("checkin_admission_active", self._active)
+
+    def _update_depth(self, priority):
+        metrics.set_gauge("checkin_admission_queue_depth", len(self._queues[priority]),
+                          priority=PRIORITY_NAMES[priority])
+
+    def _shed(self, priority, reason):
+        metrics.inc("checkin_admission_shed_total", priority=PRIORITY_NAMES[priority], reason=reason)
+
+    def acquire(self, priority):
+        """获取处理名额，成功返回 True；被拒绝返回 False（不需要 release）"""
+        with self._lock:
+            if not self._queues[priority] and self._can_run(priority):
+                self._take(priority)
+                return True
+            if len(self._queues[priority]) >= self.max_queue[priority]:
+                self._shed(priority, "queue_full")
+                return False
+            waiter = _Waiter()
+            self._queues[priority].append(waiter)
+            self._update_depth(priority)
+
+        waiter.event.wait(self.max_wait[priority])
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queues[priority].remove(waiter)
+            self._update_depth(priority)
+            self._shed(priority, "timeout")
+            return False
+
+    def release(self, priority):
+        with self._lock:
+            self._active -= 1
+            if priority == PRIORITY_BULK:
+                self._bulk -= 1
+            # 按优先级把空出来的名额交给排队中的请求
+            for p in sorted(self._queues):
+                queue = self._queues[p]
+                while queue and self._can_run(p):
+                    waiter = queue.popleft()
+                    waiter.granted = True
+                    self._take(p)
+                    waiter.event.set()
+                self._update_depth(p)
+                if self._active >= self.max_active:
+                    break
+            metrics.set_gauge("checkin_admission_active", self._active)
+
+    def retry_after(self, priority):
+        """被拒绝时建议客户端等待的秒数"""
+        return "1" if priority == PRIORITY_SCAN else "5"
+
+
+# 进程内共享的准入控制器，由 run_server 配置
+admission = AdmissionController()
@@ -0,0 +1,323 @@
+import array
+import datetime
+import json
+import lzma
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+
+from . import database
+
+ARCHIVE_DIR = os.path.join("data", "archive")
+MANIFEST_NAME = "manifest.json"
+# 归档文件中保存的列（与 checkin 表一致，去掉自增 id）
+COLUMNS = ("student_id", "status", "save_time", "class_name", "name", "course", "classroom_id")
+_MAGIC = b"CKAR1"
+# 学期名用作文件名，只允许字母、数字和 _ . -
+_TERM_RE = re.compile(r"[A-Za-z0-9_.-]+")
+
+
+def _manifest_path(archive_dir):
+    return os.path.join(archive_dir, MANIFEST_NAME)
+
+
+def load_manifest(archive_dir=ARCHIVE_DIR):
+    """读取归档清单：{"terms": {term: {...}}}"""
+    try:
+        with open(_manifest_path(archive_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"terms": {}}
+
+
+def _write_manifest(manifest, archive_dir):
+    tmp = _manifest_path(archive_dir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, _manifest_path(archive_dir))
+
+
+def encode_columns(rows, columns=COLUMNS):
+    """列式编码：每列做字典编码，编码值存为紧凑整数数组，整体用 xz 压缩"""
+    header = {"rows": len(rows), "byteorder": sys.byteorder, "columns": []}
+    blobs = []
+    for i, name in enumerate(columns):
+        values = [r[i] for r in rows]
+        dictionary = sorted(set(values), key=lambda v: (v is None, "" if v is None else str(v)))
+        index = {v: n for n, v in enumerate(dictionary)}
+        typecode = "B" if len(dictionary) <= 0xFF else "H" if len(dictionary) <= 0xFFFF else "I"
+        codes = array.array(typecode, (index[v] for v in values))
+        blob = codes.tobytes()
+        header["columns"].append({"name": name, "dictionary": dictionary, "typecode": typecode, "bytes": len(blob)})
+        blobs.append(blob)
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return _MAGIC + lzma.compress(struct.pack("<I", len(head)) + head + b"".join(blobs))
+
+
+def decode_columns(data):
+    """解码为 {列名: (字典, 编码数组)}"""
+    if not data.startswith(_MAGIC):
+        raise ValueError("不是有效的归档文件")
+    raw = lzma.decompress(data[len(_MAGIC):])
+    (head_len,) = struct.unpack_from("<I", raw)
+    header = json.loads(raw[4:4 + head_len].decode("utf-8"))
+    offset = 4 + head_len
+    columns = {}
+    for col in header["columns"]:
+        codes = array.array(col["typecode"])
+        codes.frombytes(raw[offset:offset + col["bytes"]])
+        if header["byteorder"] != sys.byteorder:
+            codes.byteswap()
+        offset += col["bytes"]
+        columns[col["name"]] = (col["dictionary"], codes)
+    return header["rows"], columns
+
+
+class ArchivedTerm:
+    """一个已归档学期的列式数据"""
+
+    def __init__(self, term, path):
+        self.term = term
+        with open(path, "rb") as f:
+            self.rows, self.columns = decode_columns(f.read())
+
+    def select(self, **equals):
+        """按列等值过滤，返回行号列表（先在字典中查到编码，再扫描整数数组）"""
+        matches = None
+        for name, value in equals.items():
+            dictionary, codes = self.columns[name]
+            try:
+                code = dictionary.index(value)
+            except ValueError:
+                return []
+            if matches is None:
+                matches = [i for i, c in enumerate(codes) if c == code]
+            else:
+                matches = [i for i in matches if codes[i] == code]
+        return list(range(self.rows)) if matches is None else matches
+
+    def value(self, name, i):
+        dictionary, codes = self.columns[name]
+        return dictionary[codes[i]]
+
+
+class ArchiveStore:
+    """归档读取入口：按清单加载学期文件并缓存"""
+
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def terms(self):
+        # 尚未完成的归档（pending）数据仍在数据库中，不参与查询
+        return {term: entry for term, entry in load_manifest(self.archive_dir)["terms"].items()
+                if not entry.get("pending")}
+
+    def load(self, term):
+        entry = self.terms().get(term)
+        if entry is None:
+            raise KeyError(term)
+        with self._lock:
+            cached = self._cache.get(term)
+            if cached is None or cached[0] != entry["file"]:
+                cached = (entry["file"], ArchivedTerm(term, os.path.join(self.archive_dir, entry["file"])))
+                self._cache[term] = cached
+            return cached[1]
+
+    def terms_for_course(self, course):
+        return [t for t, entry in sorted(self.terms().items()) if course in entry.get("courses", [])]
+
+    def term_for_time(self, save_time):
+        for term, entry in self.terms().items():
+            if entry["start"] <= save_time < entry["end"]:
+                return term
+        return None
+
+    def summary_rows(self, course):
+        """按 (save_time, classroom_id, class_name) 汇总指定课程各状态人数"""
+        groups = {}
+        for term in self.terms_for_course(course):
+            data = self.load(term)
+            for i in data.select(course=course):
+                key = (data.value("save_time", i), data.value("classroom_id", i), data.value("class_name", i))
+                counts = groups.setdefault(key, {})
+                status = data.value("status", i)
+                counts[status] = counts.get(status, 0) + 1
+        return groups
+
+    def records(self, course, save_time, classroom_id):
+        term = self.term_for_time(save_time)
+        if term is None:
+            return []
+        data = self.load(term)
+        rows = [
+            {"student_id": data.value("student_id", i), "name": data.value("name", i),
+             "status": data.value("status", i), "seat": None}
+            for i in data.select(course=course, save_time=save_time, classroom_id=classroom_id)
+        ]
+        rows.sort(key=lambda r: r["name"])
+        return rows
+
+
+# 进程内共享的归档读取器
+archive_store = ArchiveStore()
+
+
+def _saved_range(conn, start, end):
+    # start / end 为本地时间，换算为 sessions.saved_at 的 epoch 秒后走索引
+    return conn.execute(
+        "SELECT CAST(strftime('%s', ?, 'utc') AS INTEGER), CAST(strftime('%s', ?, 'utc') AS INTEGER)",
+        (start, end)).fetchone()
+
+
+def recover_pending_terms(archive_dir=ARCHIVE_DIR, db_path=None, discard=True):
+    """处理上次归档中断留下的 pending 清单项，返回 {学期: "completed" / "discarded"}
+
+    数据库中该学期的课次已经删除时说明删除已提交，把清单项标记为完成；课次仍在时说明删除
+    没有提交，discard 为 True 时删除清单项和归档文件（服务器启动时传 False，避免误删另一个
+    进程中正在进行的归档）。
+    """
+    manifest = load_manifest(archive_dir)
+    pending = {term: entry for term, entry in manifest["terms"].items() if entry.get("pending")}
+    if not pending:
+        return {}
+    recovered = {}
+    conn = sqlite3.connect(db_path or database.DATABASE_PATH)
+    try:
+        for term, entry in pending.items():
+            remaining = conn.execute("SELECT COUNT(*) FROM sessions WHERE saved_at >= ? AND saved_at < ?",
+                                     _saved_range(conn, entry["start"], entry["end"])).fetchone()[0]
+            if not remaining:
+                del entry["pending"]
+                recovered[term] = "completed"
+            elif discard:
+                del manifest["terms"][term]
+                try:
+                    os.remove(os.path.join(archive_dir, entry["file"]))
+                except FileNotFoundError:
+                    pass
+                recovered[term] = "discarded"
+    finally:
+        conn.close()
+    if recovered:
+        _write_manifest(manifest, archive_dir)
+    return recovered
+
+
+def archive_term(term, start, end, archive_dir=ARCHIVE_DIR, db_path=None, vacuum=False):
+    """把 save_time 在 [start, end) 内的签到记录移出数据库（checkin 和 sessions），写入压缩列式文件
+
+    在读事务中读出记录，在写锁之外编码并写入文件，清单中先登记为 pending；再在一个写事务中
+    确认记录没有变化后删除，提交后把清单项标记为完成。中途崩溃留下的 pending 项由
+    recover_pending_terms 处理（下次归档或服务器启动时）。返回归档的行数。
+    """
+    if not _TERM_RE.fullmatch(term or ""):
+        raise ValueError("学期名只能包含字母、数字和 _ . -")
+    db_path = db_path or database.DATABASE_PATH
+    if end > datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"):
+        raise ValueError("只能归档已经结束的学期")
+    recover_pending_terms(archive_dir, db_path)
+    manifest = load_manifest(archive_dir)
+    if term in manifest["terms"]:
+        raise ValueError(f"学期 {term} 已归档")
+    for other, entry in manifest["terms"].items():
+        if start < entry["end"] and entry["start"] < end:
+            raise ValueError(f"时间范围与已归档学期 {other} 重叠")
+
+    sessions = "SELECT id FROM sessions WHERE saved_at >= ? AND saved_at < ?"
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # 1. 读事务：同一快照中读出记录和课次，不占用写锁
+        conn.execute("BEGIN")
+        saved_range = _saved_range(conn, start, end)
+        rows = conn.execute(f"""
+            SELECT {", ".join(COLUMNS)} FROM checkin_records
+            WHERE saved_at >= ? AND saved_at < ?
+            ORDER BY saved_at, classroom_id, student_id
+        """, saved_range).fetchall()
+        session_ids = sorted(r[0] for r in conn.execute(sessions, saved_range))
+        conn.execute("COMMIT")
+        if not rows:
+            return 0
+
+        # 2. 编码和写文件在写锁之外进行，不阻塞扫码写入；清单中先登记为 pending
+        os.makedirs(archive_dir, exist_ok=True)
+        filename = f"{term}.ckar"
+        path = os.path.join(archive_dir, filename)
+        with open(path + ".tmp", "wb") as f:
+            f.write(encode_columns(rows))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        manifest["terms"][term] = {
+            "file": filename,
+            "start": start,
+            "end": end,
+            "rows": len(rows),
+            "bytes": os.path.getsize(path),
+            "courses": sorted({r[COLUMNS.index("course")] for r in rows if r[COLUMNS.index("course")]}),
+            "archived_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "pending": True,
+        }
+        _write_manifest(manifest, archive_dir)
+
+        # 3. 写事务：确认读出之后记录没有变化，再删除
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            current_ids = sorted(r[0] for r in conn.execute(sessions, saved_range))
+            current_rows = conn.execute(
+                f"SELECT COUNT(*) FROM checkin WHERE session_id IN ({sessions})", saved_range).fetchone()[0]
+            if current_ids != session_ids or current_rows != len(rows):
+                raise ValueError("归档期间签到记录发生了变化，请重新运行")
+            conn.execute(f"DELETE FROM checkin WHERE session_id IN ({sessions})", saved_range)
+            conn.execute(f"DELETE FROM sessions WHERE id IN ({sessions})", saved_range)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            del manifest["terms"][term]
+            _write_manifest(manifest, archive_dir)
+            os.remove(path)
+            raise
+    finally:
+        conn.close()
+
+    # 4. 删除已提交，清单项标记为完成
+    del manifest["terms"][term]["pending"]
+    _write_manifest(manifest, archive_dir)
+
+    if vacuum:
+        conn = sqlite3.connect(db_path)
+        conn.execute("VACUUM")
+        conn.close()
+    return len(rows)
+
+
+def add_arguments(parser):
+    parser.add_argument("--term", help="Term name, e.g. 2025-autumn")
+    parser.add_argument("--start", help="First save_time included, e.g. 2025-09-01")
+    parser.add_argument("--end", help="First save_time excluded, e.g. 2026-02-01")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help=f"Archive directory (default: {ARCHIVE_DIR})")
+    parser.add_argument("--db", default=None, help="Database path (default: checkin.db)")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database afterwards to reclaim space")
+    parser.add_argument("--list", action="store_true", help="List archived terms and exit")
+
+
+def main(args):
+    if args.list:
+        for term, status in recover_pending_terms(args.archive_dir, args.db).items():
+            print(f"{term}: interrupted archive {status}")
+        for term, entry in sorted(load_manifest(args.archive_dir)["terms"].items()):
+            print(f"{term}: {entry['start']} ~ {entry['end']}, {entry['rows']} rows, {entry['bytes']} bytes")
+        return
+    if not (args.term and args.start and args.end):
+        raise SystemExit("--term, --start and --end are required")
+    count = archive_term(args.term, args.start, args.end, archive_dir=args.archive_dir,
+                         db_path=args.db, vacuum=args.vacuum)
+    print(f"Archived {count} checkin rows into term {args.term}")
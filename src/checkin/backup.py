@@ -0,0 +1,213 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from . import database
+from .metrics import metrics
+
+BACKUP_DIR = os.path.join("data", "backups")
+MANIFEST_NAME = "manifest.json"
+# 每步复制的页数和步间休眠：小步复制，把数据库锁和磁盘 I/O 让给扫码写入
+BACKUP_PAGES = 64
+BACKUP_SLEEP = 0.02
+# 复制过程中源库被其他连接修改会导致备份从头开始，超过该次数后改为一次性复制
+MAX_RESTARTS = 3
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _manifest_path(backup_dir):
+    return os.path.join(backup_dir, MANIFEST_NAME)
+
+
+def load_manifest(backup_dir=BACKUP_DIR):
+    """读取备份清单：{"backups": [{"file", "sha256", "bytes", "created_at", ...}]}，按时间先后排列"""
+    try:
+        with open(_manifest_path(backup_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"backups": []}
+
+
+def _write_manifest(manifest, backup_dir):
+    tmp = _manifest_path(backup_dir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, _manifest_path(backup_dir))
+
+
+def _online_copy(db_path, target_path, pages, sleep):
+    """用 SQLite 在线备份 API 分步复制，返回重试次数"""
+    restarts = 0
+    while True:
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(target_path)
+        last = [None]
+
+        def progress(status, remaining, total):
+            # remaining 变大说明源库被修改、备份重新开始
+            if last[0] is not None and remaining > last[0]:
+                raise _Restarted()
+            last[0] = remaining
+
+        try:
+            if restarts < MAX_RESTARTS:
+                src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+            else:
+                # WAL 模式下一次性复制只持有读快照，不阻塞写入
+                src.backup(dst, pages=-1)
+            return restarts
+        except _Restarted:
+            restarts += 1
+        finally:
+            dst.close()
+            src.close()
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def backup_database(backup_dir=BACKUP_DIR, db_path=None, keep=14, compress=True,
+                    pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """在线备份数据库到 backup_dir
+
+    内容与上一份备份相同时不保留新文件；保留最新的 keep 份备份。
+    返回本次备份的清单项，未变化时返回 None。
+    """
+    db_path = db_path or database.DATABASE_PATH
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    tmp_path = os.path.join(backup_dir, f".checkin-{stamp}.db.tmp")
+    start = time.perf_counter()
+    try:
+        restarts = _online_copy(db_path, tmp_path, pages, sleep)
+        sha256 = _sha256(tmp_path)
+        manifest = load_manifest(backup_dir)
+        if manifest["backups"] and manifest["backups"][-1]["sha256"] == sha256:
+            return None
+
+        filename = f"checkin-{stamp}.db" + (".gz" if compress else "")
+        n = 1
+        while os.path.exists(os.path.join(backup_dir, filename)):
+            filename = f"checkin-{stamp}-{n}.db" + (".gz" if compress else "")
+            n += 1
+        path = os.path.join(backup_dir, filename)
+        if compress:
+            with open(tmp_path, "rb") as src, gzip.open(path + ".tmp", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.replace(path + ".tmp", path)
+        else:
+            os.replace(tmp_path, path)
+        entry = {
+            "file": filename,
+            "sha256": sha256,
+            "bytes": os.path.getsize(path),
+            "db_bytes": os.path.getsize(tmp_path) if compress else os.path.getsize(path),
+            "restarts": restarts,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        manifest["backups"].append(entry)
+        for old in manifest["backups"][:-keep] if keep > 0 else []:
+            try:
+                os.remove(os.path.join(backup_dir, old["file"]))
+            except FileNotFoundError:
+                pass
+        if keep > 0:
+            manifest["backups"] = manifest["backups"][-keep:]
+        _write_manifest(manifest, backup_dir)
+        return entry
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        metrics.observe("checkin_job_duration_seconds", time.perf_counter() - start, job="backup")
+
+
+class BackupScheduler:
+    """按固定间隔在后台线程中备份数据库，由时间轮驱动"""
+
+    def __init__(self, backup_dir=BACKUP_DIR, interval_hours=None, keep=14, compress=True):
+        self.backup_dir = backup_dir
+        self.interval = interval_hours * 3600 if interval_hours else None
+        self.keep = keep
+        self.compress = compress
+        self.last_result = None
+        self._running = threading.Lock()
+        self._wheel = None
+
+    def start(self, wheel):
+        if not self.interval:
+            return
+        self._wheel = wheel
+        self._wheel.schedule(self.interval, self._tick)
+
+    def _tick(self):
+        try:
+            self.run_async()
+        finally:
+            self._wheel.schedule(self.interval, self._tick)
+
+    def run_async(self):
+        """在后台线程中开始一次备份，已有备份在运行时返回 False"""
+        if self._running.locked():
+            return False
+        threading.Thread(target=self.run, name="checkin-backup", daemon=True).start()
+        return True
+
+    def run(self):
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            entry = backup_database(self.backup_dir, keep=self.keep, compress=self.compress)
+            self.last_result = entry["file"] if entry else "数据库未变化，未生成新备份"
+            return entry
+        except Exception as e:
+            self.last_result = f"失败: {e}"
+            print(f"[backup] {self.last_result}")
+        finally:
+            self._running.release()
+
+    @property
+    def running(self):
+        return self._running.locked()
+
+
+# 进程内共享的备份调度器，由 run_server 配置并启动
+backups = BackupScheduler()
+
+
+def add_arguments(parser):
+    parser.add_argument("--db", default=None, help="Database path (default: checkin.db)")
+    parser.add_argument("--backup-dir", default=BACKUP_DIR, help=f"Backup directory (default: {BACKUP_DIR})")
+    parser.add_argument("--keep", type=int, default=14, help="Number of backups to keep (default: 14, 0 = all)")
+    parser.add_argument("--no-compress", action="store_true", help="Store the backup as a plain .db file")
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES,
+                        help=f"Pages copied per step (default: {BACKUP_PAGES}, -1 = all at once)")
+    parser.add_argument("--sleep", type=float, default=BACKUP_SLEEP,
+                        help=f"Seconds to sleep between steps (default: {BACKUP_SLEEP})")
+    parser.add_argument("--list", action="store_true", help="List backups and exit")
+
+
+def main(args):
+    if args.list:
+        for entry in load_manifest(args.backup_dir)["backups"]:
+            print(f"{entry['created_at']}  {entry['file']}  {entry['bytes']} bytes")
+        return
+    entry = backup_database(args.backup_dir, db_path=args.db, keep=args.keep, compress=not args.no_compress,
+                            pages=args.pages, sleep=args.sleep)
+    if entry is None:
+        print("Database unchanged since the last backup, nothing written")
+    else:
+        print(f"Backed up to {os.path.join(args.backup_dir, entry['file'])} ({entry['bytes']} bytes)")
@@ -3,8 +3,11 @@ from http.server import BaseHTTPRequestHandler
 import json
 import os
 import re
+import threading
+import time
 import urllib.parse
 import datetime
+from html import escape as html_escape
 from .database import (
     get_all_classrooms,
     add_classroom,
@@ -20,9 +23,16 @@ from .database import (
     delete_checkin_record,
     get_checkin_summary_by_course,
     clear_temp_checkins,
-    add_temp_checkin,
+    claim_temp_seat,
     get_checkin_records_by_save_time,
-    save_checkin_records
+    save_checkin_records,
+    ping_database,
+    get_campus_overview,
+    search_checkin_records,
+    update_temp_checkins,
+    get_sessions_with_records,
+    connect_reporting,
+    STATUS_LABELS
 )
 import sqlite3
 from .qrcode_utils import (
@@ -30,12 +40,82 @@ from .qrcode_utils import (
     generate_latex_file,
     compile_latex_to_pdf
 )
+from .admission import admission, PRIORITY_ADMIN, PRIORITY_BULK, PRIORITY_SCAN
+from .backup import backups, load_manifest as load_backup_manifest
+from .history import student_history
+from .ingest import BatchError, apply_scan_batch, parse_batch
+from .maintenance import maintenance
+from .metrics import metrics
+from .occupancy import occupancy
+from .profiling import profiler, PROFILE_DIR
+from .provision import room_config
+from .ratelimit import RateLimit, client_ip, retry_after
+from .router import Router
+from .search import student_index
+from .windows import checkin_windows
+
+# 路由表：do_GET / do_POST 按方法 + 路径段分派到下方的处理函数
+router = Router()
+
+# 学生扫码请求只有一个学号字段，请求体上限设得很小
+SCAN_MAX_BODY = 4 * 1024
+SCAN_CONTENT_TYPES = ("application/x-www-form-urlencoded", "application/json")
+# 批量扫码（教室中继或离线队列）一次最多 500 条记录
+SCAN_BATCH_MAX_BODY = 128 * 1024
+SCAN_BATCH_CONTENT_TYPES = ("application/json", "application/x-ndjson")
+# 名单 CSV 通过 multipart 上传
+IMPORT_MAX_BODY = 10 * 1024 * 1024
+
+
+def _scan_student_id(handler, params=None):
+    """从扫码请求体（表单或 JSON）中取出学号"""
+    body = handler._read_body()
+    if 'application/json' in handler.headers.get('Content-Type', ''):
+        try:
+            data = json.loads(body.decode('utf-8'))
+            return data.get('student_id') or data.get('user_id')
+        except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+            return None
+    try:
+        return urllib.parse.parse_qs(body.decode('utf-8')).get('student_id', [None])[0]
+    except Exception:
+        return None
+
+
+# 扫码限流：同一学号 10 秒补充 1 次、可连续提交 3 次；
+# 同一 IP 的额度较大，因为校园网内大量手机可能共用一个出口地址。
+# 额度可用环境变量 CHECKIN_RATE_LIMIT_SCAN_STUDENT / _SCAN_IP / _SEARCH_IP 覆盖
+SCAN_STUDENT_LIMIT = RateLimit("student", rate=0.1, burst=3, key=_scan_student_id, setting="scan_student")
+SCAN_IP_LIMIT = RateLimit("ip", rate=20, burst=100, key=client_ip, setting="scan_ip")
+SCAN_RATE_LIMITS = (SCAN_STUDENT_LIMIT, SCAN_IP_LIMIT)
+# 批量扫码在路由上只按 IP 限流，学号限流在逐条处理时进行，与单条扫码共用额度
+SCAN_BATCH_RATE_LIMITS = (SCAN_IP_LIMIT,)
+# 名单搜索随输入频繁请求，按 IP 限流
+SEARCH_RATE_LIMITS = (
+    RateLimit("ip", rate=10, burst=30, key=client_ip, setting="search_ip"),
+)
+
+
+def _record_request(route, handler, elapsed):
+    """路由耗时钩子：按路由统计请求数与延迟"""
+    metrics.inc("checkin_http_requests_total", route=route.name, method=route.method,
+                status=getattr(handler, '_status', 0))
+    metrics.observe("checkin_http_request_duration_seconds", elapsed, route=route.name)
+
+
+router.add_hook(_record_request)
 
 class CheckinHandler(BaseHTTPRequestHandler):
     public_ip = "127.0.0.1"  # 将作为实例属性或通过 run_server 设置
 
-    # 全局签到状态字典：classroom_id -> bool (True=允许签到)
-    checkin_enabled = {}
+    # 使用 HTTP/1.1 持久连接，所有响应都必须带 Content-Length
+    protocol_version = "HTTP/1.1"
+    # 空闲连接超时（秒），超时后由 StreamRequestHandler 关闭 socket
+    timeout = 15
+    # 响应头与响应体合并在缓冲区中一次发出（handle_one_request 结束时 flush），
+    # 并关闭 Nagle，避免持久连接上小包与延迟 ACK 叠加出约 40ms 的停顿
+    wbufsize = -1
+    disable_nagle_algorithm = True
 
     # 内联 admin 页面模板（不再使用外部文件）
     _admin_template = '''<!DOCTYPE html>
@@ -157,10 +237,20 @@ class CheckinHandler(BaseHTTPRequestHandler):
       <input type="text" id="course" name="course" required>
     </div>
     <button type="submit" class="btn">保存</button>
+    <label><input type="checkbox" name="include_archived" value="1"> 包含已归档学期</label>
     <button type="submit" class="btn btn-record" formaction="/checkin/{classroom_id}/view-records">签到记录</button>
   </form>
 
   {control_buttons}
+  <form method="POST" action="/checkin/{classroom_id}/schedule-checkin">
+    <div class="form-group">
+      <label>每日自动开始:</label>
+      <input type="time" name="open_time" value="{open_time}">
+      <label>自动结束:</label>
+      <input type="time" name="close_time" value="{close_time}">
+    </div>
+    <button type="submit" class="btn">保存签到时间表</button>
+  </form>
   <!-- 添加新按钮 -->
   <form method="GET" action="/checkin/{classroom_id}/view-by-student">
     <button type="submit" class="btn btn-view">按学号查看签到情况</button>
@@ -176,7 +266,8 @@ class CheckinHandler(BaseHTTPRequestHandler):
     def _render_admin(self, table_html='', classroom_id=''):
         """动态生成 admin 页面"""
         # 判断签到状态
-        is_checkin_active = CheckinHandler.checkin_enabled.get(classroom_id, False)
+        window = checkin_windows.get(classroom_id)
+        is_checkin_active = window["enabled"]
         status_text = "正在签到..." if is_checkin_active else "未开始签到"
         
         # 生成控制按钮
@@ -196,10 +287,40 @@ class CheckinHandler(BaseHTTPRequestHandler):
             table_html=table_html,
             classroom_id=classroom_id,
             status_text=status_text,
-            control_buttons=control_buttons
+            control_buttons=control_buttons,
+            open_time=window["open_time"] or "",
+            close_time=window["close_time"] or ""
         )
         return html.encode('utf-8')
 
+    def send_response(self, code, message=None):
+        self._status = code  # 供指标统计使用
+        super().send_response(code, message)
+
+    def _send_body(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+        """发送完整响应（带 Content-Length，便于连接复用）"""
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_redirect(self, location, status=302):
+        """发送无响应体的重定向"""
+        self.send_response(status)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _read_body(self):
+        """读取并缓存请求体；持久连接下未读完的请求体会污染下一个请求"""
+        if getattr(self, '_body', None) is None:
+            content_length = int(self.headers.get('Content-Length', 0) or 0)
+            self._body = self.rfile.read(content_length) if content_length > 0 else b''
+        return self._body
+
     def _render_form(self, message=''):
         try:
             html_content = importlib.resources.read_text('checkin', 'checkin.html', encoding='utf-8')
@@ -220,12 +341,9 @@ class CheckinHandler(BaseHTTPRequestHandler):
 
     def _get_room_config(self, classroom_id):
         """从数据库获取教室信息"""
-        print(f"[DEBUG] Looking for classroom_id: {classroom_id}")
         result = get_classroom_by_id(classroom_id)
         if result:
-            print(f"[DEBUG] Found room config: {result}")
             return result
-        print(f"[DEBUG] Classroom {classroom_id} not found")
         return (None, None, None)
 
     def _build_table_html(self, classroom_id):
@@ -263,125 +381,270 @@ class CheckinHandler(BaseHTTPRequestHandler):
         return table_html
     
     def do_GET(self):
-        path = urllib.parse.urlparse(self.path).path
-
-        # ✅ 修改路由: /checkin/manage.html
-        if path == "/checkin/manage.html":
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(self._render_manage())
-            return
+        self._dispatch("GET")
 
-        # 新增：提供 qrcode 目录下的静态文件（PDF/PNG）
-        qr_match = re.match(r'^/checkin/(\d{3,4})/qrcode/(.+)$', path)
-        if qr_match:
-            classroom_id = qr_match.group(1)
-            filename = qr_match.group(2)
-            
-            # 安全校验：只允许 .pdf 和 .png
-            if not (filename.endswith('.pdf') or filename.endswith('.png')):
-                self.send_response(403)
-                self.end_headers()
-                self.wfile.write(b"Forbidden: Invalid file type")
-                return
+    def do_POST(self):
+        self._dispatch("POST")
 
-            file_path = os.path.join("data", classroom_id, "qrcode", filename)
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                self.send_response(200)
-                if filename.endswith('.pdf'):
-                    self.send_header('Content-Type', 'application/pdf')
-                else:
-                    self.send_header('Content-Type', 'image/png')
-                self.send_header('Content-Disposition', f'inline; filename="{filename}"')
-                self.end_headers()
-                with open(file_path, 'rb') as f:
-                    self.wfile.write(f.read())
+    def _dispatch(self, method):
+        path = urllib.parse.urlparse(self.path).path
+        self._body = None
+        route, params = router.resolve(method, path)
+        if route is None:
+            metrics.inc("checkin_http_requests_total", route="unmatched", method=method, status=404)
+            if method == "POST":
+                self._read_body()  # 丢弃请求体，保证连接可以继续复用
+                self._send_body(404, "<h2>无效路径</h2>".encode('utf-8'))
             else:
-                self.send_response(404)
-                self.end_headers()
-                self.wfile.write(b"<h2>File not found</h2>")
-            return
-
-        # 新增：列出所有教室
-        if path == "/checkin/manage/list":
-            classrooms = get_all_classrooms()
-            public_ip = getattr(CheckinHandler, 'public_ip', 'localhost')
-            
-            html = "<!DOCTYPE html><html><head><meta charset='utf-8'><title>教室列表</title></head><body>"
-            html += "<h2>当前配置的教室</h2>"
-            html += f"<p><strong>公共IP:</strong> {public_ip}</p>"
-            html += "<ul>"
-            for room in classrooms:
-                html += f"<li>教室ID: {room['id']}, 行: {room['row']}, 列: {room['column']} "
-                html += f'<a href="/checkin/{room["id"]}/admin.html" style="margin-left:10px;">查看教室签到情况</a></li>'
-            html += "</ul>"
-            html += '<p><a href="/checkin/manage.html">返回管理页面</a></p>'
-            html += "</body></html>"
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
+                self._send_body(404, "<h2>无效路径，请通过 /checkin/{教室ID}/admin.html 访问</h2>".encode('utf-8'))
             return
 
-        # ✅ 匹配 /checkin/{id}/admin.html 或 /checkin/{id}/checkin-XX.html
-        match = re.match(r'^/checkin/(\d{3,4})/(admin\.html|checkin-\d{2}\.html)$', path)
-        if match:
-            classroom_id = match.group(1)
-            page_type = match.group(2)
-
-            # 使用内存配置替代文件加载
-            classroom_id, _, _ = self._get_room_config(classroom_id)  # ✅ 接收 id
-            if classroom_id is None:
-                self.send_response(404)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write("<h2>教室配置未找到</h2>".encode('utf-8'))
+        if method == "POST":
+            content_length = int(self.headers.get('Content-Length', 0) or 0)
+            if route.max_body is not None and content_length > route.max_body:
+                # 不读取超限的请求体，直接关闭连接
+                self.close_connection = True
+                self._send_body(413, "<h2>请求体过大</h2>".encode('utf-8'), headers={'Connection': 'close'})
                 return
-
-            if page_type == "admin.html":
-                # 构建表格时也使用内存配置
-                table_html = self._build_table_html(classroom_id)
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(self._render_admin(table_html=table_html, classroom_id=classroom_id))  # ✅ 传递 classroom_id
+            self._read_body()
+            if not route.accepts(self.headers.get('Content-Type', '')):
+                self._send_body(415, "<h2>不支持的请求类型</h2>".encode('utf-8'))
                 return
 
-            elif page_type.startswith("checkin-"):
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(self._render_form())
+        # 限流在任何数据库操作之前进行
+        for limit in route.meta.get("rate_limits", ()):
+            wait = limit.check(self, params)
+            if wait:
+                metrics.inc("checkin_http_rate_limited_total", route=route.name, limit=limit.name)
+                metrics.inc("checkin_http_requests_total", route=route.name, method=method, status=429)
+                self._send_body(429, "<h2>请求过于频繁，请稍后再试</h2>".encode('utf-8'),
+                                headers={'Retry-After': retry_after(wait)})
                 return
 
-        # 新增：列出已导入的班级及学生数量
-        if path == "/checkin/manage/list-students":
-            classes = get_class_student_counts()
-            
-            html = '<div style="font-family: Arial, sans-serif;">'
-            if not classes:
-                html += "<p>暂无导入的班级数据</p>"
-            else:
-                for cls in classes:
-                    html += f'''
-                    <div class="class-item">
-                        <span><strong>{cls["class"]}</strong> ({cls["count"]} 名学生)</span>
-                        <button class="delete-btn" onclick="parent.deleteClass('{cls["class"]}')">删除班级</button>
-                    </div>
-                    '''
-            html += '</div>'
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
+        # 准入控制：按优先级排队，过载时快速返回 503
+        priority = route.meta.get("priority", PRIORITY_ADMIN)
+        if priority is not None and not admission.acquire(priority):
+            metrics.inc("checkin_http_requests_total", route=route.name, method=method, status=503)
+            self._send_body(503, "<h2>服务器繁忙，请稍后再试</h2>".encode('utf-8'),
+                            headers={'Retry-After': admission.retry_after(priority)})
             return
 
-        # 新增：返回导入学生页面（动态生成）
-        if path == "/checkin/import-student.html":
-            html = '''<!DOCTYPE html>
+        metrics.gauge_add("checkin_http_requests_in_flight", 1, route=route.name)
+        try:
+            if profiler.should_sample(route.name):
+                profiler.run(route.name, router.call, route, self, params)
+            else:
+                router.call(route, self, params)
+        finally:
+            metrics.gauge_add("checkin_http_requests_in_flight", -1, route=route.name)
+            if priority is not None:
+                admission.release(priority)
+
+    def _send_import_result(self, message, success=True):
+        """返回导入结果页面"""
+        status = 200 if success else 400
+        html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>导入结果</title></head>
+<body>
+<h2>导入结果</h2>
+<p>{message}</p>
+<p><a href="/checkin/manage.html">返回管理页面</a></p>
+</body></html>"""
+        self._send_body(status, html.encode('utf-8'))
+
+
+# ✅ 修改路由: /checkin/manage.html
+@router.route("GET", "/checkin/manage.html")
+def manage_page(handler):
+    handler._send_body(200, handler._render_manage())
+
+
+# 新增：提供 qrcode 目录下的静态文件（PDF/PNG）
+@router.route("GET", "/checkin/{classroom_id:room}/qrcode/{filename:path}")
+def qrcode_file(handler, classroom_id, filename):
+    # 安全校验：只允许 .pdf 和 .png
+    if not (filename.endswith('.pdf') or filename.endswith('.png')):
+        handler._send_body(403, b"Forbidden: Invalid file type", content_type='text/plain; charset=utf-8')
+        return
+
+    file_path = os.path.join("data", classroom_id, "qrcode", filename)
+    if os.path.exists(file_path) and os.path.isfile(file_path):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        content_type = 'application/pdf' if filename.endswith('.pdf') else 'image/png'
+        handler._send_body(200, data, content_type=content_type,
+                           headers={'Content-Disposition': f'inline; filename="{filename}"'})
+    else:
+        handler._send_body(404, b"<h2>File not found</h2>")
+
+
+# 新增：列出所有教室
+@router.route("GET", "/checkin/manage/list")
+def list_classrooms(handler):
+    classrooms = get_all_classrooms()
+    public_ip = getattr(CheckinHandler, 'public_ip', 'localhost')
+    
+    html = "<!DOCTYPE html><html><head><meta charset='utf-8'><title>教室列表</title></head><body>"
+    html += "<h2>当前配置的教室</h2>"
+    html += f"<p><strong>公共IP:</strong> {public_ip}</p>"
+    html += "<ul>"
+    for room in classrooms:
+        html += f"<li>教室ID: {room['id']}, 行: {room['row']}, 列: {room['column']} "
+        html += f'<a href="/checkin/{room["id"]}/admin.html" style="margin-left:10px;">查看教室签到情况</a></li>'
+    html += "</ul>"
+    html += '<p><a href="/checkin/manage.html">返回管理页面</a></p>'
+    html += "</body></html>"
+    
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# 全校签到概况：一次分组查询，结果缓存 OVERVIEW_TTL 秒，多个管理员同时查看也只查询一次
+OVERVIEW_TTL = 2.0
+OVERVIEW_STATUSES = STATUS_LABELS
+_overview_lock = threading.Lock()
+_overview_cache = {"at": 0.0, "rooms": []}
+
+
+def _campus_overview():
+    with _overview_lock:
+        now = time.monotonic()
+        if now - _overview_cache["at"] > OVERVIEW_TTL:
+            _overview_cache["rooms"] = get_campus_overview()
+            _overview_cache["at"] = now
+        return _overview_cache["rooms"]
+
+
+@router.route("GET", "/checkin/manage/overview.json")
+def overview_json(handler):
+    rooms = _campus_overview()
+    handler._send_body(200, json.dumps({"rooms": rooms}, ensure_ascii=False).encode('utf-8'),
+                       content_type='application/json; charset=utf-8')
+
+
+@router.route("GET", "/checkin/manage/overview")
+def overview_page(handler):
+    rooms = _campus_overview()
+    open_count = sum(1 for room in rooms if room["enabled"])
+    signed_total = sum(room["statuses"].get("已签", 0) for room in rooms)
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>全校签到概况</title>
+<meta http-equiv="refresh" content="5">
+<style>
+body {{ font-family: sans-serif; padding: 20px; }}
+table {{ border-collapse: collapse; }}
+th, td {{ padding: 4px 8px; border: 1px solid #ddd; text-align: center; font-size: 13px; }}
+th {{ background-color: #f2f2f2; }}
+tr.open td:first-child {{ background-color: #e8f5e9; }}
+</style>
+</head>
+<body>
+<h2>全校签到概况</h2>
+<p>教室 {len(rooms)} 间，正在签到 {open_count} 间，已签到 {signed_total} 人（每 5 秒刷新）</p>
+<table><tr><th>教室</th><th>签到状态</th><th>自动开始/结束</th><th>已签/名单</th>
+{"".join(f"<th>{s}</th>" for s in OVERVIEW_STATUSES)}<th></th></tr>
+"""
+    for room in rooms:
+        statuses = room["statuses"]
+        schedule = f"{room['open_time'] or '-'} / {room['close_time'] or '-'}"
+        html += (f"<tr class='{'open' if room['enabled'] else ''}'><td>{html_escape(room['id'])}</td>"
+                 f"<td>{'正在签到' if room['enabled'] else '未开始'}</td><td>{schedule}</td>"
+                 f"<td>{statuses.get('已签', 0)} / {room['roster']}</td>")
+        html += "".join(f"<td>{statuses.get(s, 0) or ''}</td>" for s in OVERVIEW_STATUSES)
+        html += f'<td><a href="/checkin/{html_escape(room["id"])}/admin.html">查看</a></td></tr>'
+    html += '</table><p><a href="/checkin/manage.html">返回管理页面</a></p></body></html>'
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# 重新加载 room_info.yaml，与 classrooms 表比较后批量同步
+@router.route("POST", "/checkin/manage/reload-config")
+def reload_config(handler):
+    handler._read_body()
+    try:
+        result = room_config.sync()
+    except (ValueError, OSError) as e:
+        handler._send_body(400, f"<h2>加载教室配置失败</h2><p>{html_escape(str(e))}</p>"
+                                '<p><a href="/checkin/manage.html">返回管理页面</a></p>'.encode('utf-8'))
+        return
+    if result["public_ip"]:
+        CheckinHandler.public_ip = result["public_ip"]
+    lines = [
+        ("新增", result["added"]),
+        ("修改行列数", result["updated"]),
+        ("删除", result["removed"]),
+        ("保留（不在配置中）", result["kept"]),
+    ]
+    html = "<!DOCTYPE html><html><head><meta charset='utf-8'><title>教室配置已同步</title></head><body>"
+    html += f"<h2>已同步 {html_escape(room_config.path)}</h2><ul>"
+    for label, ids in lines:
+        html += f"<li>{label} {len(ids)} 间：{html_escape(', '.join(ids)) or '-'}</li>"
+    html += f"</ul><p>公共IP: {html_escape(CheckinHandler.public_ip)}</p>"
+    html += '<p><a href="/checkin/manage.html">返回管理页面</a></p></body></html>'
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# ✅ 管理页面 /checkin/{id}/admin.html
+@router.route("GET", "/checkin/{classroom_id:room}/admin.html")
+def admin_page(handler, classroom_id):
+    # 使用内存配置替代文件加载
+    classroom_id, _, _ = handler._get_room_config(classroom_id)  # ✅ 接收 id
+    if classroom_id is None:
+        handler._send_body(404, "<h2>教室配置未找到</h2>".encode('utf-8'))
+        return
+
+    # 构建表格时也使用内存配置
+    table_html = handler._build_table_html(classroom_id) + _conflicts_html(classroom_id)
+    handler._send_body(200, handler._render_admin(table_html=table_html, classroom_id=classroom_id))  # ✅ 传递 classroom_id
+
+
+def _conflicts_html(classroom_id):
+    """管理页面上的占座冲突提示：同一座位多人签到、同一学生同时在其他教室签到"""
+    conflicts = occupancy.conflicts(classroom_id)
+    if not conflicts["seats"] and not conflicts["elsewhere"]:
+        return ""
+    items = []
+    for seat, student_ids in sorted(conflicts["seats"].items()):
+        items.append(f"<li>{seat:02d} 号座位有多名学生签到：{html_escape('、'.join(student_ids))}</li>")
+    for student_id, rooms in sorted(conflicts["elsewhere"].items()):
+        items.append(f"<li>学号 {html_escape(student_id)} 同时在教室 {html_escape('、'.join(rooms))} 签到</li>")
+    return f"<div style='color:#c0392b; margin-top:10px;'><b>签到冲突</b><ul>{''.join(items)}</ul></div>"
+
+
+# ✅ 学生签到页面 /checkin/{id}/checkin-XX.html
+@router.route("GET", "/checkin/{classroom_id:room}/checkin-{seq:seq}.html", priority=PRIORITY_SCAN)
+def checkin_page(handler, classroom_id, seq):
+    classroom_id, _, _ = handler._get_room_config(classroom_id)
+    if classroom_id is None:
+        handler._send_body(404, "<h2>教室配置未找到</h2>".encode('utf-8'))
+        return
+
+    handler._send_body(200, handler._render_form())
+
+
+# 新增：列出已导入的班级及学生数量
+@router.route("GET", "/checkin/manage/list-students")
+def list_students(handler):
+    classes = get_class_student_counts()
+    
+    html = '<div style="font-family: Arial, sans-serif;">'
+    if not classes:
+        html += "<p>暂无导入的班级数据</p>"
+    else:
+        for cls in classes:
+            html += f'''
+            <div class="class-item">
+                <span><strong>{cls["class"]}</strong> ({cls["count"]} 名学生)</span>
+                <button class="delete-btn" onclick="parent.deleteClass('{cls["class"]}')">删除班级</button>
+            </div>
+            '''
+    html += '</div>'
+    
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# 新增：返回导入学生页面（动态生成）
+@router.route("GET", "/checkin/import-student.html")
+def import_student_page(handler):
+    html = '''<!DOCTYPE html>
 <html>
 <head>
   <meta charset="utf-8">
@@ -405,76 +668,98 @@ class CheckinHandler(BaseHTTPRequestHandler):
   <p><a href="/checkin/manage.html">返回管理页面</a></p>
 </body>
 </html>'''
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
-            return
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# 按学号查看签到情况每页显示的学生数
+VIEW_PAGE_SIZE = 50
 
-        # 新增：按学号查看签到情况
-        student_view_match = re.match(r'^/checkin/(\d{3,4})/view-by-student$', path)
-        if student_view_match:
-            classroom_id = student_view_match.group(1)
-            
-            # 获取该教室对应的班级名称
-            class_name = get_class_name_by_classroom(classroom_id)
-            all_students = get_students_by_class_name(class_name)
-
-            # 获取教室配置以确定最大座位数
-            classroom_config = get_classroom_by_id(classroom_id)
-            if classroom_config:
-                _, row, col = classroom_config
-                max_seats = min(row * col, 48)
+
+# 新增：按学号查看签到情况
+@router.route("GET", "/checkin/{classroom_id:room}/view-by-student")
+def view_by_student(handler, classroom_id):
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(handler.path).query)
+
+    # 获取该教室对应的班级名称
+    class_name = get_class_name_by_classroom(classroom_id)
+    all_students = get_students_by_class_name(class_name)
+
+    # 分页：名单按学号排序，student= 时跳到该学生所在的页
+    pages = max(1, (len(all_students) + VIEW_PAGE_SIZE - 1) // VIEW_PAGE_SIZE)
+    target = query.get("student", [None])[0]
+    positions = [i for i, (student_id, _) in enumerate(all_students) if student_id == target]
+    if positions:
+        page = positions[0] // VIEW_PAGE_SIZE + 1
+    else:
+        try:
+            page = min(max(1, int(query.get("page", ["1"])[0])), pages)
+        except ValueError:
+            page = 1
+    page_students = all_students[(page - 1) * VIEW_PAGE_SIZE:page * VIEW_PAGE_SIZE]
+
+    # 获取教室配置以确定最大座位数
+    classroom_config = get_classroom_by_id(classroom_id)
+    if classroom_config:
+        _, row, col = classroom_config
+        max_seats = min(row * col, 48)
+    else:
+        max_seats = 48
+    
+    # 获取该教室的临时签到数据（包含学号和状态）
+    temp_checkins = get_temp_checkins_with_ids_by_classroom(classroom_id)
+    
+    # 创建签到状态字典和座位号字典（使用学号作为键），默认状态改为"缺勤"
+    checkin_status = {student_id: "缺勤" for student_id, _ in all_students}
+    seat_numbers = {student_id: "-" for student_id, _ in all_students}  # 默认座位号为"-"
+    for student_id, _, seat_num, status in temp_checkins:  # 现在包含座位号
+        if student_id in checkin_status:
+            checkin_status[student_id] = status
+            # 只有"已签"状态才显示实际座位号，其他状态显示"-"
+            if status == "已签" and seat_num:
+                seat_numbers[student_id] = str(seat_num)
             else:
-                max_seats = 48
-            
-            # 获取该教室的临时签到数据（包含学号和状态）
-            temp_checkins = get_temp_checkins_with_ids_by_classroom(classroom_id)
-            
-            # 创建签到状态字典和座位号字典（使用学号作为键），默认状态改为"缺勤"
-            checkin_status = {student_id: "缺勤" for student_id, _ in all_students}
-            seat_numbers = {student_id: "-" for student_id, _ in all_students}  # 默认座位号为"-"
-            for student_id, _, seat_num, status in temp_checkins:  # 现在包含座位号
-                if student_id in checkin_status:
-                    checkin_status[student_id] = status
-                    # 只有"已签"状态才显示实际座位号，其他状态显示"-"
-                    if status == "已签" and seat_num:
-                        seat_numbers[student_id] = str(seat_num)
-                    else:
-                        seat_numbers[student_id] = "-"
-            
-            # 生成HTML表格（无JavaScript）
-            table_html = "<table border='1' style='width:100%; border-collapse: collapse;'>"
-            table_html += "<tr><th>学号</th><th>姓名</th><th>签到状态</th><th>座位号</th></tr>"  # 删除了 <th>操作</th>
-        
-            for student_id, name in all_students:
-                status = checkin_status.get(student_id, "缺勤")
-                seat_num = seat_numbers.get(student_id, "-")
-                table_html += f"""
-            <tr>
-                <td>{student_id}</td>
-                <td>{name}</td>
-                <td>
-                    <select name="status_{student_id}">
-                        <option value="已签"{" selected" if status == "已签" else ""}>已签</option>
-                        <option value="缺勤"{" selected" if status == "缺勤" else ""}>缺勤</option>
-                        <option value="病假"{" selected" if status == "病假" else ""}>病假</option>
-                        <option value="事假"{" selected" if status == "事假" else ""}>事假</option>
-                        <option value="公假"{" selected" if status == "公假" else ""}>公假</option>
-                        <option value="迟到"{" selected" if status == "迟到" else ""}>迟到</option>
-                        <option value="早退"{" selected" if status == "早退" else ""}>早退</option>
-                    </select>
-                </td>
-                <td>
-                    <input type="text" name="seat_{student_id}" value="{seat_num}" style="width:60px;">
-                </td>
-                <!-- 删除了操作列 <td>...</td> -->
-            </tr>"""
-        
-            table_html += "</table>"
-        
-            # 生成完整页面（无JavaScript）
-            html = f"""<!DOCTYPE html>
+                seat_numbers[student_id] = "-"
+    
+    # 生成HTML表格（无JavaScript）
+    table_html = "<table border='1' style='width:100%; border-collapse: collapse;'>"
+    table_html += "<tr><th>学号</th><th>姓名</th><th>签到状态</th><th>座位号</th></tr>"  # 删除了 <th>操作</th>
+
+    for student_id, name in page_students:
+        status = checkin_status.get(student_id, "缺勤")
+        seat_num = seat_numbers.get(student_id, "-")
+        table_html += f"""
+    <tr id="row_{student_id}">
+        <td>{student_id}</td>
+        <td>{name}</td>
+        <td>
+            <select name="status_{student_id}" data-initial="{status}">
+                <option value="已签"{" selected" if status == "已签" else ""}>已签</option>
+                <option value="缺勤"{" selected" if status == "缺勤" else ""}>缺勤</option>
+                <option value="病假"{" selected" if status == "病假" else ""}>病假</option>
+                <option value="事假"{" selected" if status == "事假" else ""}>事假</option>
+                <option value="公假"{" selected" if status == "公假" else ""}>公假</option>
+                <option value="迟到"{" selected" if status == "迟到" else ""}>迟到</option>
+                <option value="早退"{" selected" if status == "早退" else ""}>早退</option>
+            </select>
+        </td>
+        <td>
+            <input type="text" name="seat_{student_id}" value="{seat_num}" data-initial="{seat_num}" style="width:60px;">
+        </td>
+        <!-- 删除了操作列 <td>...</td> -->
+    </tr>"""
+
+    table_html += "</table>"
+
+    page_links = []
+    if page > 1:
+        page_links.append(f'<a href="?page={page - 1}">上一页</a>')
+    page_links.append(f"第 {page} / {pages} 页，共 {len(all_students)} 人")
+    if page < pages:
+        page_links.append(f'<a href="?page={page + 1}">下一页</a>')
+    pager_html = f"<p>{' '.join(page_links)}</p>"
+
+    # 生成完整页面
+    html = f"""<!DOCTYPE html>
 <html>
 <head>
   <meta charset="utf-8">
@@ -485,91 +770,298 @@ class CheckinHandler(BaseHTTPRequestHandler):
     th, td {{ padding: 10px; text-align: left; border: 1px solid #ddd; }}
     th {{ background-color: #f2f2f2; }}
     .btn {{ display: inline-block; margin-top: 20px; padding: 10px 20px; 
-           background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px; }}
+   background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px; }}
     .btn:hover {{ background-color: #45a049; }}
     .save-btn {{ background-color: #2196F3; }}
     .save-btn:hover {{ background-color: #0b7dda; }}
     input[type="text"] {{
-        width: 60px;
-        padding: 5px;
-        border: 1px solid #ccc;
-        border-radius: 4px;
+width: 60px;
+padding: 5px;
+border: 1px solid #ccc;
+border-radius: 4px;
     }}
   </style>
 </head>
 <body>
   <h2>教室 {classroom_id} 学生签到情况</h2>
-  <form method="POST" action="/checkin/{classroom_id}/update-student-status">
+  <div>
+    <input type="search" id="student-search" placeholder="输入学号或姓名查找" style="width:240px;" autocomplete="off">
+    <ul id="search-results" style="list-style:none; padding:0;"></ul>
+  </div>
+  {pager_html}
+  <form method="POST" action="/checkin/{classroom_id}/update-student-status" id="status-form">
+    <input type="hidden" name="page" value="{page}">
     {table_html}
     <button type="submit" class="btn save-btn">保存更改</button>
   </form>
+  {pager_html}
   <a href="/checkin/{classroom_id}/admin.html" class="btn">返回管理页面</a>
+  <script>
+  // 名单搜索：点击结果跳到对应行
+  var box = document.getElementById('student-search'), list = document.getElementById('search-results'), timer;
+  box.addEventListener('input', function () {{
+    clearTimeout(timer);
+    timer = setTimeout(function () {{
+      if (!box.value.trim()) {{ list.innerHTML = ''; return; }}
+      fetch('/checkin/students/search?class_name={urllib.parse.quote(class_name)}&q=' + encodeURIComponent(box.value))
+        .then(function (r) {{ return r.json(); }})
+        .then(function (data) {{
+          list.innerHTML = '';
+          data.results.forEach(function (s) {{
+            var li = document.createElement('li'), a = document.createElement('a');
+            var row = document.getElementById('row_' + s.student_id);
+            // 不在本页的学生跳到其所在页
+            a.href = (row ? '' : '?student=' + encodeURIComponent(s.student_id)) + '#row_' + s.student_id;
+            a.textContent = s.student_id + ' ' + s.name;
+            a.onclick = function () {{
+              if (row) {{ row.style.backgroundColor = '#fff3cd'; }}
+            }};
+            li.appendChild(a);
+            list.appendChild(li);
+          }});
+        }});
+    }}, 200);
+  }});
+  if (location.hash) {{
+    var row = document.getElementById(decodeURIComponent(location.hash.slice(1)));
+    if (row) {{ row.style.backgroundColor = '#fff3cd'; }}
+  }}
+
+  // 只提交有改动的行：未改动的状态和座位号不参与提交
+  document.getElementById('status-form').addEventListener('submit', function () {{
+    document.querySelectorAll('tr[id^="row_"]').forEach(function (row) {{
+      var fields = row.querySelectorAll('[data-initial]');
+      var changed = Array.prototype.some.call(fields, function (f) {{ return f.value !== f.dataset.initial; }});
+      fields.forEach(function (f) {{ f.disabled = !changed; }});
+    }});
+  }});
+  </script>
 </body>
 </html>"""
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
-            return
-
-        self.send_response(404)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.end_headers()
-        self.wfile.write("<h2>无效路径，请通过 /checkin/{教室ID}/admin.html 访问</h2>".encode('utf-8'))
-
-    def do_POST(self):
-        path = urllib.parse.urlparse(self.path).path
-
-        # 新增：删除签到记录
-        if path == "/checkin/delete-record":
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            
-            course = params.get("course", [""])[0]
-            save_time = params.get("save_time", [""])[0]
-            classroom_id = params.get("classroom_id", [""])[0]
-            
-            # 调用数据库函数删除记录
-            if delete_checkin_record(course, save_time, classroom_id):
-                # 重新查询记录以刷新页面
-                records = get_checkin_summary_by_course(course)
-                
-                # 重新渲染页面
-                if records:
-                    table_rows = ""
-                    for record in records:
-                        table_rows += f"""
-                    <tr>
-                        <td>{record['course']}</td>
-                        <td>{record['classroom_id']}</td>
-                        <td>{record['count']}</td>
-                        <td>{record['save_time']}</td>
-                        <td>
-                            <form method="POST" action="/checkin/delete-record" style="display:inline;">
-                                <input type="hidden" name="course" value="{record['course']}">
-                                <input type="hidden" name="save_time" value="{record['save_time']}">
-                                <input type="hidden" name="classroom_id" value="{record['classroom_id']}">
-                                <button type="submit" class="btn-delete">删除记录</button>
-                            </form>
-                        </td>
-                    </tr>"""
-                    table_html = f"""
-                <table class="record-table">
-                    <tr>
-                        <th>课程名称</th>
-                        <th>教室ID</th>
-                        <th>签到人数</th>
-                        <th>保存时间</th>
-                        <th>操作</th>
-                    </tr>
-                    {table_rows}
-                </table>"""
-                else:
-                    table_html = "<p>未找到相关签到记录</p>"
-                
-                html_resp = f"""<!DOCTYPE html>
+    
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# 名单搜索：学号或姓名前缀匹配；exact=1 时只按学号精确查找（签到页确认学号用）
+@router.route("GET", "/checkin/students/search", rate_limits=SEARCH_RATE_LIMITS)
+def search_students(handler):
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(handler.path).query)
+    q = query.get("q", [""])[0]
+    if query.get("exact", [""])[0] == "1":
+        student = student_index.lookup(q.strip())
+        results = [student] if student else []
+    else:
+        try:
+            limit = max(1, min(int(query.get("limit", ["10"])[0]), 50))
+        except ValueError:
+            limit = 10
+        results = student_index.search(q, limit=limit, class_name=query.get("class_name", [None])[0])
+    body = {"results": [{"student_id": sid, "name": name, "class_name": class_name}
+                        for sid, name, class_name in results]}
+    handler._send_body(200, json.dumps(body, ensure_ascii=False).encode('utf-8'),
+                       content_type='application/json; charset=utf-8')
+
+
+RECORD_SEARCH_PAGE_SIZE = 20
+
+
+def _record_search_params(handler):
+    """解析签到历史搜索参数，返回 (q, since, until, page, page_size)
+
+    since / until 为日期（YYYY-MM-DD，均包含当天），格式错误抛出 ValueError
+    """
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(handler.path).query)
+    q = query.get("q", [""])[0].strip()
+    since = query.get("since", [""])[0].strip()
+    until = query.get("until", [""])[0].strip()
+    if since:
+        since = datetime.date.fromisoformat(since).isoformat()
+    if until:
+        until = (datetime.date.fromisoformat(until) + datetime.timedelta(days=1)).isoformat()
+    try:
+        page = max(1, int(query.get("page", ["1"])[0]))
+        page_size = max(1, min(int(query.get("page_size", [str(RECORD_SEARCH_PAGE_SIZE)])[0]), 100))
+    except ValueError:
+        page, page_size = 1, RECORD_SEARCH_PAGE_SIZE
+    return q, since or None, until or None, page, page_size
+
+
+# 签到历史全文搜索：姓名、班级、课程、状态，支持 name:张三 限定字段和 高等* 前缀匹配
+@router.route("GET", "/checkin/records/search", rate_limits=SEARCH_RATE_LIMITS)
+def search_records(handler):
+    try:
+        q, since, until, page, page_size = _record_search_params(handler)
+    except ValueError:
+        handler._send_body(400, json.dumps({"error": "日期格式应为 YYYY-MM-DD"}, ensure_ascii=False).encode('utf-8'),
+                           content_type='application/json; charset=utf-8')
+        return
+    total, results = search_checkin_records(q, since, until, limit=page_size, offset=(page - 1) * page_size)
+    body = {"total": total, "page": page, "page_size": page_size, "results": results}
+    handler._send_body(200, json.dumps(body, ensure_ascii=False).encode('utf-8'),
+                       content_type='application/json; charset=utf-8')
+
+
+@router.route("GET", "/checkin/manage/search-records", rate_limits=SEARCH_RATE_LIMITS)
+def search_records_page(handler):
+    try:
+        q, since, until, page, page_size = _record_search_params(handler)
+    except ValueError:
+        handler._send_body(400, "<h2>日期格式应为 YYYY-MM-DD</h2>".encode('utf-8'))
+        return
+    total, results = search_checkin_records(q, since, until, limit=page_size, offset=(page - 1) * page_size)
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(handler.path).query)
+    since_text = query.get("since", [""])[0]
+    until_text = query.get("until", [""])[0]
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>搜索签到记录</title>
+<style>
+body {{ font-family: sans-serif; padding: 20px; }}
+table {{ border-collapse: collapse; margin: 10px 0; }}
+th, td {{ padding: 4px 8px; border: 1px solid #ddd; text-align: left; font-size: 13px; }}
+th {{ background-color: #f2f2f2; }}
+</style>
+</head>
+<body>
+<h2>搜索签到记录</h2>
+<form method="GET" action="/checkin/manage/search-records">
+  <input type="text" name="q" value="{html_escape(q)}" placeholder="如：张三 缺勤、name:张三、高等*" size="40">
+  从 <input type="date" name="since" value="{html_escape(since_text)}">
+  到 <input type="date" name="until" value="{html_escape(until_text)}">
+  <button type="submit">搜索</button>
+</form>
+"""
+    if q:
+        html += f"<p>共 {total} 条记录</p>"
+    if results:
+        html += "<table><tr><th>课程</th><th>保存时间</th><th>教室</th><th>学号</th><th>姓名</th><th>班级</th><th>状态</th></tr>"
+        for r in results:
+            html += (f"<tr><td>{html_escape(r['course'])}</td><td>{html_escape(r['save_time'])}</td>"
+                     f"<td>{html_escape(r['classroom_id'])}</td><td>{html_escape(r['student_id'])}</td>"
+                     f"<td>{html_escape(r['name'])}</td><td>{html_escape(r['class_name'])}</td>"
+                     f"<td>{html_escape(r['status'])}</td></tr>")
+        html += "</table>"
+        pages = (total + page_size - 1) // page_size
+        base = {"q": q, "since": since_text, "until": until_text, "page_size": page_size}
+        links = []
+        if page > 1:
+            links.append(f'<a href="?{html_escape(urllib.parse.urlencode({**base, "page": page - 1}))}">上一页</a>')
+        links.append(f"第 {page} / {pages} 页")
+        if page < pages:
+            links.append(f'<a href="?{html_escape(urllib.parse.urlencode({**base, "page": page + 1}))}">下一页</a>')
+        html += f"<p>{' '.join(links)}</p>"
+    html += '<p><a href="/checkin/manage.html">返回管理页面</a></p></body></html>'
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# 学生签到历史：各课程的出勤情况和每次签到记录
+@router.route("GET", "/checkin/students/history", rate_limits=SEARCH_RATE_LIMITS)
+def student_history_json(handler):
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(handler.path).query)
+    history = student_history.get(query.get("student_id", [""])[0].strip())
+    if history is None:
+        handler._send_body(404, json.dumps({"error": "没有该学生的签到记录"}, ensure_ascii=False).encode('utf-8'),
+                           content_type='application/json; charset=utf-8')
+        return
+    handler._send_body(200, json.dumps(history, ensure_ascii=False).encode('utf-8'),
+                       content_type='application/json; charset=utf-8')
+
+
+@router.route("GET", "/checkin/manage/student-history", rate_limits=SEARCH_RATE_LIMITS)
+def student_history_page(handler):
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(handler.path).query)
+    student_id = query.get("student_id", [""])[0].strip()
+    history = student_history.get(student_id) if student_id else None
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>学生签到历史</title>
+<style>
+body {{ font-family: sans-serif; padding: 20px; }}
+table {{ border-collapse: collapse; margin: 10px 0 20px; }}
+th, td {{ padding: 4px 8px; border: 1px solid #ddd; text-align: left; font-size: 13px; }}
+th {{ background-color: #f2f2f2; }}
+</style>
+</head>
+<body>
+<h2>学生签到历史</h2>
+<form method="GET" action="/checkin/manage/student-history">
+  <input type="text" name="student_id" value="{html_escape(student_id)}" placeholder="输入学号" required>
+  <button type="submit">查询</button>
+</form>
+"""
+    if student_id and history is None:
+        html += f"<p>没有学号 {html_escape(student_id)} 的签到记录</p>"
+    elif history:
+        html += (f"<h3>{html_escape(history['student_id'])} {html_escape(history['name'])}"
+                 f"（{html_escape(history['class_name'])}）</h3>"
+                 f"<p>共 {len(history['sessions'])} 次课，出勤率 {history['attendance_rate']:.1%}</p>")
+        html += "<table><tr><th>课程</th><th>次数</th><th>出勤率</th>"
+        html += "".join(f"<th>{s}</th>" for s in OVERVIEW_STATUSES) + "</tr>"
+        for entry in history["courses"]:
+            html += (f"<tr><td>{html_escape(entry['course'])}</td><td>{entry['sessions']}</td>"
+                     f"<td>{entry['attendance_rate']:.1%}</td>")
+            html += "".join(f"<td>{entry['statuses'].get(s, 0) or ''}</td>" for s in OVERVIEW_STATUSES) + "</tr>"
+        html += "</table><table><tr><th>保存时间</th><th>课程</th><th>教室</th><th>状态</th></tr>"
+        for session in history["sessions"]:
+            html += (f"<tr><td>{html_escape(session['save_time'])}</td><td>{html_escape(session['course'] or '')}</td>"
+                     f"<td>{html_escape(session['classroom_id'])}</td><td>{html_escape(session['status'])}</td></tr>")
+        html += "</table>"
+    html += '<p><a href="/checkin/manage.html">返回管理页面</a></p></body></html>'
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# 新增：删除签到记录
+@router.route("POST", "/checkin/delete-record")
+def delete_record(handler):
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+    
+    course = params.get("course", [""])[0]
+    classroom_id = params.get("classroom_id", [""])[0]
+    try:
+        session_id = int(params.get("session_id", [""])[0])
+    except ValueError:
+        session_id = None
+    
+    # 调用数据库函数删除记录
+    deleted_ids = delete_checkin_record(session_id) if session_id is not None else []
+    if deleted_ids:
+        student_history.invalidate(deleted_ids)
+        # 重新查询记录以刷新页面
+        records = get_checkin_summary_by_course(course)
+        
+        # 重新渲染页面
+        if records:
+            table_rows = ""
+            for record in records:
+                table_rows += f"""
+            <tr>
+                <td>{record['course']}</td>
+                <td>{record['classroom_id']}</td>
+                <td>{record['count']}</td>
+                <td>{record['save_time']}</td>
+                <td>
+                    <form method="POST" action="/checkin/delete-record" style="display:inline;">
+                        <input type="hidden" name="course" value="{record['course']}">
+                        <input type="hidden" name="session_id" value="{record['session_id']}">
+                        <input type="hidden" name="classroom_id" value="{record['classroom_id']}">
+                        <button type="submit" class="btn-delete">删除记录</button>
+                    </form>
+                </td>
+            </tr>"""
+            table_html = f"""
+        <table class="record-table">
+            <tr>
+                <th>课程名称</th>
+                <th>教室ID</th>
+                <th>签到人数</th>
+                <th>保存时间</th>
+                <th>操作</th>
+            </tr>
+            {table_rows}
+        </table>"""
+        else:
+            table_html = "<p>未找到相关签到记录</p>"
+        
+        html_resp = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>签到记录</title>
 <style>
 body {{
@@ -630,103 +1122,103 @@ body {{
   </div>
 </body>
 </html>"""
-            else:
-                html_resp = """<!DOCTYPE html>
+    else:
+        html_resp = """<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>删除失败</title></head>
 <body>
 <h2>删除失败</h2>
 <p>记录删除失败，请重试。</p>
 <p><a href="/checkin/manage.html">返回管理页面</a></p>
 </body></html>"""
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_resp.encode('utf-8'))
-            return
+    
+    handler._send_body(200, html_resp.encode('utf-8'))
+
 
-        # ✅ 查看签到记录
-        record_match = re.match(r'^/checkin/(\d{3,4})/view-records$', path)
-        if record_match:
-            classroom_id = record_match.group(1)
-            # 获取课程名称
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            course_name = params.get("course", [""])[0]
-            
-            if not course_name:
-                html_resp = """<!DOCTYPE html>
+# ✅ 查看签到记录
+@router.route("POST", "/checkin/{classroom_id:room}/view-records")
+def view_records(handler, classroom_id):
+    # 获取课程名称
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+    course_name = params.get("course", [""])[0]
+    include_archived = params.get("include_archived", [""])[0] == "1"
+    
+    if not course_name:
+        html_resp = """<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>查询失败</title></head>
 <body><p>请输入课程名称</p><p><a href="/checkin/{classroom_id}/admin.html">返回</a></p></body></html>""".format(classroom_id=classroom_id)
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(html_resp.encode('utf-8'))
-                return
-            
-            # 查询签到记录
-            records = get_checkin_summary_by_course(course_name)
-            
-            # 生成记录表格
-            if records:
-                # 使用复选框选择多条记录并由同一按钮导出
-                table_rows = ""
-                for record in records:
-                    # 复选框的值编码为 course||save_time||classroom_id
-                    cbval = f"{record['course']}||{record['save_time']}||{record['classroom_id']}"
-                    table_rows += f"""
-                <tr>
-                    <td><input type="checkbox" name="export_record" value="{cbval}"></td>
-                    <td>{record['course']}</td>
-                    <td>{record['classroom_id']}</td>
-                    <td>{record['class_total']}</td>
-                    <td>{record['signed']}</td>
-                    <td>{record['personal_leave']}</td>
-                    <td>{record['sick_leave']}</td>
-                    <td>{record['official_leave']}</td>
-                    <td>{record['absent']}</td>
-                    <td>{record['late']}</td>
-                    <td>{record['early_leave']}</td>
-                    <td>{record['save_time']}</td>
-                    <td>
-                        <form method="POST" action="/checkin/delete-record" style="display:inline;">
-                            <input type="hidden" name="course" value="{record['course']}">
-                            <input type="hidden" name="save_time" value="{record['save_time']}">
-                            <input type="hidden" name="classroom_id" value="{record['classroom_id']}">
-                            <button type="submit" class="btn-delete">删除记录</button>
-                        </form>
-                    </td>
-                </tr>"""
-                # 表格被包裹在一个表单内，表单提交时会发送所有被选中的 export_record 值
-                table_html = f"""
-            <form method="POST" action="/checkin/export-record">
-            <table class="record-table">
-                <tr>
-                    <th>选择</th>
-                    <th>课程名称</th>
-                    <th>教室ID</th>
-                    <th>班级人数</th>
-                    <th>已签</th>
-                    <th>事假</th>
-                    <th>病假</th>
-                    <th>公假</th>
-                    <th>缺勤</th>
-                    <th>迟到</th>
-                    <th>早退</th>
-                    <th>保存时间</th>
-                    <th>操作</th>
-                </tr>
-                {table_rows}
-            </table>
-            <div style="margin-top:12px;">
-                <button type="submit" class="btn-export">导出到xlsx文件</button>
-            </div>
-            </form>"""
+        handler._send_body(200, html_resp.encode('utf-8'))
+        return
+    
+    # 查询签到记录
+    records = get_checkin_summary_by_course(course_name, include_archived=include_archived)
+    
+    # 生成记录表格
+    if records:
+        # 使用复选框选择多条记录并由同一按钮导出
+        table_rows = ""
+        for record in records:
+            # 复选框的值为签到ID；已归档的记录没有签到ID，编码为 course||save_time||classroom_id
+            if record.get("archived"):
+                cbval = f"{record['course']}||{record['save_time']}||{record['classroom_id']}"
+            else:
+                cbval = str(record['session_id'])
+            if record.get("archived"):
+                # 已归档的记录只读，不能删除
+                action_html = "已归档"
             else:
-                table_html = "<p>未找到相关签到记录</p>"
- 
-            html_resp = f"""<!DOCTYPE html>
+                action_html = f"""
+                <form method="POST" action="/checkin/delete-record" style="display:inline;">
+                    <input type="hidden" name="course" value="{record['course']}">
+                    <input type="hidden" name="session_id" value="{record['session_id']}">
+                    <input type="hidden" name="classroom_id" value="{record['classroom_id']}">
+                    <button type="submit" class="btn-delete">删除记录</button>
+                </form>"""
+            table_rows += f"""
+        <tr>
+            <td><input type="checkbox" name="export_record" value="{cbval}"></td>
+            <td>{record['course']}</td>
+            <td>{record['classroom_id']}</td>
+            <td>{record['class_total']}</td>
+            <td>{record['signed']}</td>
+            <td>{record['personal_leave']}</td>
+            <td>{record['sick_leave']}</td>
+            <td>{record['official_leave']}</td>
+            <td>{record['absent']}</td>
+            <td>{record['late']}</td>
+            <td>{record['early_leave']}</td>
+            <td>{record['save_time']}</td>
+            <td>{action_html}</td>
+        </tr>"""
+        # 表格被包裹在一个表单内，表单提交时会发送所有被选中的 export_record 值
+        table_html = f"""
+    <form method="POST" action="/checkin/export-record">
+    <table class="record-table">
+        <tr>
+            <th>选择</th>
+            <th>课程名称</th>
+            <th>教室ID</th>
+            <th>班级人数</th>
+            <th>已签</th>
+            <th>事假</th>
+            <th>病假</th>
+            <th>公假</th>
+            <th>缺勤</th>
+            <th>迟到</th>
+            <th>早退</th>
+            <th>保存时间</th>
+            <th>操作</th>
+        </tr>
+        {table_rows}
+    </table>
+    <div style="margin-top:12px;">
+        <button type="submit" class="btn-export">导出到xlsx文件</button>
+    </div>
+    </form>"""
+    else:
+        table_html = "<p>未找到相关签到记录</p>"
+
+    html_resp = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>签到记录</title>
 <style>
 body {{
@@ -787,64 +1279,59 @@ body {{
   </div>
 </body>
 </html>"""
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_resp.encode('utf-8'))
-            return
+    handler._send_body(200, html_resp.encode('utf-8'))
 
-        # ✅ 添加教室: /checkin/manage/add
-        if path == "/checkin/manage/add":
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            
-            classroom_id = params.get("classroom_id", [""])[0]
-            row = int(params.get("row", ["4"])[0])
-            column = int(params.get("column", ["12"])[0])
-            
-            add_classroom(classroom_id, row, column)
-            
-            self.send_response(302)
-            self.send_header('Location', "/checkin/manage/list")
-            self.end_headers()
-            return
 
-        # ✅ 删除教室: /checkin/manage/delete
-        if path == "/checkin/manage/delete":
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            
-            classroom_id_to_delete = params.get("classroom_id", [""])[0]
-            delete_classroom(classroom_id_to_delete)
-            
-            self.send_response(302)
-            self.send_header('Location', "/checkin/manage.html")
-            self.end_headers()
-            return
+# ✅ 添加教室: /checkin/manage/add
+@router.route("POST", "/checkin/manage/add")
+def add_classroom_route(handler):
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
     
-            # ✅ 生成二维码: /checkin/manage/generate-qrcode
-        if path == "/checkin/manage/generate-qrcode":
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            
-            classroom_id = params.get("classroom_id", [""])[0]
-            
-            if generate_qr_codes(self,classroom_id):
-                message = f"二维码已生成到 ./data/{classroom_id}/qrcode/ 目录"
-                # 添加下载按钮
-                download_button = f'<form method="POST" action="/checkin/manage/generate-print-file" style="margin-top: 15px;">' \
-                                f'<input type="hidden" name="classroom_id" value="{classroom_id}">' \
-                                f'<button type="submit" class="btn-qrcode">下载打印文件</button>' \
-                                f'</form>'
-            else:
-                message = "教室ID不存在，无法生成二维码"
-                download_button = ""
-            
-            # 返回结果页面
-            html = f"""<!DOCTYPE html>
+    classroom_id = params.get("classroom_id", [""])[0]
+    row = int(params.get("row", ["4"])[0])
+    column = int(params.get("column", ["12"])[0])
+    
+    add_classroom(classroom_id, row, column)
+    
+    handler._send_redirect("/checkin/manage/list")
+
+
+# ✅ 删除教室: /checkin/manage/delete
+@router.route("POST", "/checkin/manage/delete")
+def delete_classroom_route(handler):
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+    
+    classroom_id_to_delete = params.get("classroom_id", [""])[0]
+    delete_classroom(classroom_id_to_delete)
+    
+    handler._send_redirect("/checkin/manage.html")
+
+
+# ✅ 生成二维码: /checkin/manage/generate-qrcode
+@router.route("POST", "/checkin/manage/generate-qrcode", priority=PRIORITY_BULK)
+def generate_qrcode(handler):
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+    
+    classroom_id = params.get("classroom_id", [""])[0]
+    
+    with metrics.timer("checkin_job_duration_seconds", job="qrcode"):
+        generated = generate_qr_codes(handler, classroom_id)
+    if generated:
+        message = f"二维码已生成到 ./data/{classroom_id}/qrcode/ 目录"
+        # 添加下载按钮
+        download_button = f'<form method="POST" action="/checkin/manage/generate-print-file" style="margin-top: 15px;">' \
+                        f'<input type="hidden" name="classroom_id" value="{classroom_id}">' \
+                        f'<button type="submit" class="btn-qrcode">下载打印文件</button>' \
+                        f'</form>'
+    else:
+        message = "教室ID不存在，无法生成二维码"
+        download_button = ""
+    
+    # 返回结果页面
+    html = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>二维码生成结果</title>
 <style>
 .btn-qrcode {{ 
@@ -863,30 +1350,29 @@ body {{
 {download_button}
 <p><a href="/checkin/manage.html">返回管理页面</a></p>
 </body></html>"""
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
-            return
+    
+    handler._send_body(200, html.encode('utf-8'))
+
 
-        # 新增：生成打印文件（LaTeX + PDF）
-        if path == "/checkin/manage/generate-print-file":
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            
-            classroom_id = params.get("classroom_id", [""])[0]
-            
-            # 生成 LaTeX 文件
-            tex_file = generate_latex_file(self, classroom_id)
-            if tex_file:
-                # 编译为 PDF
-                pdf_file = compile_latex_to_pdf(tex_file)
-                if pdf_file:
-                    # 重定向到下载页面
-                    download_url = f"/checkin/{classroom_id}/qrcode/qrcode-{classroom_id}.pdf"
-                    html = f"""<!DOCTYPE html>
+# 新增：生成打印文件（LaTeX + PDF）
+@router.route("POST", "/checkin/manage/generate-print-file", priority=PRIORITY_BULK)
+def generate_print_file(handler):
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+    
+    classroom_id = params.get("classroom_id", [""])[0]
+    
+    # 生成 LaTeX 文件
+    with metrics.timer("checkin_job_duration_seconds", job="latex"):
+        tex_file = generate_latex_file(handler, classroom_id)
+    if tex_file:
+        # 编译为 PDF
+        with metrics.timer("checkin_job_duration_seconds", job="pdf"):
+            pdf_file = compile_latex_to_pdf(tex_file)
+        if pdf_file:
+            # 重定向到下载页面
+            download_url = f"/checkin/{classroom_id}/qrcode/qrcode-{classroom_id}.pdf"
+            html = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>打印文件生成成功</title></head>
 <body>
 <h2>打印文件生成成功</h2>
@@ -894,8 +1380,8 @@ body {{
 <p><a href="{download_url}" style="font-size: 18px; color: #2196F3;">下载 qrcode-{classroom_id}.pdf</a></p>
 <p><a href="/checkin/manage.html">返回管理页面</a></p>
 </body></html>"""
-                else:
-                    html = f"""<!DOCTYPE html>
+        else:
+            html = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>PDF生成失败</title></head>
 <body>
 <h2>PDF生成失败</h2>
@@ -903,176 +1389,182 @@ body {{
 <p>LaTeX文件位置: {tex_file}</p>
 <p><a href="/checkin/manage.html">返回管理页面</a></p>
 </body></html>"""
-            else:
-                html = f"""<!DOCTYPE html>
+    else:
+        html = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>LaTeX生成失败</title></head>
 <body>
 <h2>LaTeX生成失败</h2>
 <p>无法生成LaTeX文件。请确保已先生成二维码。</p>
 <p><a href="/checkin/manage.html">返回管理页面</a></p>
 </body></html>"""
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
+    
+    handler._send_body(200, html.encode('utf-8'))
+
+
+# 新增：导入学生名单
+@router.route("POST", "/checkin/manage/import-students", max_body=IMPORT_MAX_BODY, priority=PRIORITY_BULK)
+def import_students(handler):
+    content_type = handler.headers.get('Content-Type', '')
+    if 'multipart/form-data' not in content_type:
+        handler._send_import_result("无效的请求类型", success=False)
+        return
+
+    body = handler._read_body()
+
+    # 提取 boundary
+    boundary_match = re.search(r'boundary=([^;]+)', content_type)
+    if not boundary_match:
+        handler._send_import_result("无效的 multipart 格式", success=False)
+        return
+    boundary = boundary_match.group(1).strip('"').encode()
+
+    parts = body.split(b'--' + boundary)
+    csv_content = None
+    filename = None
+    for part in parts:
+        if b'name="csv_file"' in part:
+            # 提取文件名
+            filename_match = re.search(rb'filename="([^"]+)"', part)
+            if filename_match:
+                filename = filename_match.group(1).decode('utf-8')
+            header_end = part.find(b'\r\n\r\n')
+            if header_end != -1:
+                csv_content = part[header_end+4:]
+                if csv_content.endswith(b'\r\n'):
+                    csv_content = csv_content[:-2]
+                break
+
+    if not filename or not csv_content:
+        handler._send_import_result("未选择文件", success=False)
+        return
+
+    try:
+        import csv
+        from io import StringIO
+        decoded = csv_content.decode('utf-8-sig')
+        reader = csv.reader(StringIO(decoded))
+        students = []
+        seen_ids = set()
+        duplicates = []
+        for row in reader:
+            if len(row) >= 3:
+                student_id, name, class_name = row[0].strip(), row[1].strip(), row[2].strip()
+                if not student_id or not name or not class_name:
+                    continue
+                if student_id in seen_ids:
+                    duplicates.append(student_id)
+                else:
+                    seen_ids.add(student_id)
+                    students.append((student_id, name, class_name))
+        
+        if duplicates:
+            handler._send_import_result(f"导入失败：发现重复学号 {', '.join(duplicates)}", success=False)
             return
 
-        # 新增：导入学生名单
-        if path == "/checkin/manage/import-students":
-            content_type = self.headers.get('Content-Type', '')
-            if 'multipart/form-data' not in content_type:
-                self._send_import_result("无效的请求类型", success=False)
-                return
+        if not students:
+            handler._send_import_result(f"文件 '{filename}' 为空或格式不正确", success=False)
+            return
 
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(
+                "INSERT INTO students (student_id, name, class_name) VALUES (?, ?, ?)",
+                students
+            )
+            conn.commit()
+            student_index.invalidate()
+            handler._send_import_result(f"成功导入 '{filename}' 中的 {len(students)} 名学生")
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE constraint failed" in str(e):
+                conn.rollback()
+                # 查询哪些学号已存在
+                placeholders = ','.join('?' for _ in seen_ids)
+                cursor.execute(f"SELECT student_id FROM students WHERE student_id IN ({placeholders})", tuple(seen_ids))
+                existing_ids = [row[0] for row in cursor.fetchall()]
+                conn.close()
+                handler._send_import_result(f"导入失败：以下学号已存在 {', '.join(existing_ids)}", success=False)
+            else:
+                raise
+        finally:
+            conn.close()
 
-            # 提取 boundary
-            boundary_match = re.search(r'boundary=([^;]+)', content_type)
-            if not boundary_match:
-                self._send_import_result("无效的 multipart 格式", success=False)
-                return
-            boundary = boundary_match.group(1).strip('"').encode()
-
-            parts = body.split(b'--' + boundary)
-            csv_content = None
-            filename = None
-            for part in parts:
-                if b'name="csv_file"' in part:
-                    # 提取文件名
-                    filename_match = re.search(rb'filename="([^"]+)"', part)
-                    if filename_match:
-                        filename = filename_match.group(1).decode('utf-8')
-                    header_end = part.find(b'\r\n\r\n')
-                    if header_end != -1:
-                        csv_content = part[header_end+4:]
-                        if csv_content.endswith(b'\r\n'):
-                            csv_content = csv_content[:-2]
-                        break
-
-            if not filename or not csv_content:
-                self._send_import_result("未选择文件", success=False)
-                return
+    except Exception as e:
+        handler._send_import_result(f"导入失败: {str(e)}", success=False)
 
-            try:
-                import csv
-                from io import StringIO
-                decoded = csv_content.decode('utf-8-sig')
-                reader = csv.reader(StringIO(decoded))
-                students = []
-                seen_ids = set()
-                duplicates = []
-                for row in reader:
-                    if len(row) >= 3:
-                        student_id, name, class_name = row[0].strip(), row[1].strip(), row[2].strip()
-                        if not student_id or not name or not class_name:
-                            continue
-                        if student_id in seen_ids:
-                            duplicates.append(student_id)
-                        else:
-                            seen_ids.add(student_id)
-                            students.append((student_id, name, class_name))
-                
-                if duplicates:
-                    self._send_import_result(f"导入失败：发现重复学号 {', '.join(duplicates)}", success=False)
-                    return
-
-                if not students:
-                    self._send_import_result(f"文件 '{filename}' 为空或格式不正确", success=False)
-                    return
-
-                conn = sqlite3.connect(DATABASE_PATH)
-                cursor = conn.cursor()
-                try:
-                    cursor.executemany(
-                        "INSERT INTO students (student_id, name, class_name) VALUES (?, ?, ?)",
-                        students
-                    )
-                    conn.commit()
-                    self._send_import_result(f"成功导入 '{filename}' 中的 {len(students)} 名学生")
-                except sqlite3.IntegrityError as e:
-                    if "UNIQUE constraint failed" in str(e):
-                        conn.rollback()
-                        # 查询哪些学号已存在
-                        placeholders = ','.join('?' for _ in seen_ids)
-                        cursor.execute(f"SELECT student_id FROM students WHERE student_id IN ({placeholders})", tuple(seen_ids))
-                        existing_ids = [row[0] for row in cursor.fetchall()]
-                        conn.close()
-                        self._send_import_result(f"导入失败：以下学号已存在 {', '.join(existing_ids)}", success=False)
-                    else:
-                        raise
-                finally:
-                    conn.close()
 
-            except Exception as e:
-                self._send_import_result(f"导入失败: {str(e)}", success=False)
-            return
+# 新增：删除指定班级的学生名单
+@router.route("POST", "/checkin/manage/delete-class-students")
+def delete_class_students(handler):
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+    
+    class_name = params.get("class_name", [""])[0]
+    if not class_name:
+        handler._send_import_result("班级名称不能为空", success=False)
+        return
 
-        # 新增：删除指定班级的学生名单
-        if path == "/checkin/manage/delete-class-students":
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            
-            class_name = params.get("class_name", [""])[0]
-            if not class_name:
-                self._send_import_result("班级名称不能为空", success=False)
-                return
+    deleted_count = delete_students_by_class_name(class_name)
+    student_index.invalidate()
+    
+    if deleted_count > 0:
+        message = f"成功删除班级 '{class_name}' 中的 {deleted_count} 名学生"
+    else:
+        message = f"班级 '{class_name}' 不存在或无学生可删除"
+        
+    handler._send_import_result(message)
 
-            deleted_count = delete_students_by_class_name(class_name)
-            
-            if deleted_count > 0:
-                message = f"成功删除班级 '{class_name}' 中的 {deleted_count} 名学生"
-            else:
-                message = f"班级 '{class_name}' 不存在或无学生可删除"
-                
-            self._send_import_result(message)
-            return
 
-        # 新增：更新学生签到状态
-        update_status_match = re.match(r'^/checkin/(\d{3,4})/update-student-status$', path)
-        if update_status_match:
-            classroom_id = update_status_match.group(1)
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            
-            # 获取该教室对应的班级名称
-            class_name = get_class_name_by_classroom(classroom_id)
-            all_students = get_students_by_class_name(class_name)
-
-            # 获取教室配置以确定最大座位数
-            classroom_config = get_classroom_by_id(classroom_id)
-            if classroom_config:
-                _, row, col = classroom_config
-                max_seats = min(row * col, 48)
+# 新增：更新学生签到状态
+@router.route("POST", "/checkin/{classroom_id:room}/update-student-status")
+def update_student_status(handler, classroom_id):
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+    
+    # 获取该教室对应的班级名称
+    class_name = get_class_name_by_classroom(classroom_id)
+    all_students = get_students_by_class_name(class_name)
+
+    # 获取教室配置以确定最大座位数
+    classroom_config = get_classroom_by_id(classroom_id)
+    if classroom_config:
+        _, row, col = classroom_config
+        max_seats = min(row * col, 48)
+    else:
+        max_seats = 48
+    
+    # 只处理提交了的学生（页面只提交有改动的行），没有提交的学生保持不变
+    validation_errors = []
+    changes = []
+    for student_id, name in all_students:
+        status_key = f"status_{student_id}"
+        seat_key = f"seat_{student_id}"
+        if status_key not in params and seat_key not in params:
+            continue
+        
+        status_value = params.get(status_key, ["缺勤"])[0]
+        seat_input = params.get(seat_key, ["-"])[0].strip()
+        
+        seat_num = None
+        if status_value not in STATUS_LABELS:
+            validation_errors.append(f"学号 {student_id}（{name}）：无效的签到状态 '{status_value}'")
+        elif status_value == "已签":
+            if seat_input == "" or seat_input == "-":
+                validation_errors.append(f"学号 {student_id}（{name}）：座位号不能为空")
             else:
-                max_seats = 48
-            
-            # 验证所有输入
-            validation_errors = []
-            for student_id, name in all_students:
-                status_key = f"status_{student_id}"
-                seat_key = f"seat_{student_id}"
-                
-                status_value = params.get(status_key, ["缺勤"])[0]
-                seat_input = params.get(seat_key, ["-"])[0].strip()
-                
-                if status_value == "已签":
-                    if seat_input == "" or seat_input == "-":
-                        validation_errors.append(f"学号 {student_id}（{name}）：座位号不能为空")
-                    else:
-                        try:
-                            seat_num_val = int(seat_input)
-                            if seat_num_val < 1 or seat_num_val > max_seats:
-                                validation_errors.append(f"学号 {student_id}（{name}）：座位号 {seat_num_val} 超出范围（1-{max_seats}）")
-                        except ValueError:
-                            validation_errors.append(f"学号 {student_id}（{name}）：座位号 '{seat_input}' 不是有效数字")
-            
-            if validation_errors:
-                # 返回错误页面
-                error_html = f"""<!DOCTYPE html>
+                try:
+                    seat_num = int(seat_input)
+                    if seat_num < 1 or seat_num > max_seats:
+                        validation_errors.append(f"学号 {student_id}（{name}）：座位号 {seat_num} 超出范围（1-{max_seats}）")
+                except ValueError:
+                    validation_errors.append(f"学号 {student_id}（{name}）：座位号 '{seat_input}' 不是有效数字")
+        changes.append((student_id, seat_num, status_value))
+    
+    page = params.get("page", ["1"])[0]
+    back_url = f"/checkin/{classroom_id}/view-by-student?page={urllib.parse.quote(page)}"
+    if validation_errors:
+        # 返回错误页面
+        error_html = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>输入错误</title>
 <style>
 body {{ font-family: sans-serif; padding: 20px; color: #d32f2f; }}
@@ -1084,374 +1576,514 @@ ul {{ margin-top: 10px; }}
 <body>
 <h2>保存失败：发现以下错误</h2>
 <ul>{''.join(f'<li>{err}</li>' for err in validation_errors)}</ul>
-<a href="/checkin/{classroom_id}/view-by-student" class="btn">返回修改</a>
+<a href="{back_url}" class="btn">返回修改</a>
 </body></html>"""
-                self.send_response(400)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(error_html.encode('utf-8'))
-                return
-            
-            # 清空当前教室的所有临时签到记录
-            clear_temp_checkins(classroom_id)
-            
-            # 重新添加所有学生记录
-            updated_count = 0
-            for student_id, name in all_students:
-                status_value = params.get(f"status_{student_id}", ["缺勤"])[0]
-                seat_input = params.get(f"seat_{student_id}", ["-"])[0].strip()
-                
-                seat_num = None
-                if status_value == "已签":
-                    seat_num = int(seat_input)  # 已通过验证
-                
-                if add_temp_checkin(student_id, classroom_id, seat_num, status_value):
-                    updated_count += 1
-            
-            redirect_url = f"/checkin/{classroom_id}/view-by-student"
-            html_resp = f"""<!DOCTYPE html>
+        handler._send_body(400, error_html.encode('utf-8'))
+        return
+    
+    # 在一个事务中写入改动的学生，名单中其余学生没有记录的按缺勤补齐
+    updated_count = update_temp_checkins(classroom_id, class_name, changes)
+    occupancy.reload_room(classroom_id, [(row[0], row[2]) for row in get_temp_checkins_with_ids_by_classroom(classroom_id)])
+    
+    html_resp = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>更新成功</title>
-<meta http-equiv="refresh" content="2;url={redirect_url}"></head>
+<meta http-equiv="refresh" content="2;url={back_url}"></head>
 <body><p>已更新 {updated_count} 名学生的签到状态，2秒后返回...</p></body></html>"""
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_resp.encode('utf-8'))
-            return
+    handler._send_body(200, html_resp.encode('utf-8'))
 
-        # ✅ 匹配 /checkin/{id}/save 和 /checkin/{id}/reset
-        save_match = re.match(r'^/checkin/(\d{3,4})/save$', path)
-        reset_match = re.match(r'^/checkin/(\d{3,4})/reset$', path)
-
-        if save_match:
-            classroom_id = save_match.group(1)
-            # 获取课程名称
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-            course_name = params.get("course", [""])[0]
-            
-            # 保存到数据库
-            count = save_checkin_records(classroom_id, course_name)
-            
-            redirect_url = f"/checkin/{classroom_id}/admin.html"
-            html_resp = f"""<!DOCTYPE html>
+
+# ✅ 保存签到记录
+@router.route("POST", "/checkin/{classroom_id:room}/save")
+def save(handler, classroom_id):
+    # 获取课程名称
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+    course_name = params.get("course", [""])[0]
+    
+    # 保存到数据库
+    student_ids = [row[0] for row in get_temp_checkins_with_ids_by_classroom(classroom_id)]
+    count = save_checkin_records(classroom_id, course_name)
+    student_history.invalidate(student_ids)
+    
+    redirect_url = f"/checkin/{classroom_id}/admin.html"
+    html_resp = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>保存成功</title>
 <meta http-equiv="refresh" content="2;url={redirect_url}"></head>
 <body><p>已保存 {count} 条签到记录，2秒后返回...</p></body></html>"""
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_resp.encode('utf-8'))
-            return
+    handler._send_body(200, html_resp.encode('utf-8'))
 
-        if reset_match:
-            classroom_id = reset_match.group(1)
-            # 使用 database.clear_temp_checkins 清空该教室的临时签到数据
-            try:
-                deleted_count = clear_temp_checkins(classroom_id)
-            except Exception:
-                deleted_count = 0
 
-            redirect_url = f"/checkin/{classroom_id}/admin.html"
-            html_resp = f"""<!DOCTYPE html>
+# ✅ 重置临时签到数据
+@router.route("POST", "/checkin/{classroom_id:room}/reset")
+def reset(handler, classroom_id):
+    # 使用 database.clear_temp_checkins 清空该教室的临时签到数据
+    try:
+        deleted_count = clear_temp_checkins(classroom_id)
+    except Exception:
+        deleted_count = 0
+    occupancy.invalidate()
+
+    redirect_url = f"/checkin/{classroom_id}/admin.html"
+    html_resp = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>重置成功</title>
 <meta http-equiv="refresh" content="1;url={redirect_url}"></head>
 <body><p>已清除 {deleted_count} 条临时签到数据，1秒后返回...</p></body></html>"""
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_resp.encode('utf-8'))
-            return
+    handler._send_body(200, html_resp.encode('utf-8'))
+
 
-        # ✅ 开始签到
-        start_match = re.match(r'^/checkin/(\d{3,4})/start-checkin$', path)
-        if start_match:
-            classroom_id = start_match.group(1)
-            CheckinHandler.checkin_enabled[classroom_id] = True
-            redirect_url = f"/checkin/{classroom_id}/admin.html"
-            html_resp = f"""<!DOCTYPE html>
+# ✅ 开始签到
+@router.route("POST", "/checkin/{classroom_id:room}/start-checkin")
+def start_checkin(handler, classroom_id):
+    checkin_windows.set_enabled(classroom_id, True)
+    # 临时数据可能已被其它进程修改，开始签到时从数据库重新加载占座索引
+    occupancy.invalidate()
+    redirect_url = f"/checkin/{classroom_id}/admin.html"
+    html_resp = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>签到已开始</title>
 <meta http-equiv="refresh" content="1;url={redirect_url}"></head>
 <body><p>签到已开始，学生可以扫码签到。</p></body></html>"""
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_resp.encode('utf-8'))
-            return
+    handler._send_body(200, html_resp.encode('utf-8'))
+
 
-        # ✅ 结束签到
-        stop_match = re.match(r'^/checkin/(\d{3,4})/stop-checkin$', path)
-        if stop_match:
-            classroom_id = stop_match.group(1)
-            CheckinHandler.checkin_enabled[classroom_id] = False
-            redirect_url = f"/checkin/{classroom_id}/admin.html"
-            html_resp = f"""<!DOCTYPE html>
+# ✅ 结束签到
+@router.route("POST", "/checkin/{classroom_id:room}/stop-checkin")
+def stop_checkin(handler, classroom_id):
+    checkin_windows.set_enabled(classroom_id, False)
+    redirect_url = f"/checkin/{classroom_id}/admin.html"
+    html_resp = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>签到已结束</title>
 <meta http-equiv="refresh" content="1;url={redirect_url}"></head>
 <body><p>签到已结束，学生无法继续签到。</p></body></html>"""
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_resp.encode('utf-8'))
-            return
-
-        # 仅在路径为 /checkin/{id}/checkin-XX.html 时处理学生扫码签到请求，
-        # 否则保留给其它 POST 分支（比如导出记录）处理。
-        checkin_post_match = re.match(r'^/checkin/(\d{3,4})/checkin-(\d{2})\.html$', path)
-        if checkin_post_match:
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length) if content_length > 0 else b''
-            content_type = self.headers.get('Content-Type', '')
-
-            student_id = None
-            if 'application/json' in content_type:
-                try:
-                    data = json.loads(body.decode('utf-8'))
-                    student_id = data.get('student_id') or data.get('user_id')
-                except json.JSONDecodeError:
-                    student_id = None
-            else:
-                try:
-                    parsed = urllib.parse.parse_qs(body.decode('utf-8'))
-                    student_id = parsed.get('student_id', [None])[0]
-                except Exception:
-                    student_id = None
-
-            if student_id:
-                classroom_id = checkin_post_match.group(1)
-                seq = int(checkin_post_match.group(2))
-
-                # 检查是否允许签到
-                if not CheckinHandler.checkin_enabled.get(classroom_id, False):
-                    message = "签到未开始或已结束"
-                    status = 403
-                else:
-                    # 查询数据库获取姓名
-                    conn = sqlite3.connect(DATABASE_PATH)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT name FROM students WHERE student_id = ?", (student_id,))
-                    row = cursor.fetchone()
-                    conn.close()
-
-                    if not row:
-                        message = "学号未找到，请确认是否已导入名单"
-                        status = 400
-                    else:
-                        name = row[0]
-                        if add_temp_checkin(student_id, classroom_id, seq, "已签"):
-                            message = f"签到成功：{name}"
-                            status = 200
-                        else:
-                            message = "签到失败"
-                            status = 500
-            else:
-                message = "缺少学号"
+    handler._send_body(200, html_resp.encode('utf-8'))
+
+
+# 设置每日自动开始/结束签到时间
+@router.route("POST", "/checkin/{classroom_id:room}/schedule-checkin")
+def schedule_checkin(handler, classroom_id):
+    params = urllib.parse.parse_qs(handler._read_body().decode('utf-8'))
+    open_time = params.get("open_time", [""])[0]
+    close_time = params.get("close_time", [""])[0]
+    redirect_url = f"/checkin/{classroom_id}/admin.html"
+    try:
+        checkin_windows.set_schedule(classroom_id, open_time, close_time)
+    except ValueError as e:
+        html_resp = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>设置失败</title></head>
+<body><p>{e}</p><p><a href="{redirect_url}">返回</a></p></body></html>"""
+        handler._send_body(400, html_resp.encode('utf-8'))
+        return
+
+    html_resp = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>时间表已保存</title>
+<meta http-equiv="refresh" content="1;url={redirect_url}"></head>
+<body><p>签到时间表已保存，1秒后返回...</p></body></html>"""
+    handler._send_body(200, html_resp.encode('utf-8'))
+
+
+# 学生扫码签到：/checkin/{id}/checkin-XX.html
+@router.route("POST", "/checkin/{classroom_id:room}/checkin-{seq:seq}.html", max_body=SCAN_MAX_BODY,
+              content_types=SCAN_CONTENT_TYPES, rate_limits=SCAN_RATE_LIMITS, priority=PRIORITY_SCAN)
+def scan_checkin(handler, classroom_id, seq):
+    student_id = _scan_student_id(handler)
+    if student_id:
+        seq = int(seq)
+
+        # 检查是否允许签到
+        if not checkin_windows.is_open(classroom_id):
+            message = "签到未开始或已结束"
+            status = 403
+        else:
+            # 占座检查以数据库为准：座位已被其他同学签到时拒绝；
+            # 同时在其他教室签到的记为冲突，在管理页面提示
+            try:
+                result, name = claim_temp_seat(student_id, classroom_id, seq, "已签")
+            except sqlite3.Error:
+                result = name = None
+            if result == "unknown":
+                message = "学号未找到，请确认是否已导入名单"
                 status = 400
-
-            self.send_response(status)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(self._render_form(message=message))
-            return
-        
-
-        if path == "/checkin/export-record":
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(body)
-
-            # 支持批量导出：优先从表单的 export_record[] 获取多个选中项（格式为 course||save_time||classroom_id）
-            export_items = params.get("export_record", [])
-
-            rows = []
-            # ensure these exist for filename/header fallback
-            course = save_time = classroom_id = ""
-
-            # 如果用户未选中任何复选框，直接返回提示页面，不做其它操作
-            if not export_items:
-                html = f"""<!DOCTYPE html>
+            elif result == "taken":
+                metrics.inc("checkin_occupancy_conflicts_total", kind="seat")
+                message = f"{seq:02d} 号座位已有其他同学签到，请确认座位号"
+                status = 409
+            elif result == "ok":
+                if occupancy.record(student_id, classroom_id, seq):
+                    metrics.inc("checkin_occupancy_conflicts_total", kind="multi_room")
+                message = f"签到成功：{name}"
+                status = 200
+            else:
+                message = "签到失败"
+                status = 500
+    else:
+        message = "缺少学号"
+        status = 400
+
+    handler._send_body(status, handler._render_form(message=message))
+
+
+# 批量扫码：JSON 数组或 NDJSON，每条记录带幂等 key，整批在一个事务中写入，按提交顺序返回每条的结果
+@router.route("POST", "/checkin/scan/batch", max_body=SCAN_BATCH_MAX_BODY,
+              content_types=SCAN_BATCH_CONTENT_TYPES, rate_limits=SCAN_BATCH_RATE_LIMITS, priority=PRIORITY_SCAN)
+def scan_batch(handler):
+    try:
+        records = parse_batch(handler._read_body(), handler.headers.get('Content-Type', ''))
+        results = apply_scan_batch(records, student_limit=SCAN_STUDENT_LIMIT)
+    except BatchError as e:
+        status, body = 400, {"error": str(e)}
+    except sqlite3.Error:
+        status, body = 500, {"error": "签到失败，请稍后重试"}
+    else:
+        accepted = sum(1 for r in results if r["status"] == 200)
+        status, body = 200, {"accepted": accepted, "rejected": len(results) - accepted, "results": results}
+    handler._send_body(status, json.dumps(body, ensure_ascii=False).encode('utf-8'),
+                       content_type='application/json; charset=utf-8')
+
+
+# ✅ 导出签到明细为 xlsx
+@router.route("POST", "/checkin/export-record", priority=PRIORITY_BULK)
+def export_record(handler):
+    body = handler._read_body().decode('utf-8')
+    params = urllib.parse.parse_qs(body)
+
+    # 支持批量导出：优先从表单的 export_record[] 获取多个选中项（签到ID，已归档的为 course||save_time||classroom_id）
+    export_items = params.get("export_record", [])
+
+    rows = []
+    # ensure these exist for filename/header fallback
+    course = save_time = classroom_id = ""
+
+    # 如果用户未选中任何复选框，直接返回提示页面，不做其它操作
+    if not export_items:
+        html = f"""<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>未选择记录</title></head>
 <body style="font-family: sans-serif; padding:20px;">
   <h2>没有选择任何签到记录</h2>
   <p>请返回并选择至少一条签到记录后再导出。</p>
 </body></html>"""
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(html.encode('utf-8'))
-                return
-            
-            if export_items:
-                # 使用第一个选中项作为导出文件命名与表头日期的来源
-                first_meta = None
-                for item in export_items:
-                    try:
-                        c, st, cid = item.split("||", 2)
-                    except Exception:
-                        continue
-                    if first_meta is None:
-                        first_meta = (c, st, cid)
-                        course, save_time, classroom_id = c, st, cid
-
-                    # 首选 helper 查询
-                    recs = None
-                    if get_checkin_records_by_save_time:
-                        try:
-                            recs = get_checkin_records_by_save_time(c, st, cid)
-                        except Exception:
-                            recs = None
-
-                    # 回退到直连查询
-                    if recs is None:
-                        try:
-                            conn = sqlite3.connect(DATABASE_PATH)
-                            cur = conn.cursor()
-                            cur.execute(
-                                "SELECT student_id, name, status FROM checkin_records WHERE course=? AND save_time=? AND classroom_id=?",
-                                (c, st, cid)
-                            )
-                            fetched = cur.fetchall()
-                            conn.close()
-                            recs = [{"student_id": r[0], "name": r[1], "status": r[2]} for r in fetched]
-                        except Exception:
-                            recs = []
-
-                    for r in recs:
-                        if isinstance(r, dict):
-                            rows.append(r)
-                        else:
-                            rows.append({"student_id": r[0], "name": r[1], "status": r[2]})
-            # end of export_items handling, continue with rows aggregation...
-
-            if not rows:
-                self._send_import_result("未找到符合条件的签到记录", success=False)
-                return
+        handler._send_body(200, html.encode('utf-8'))
+        return
+    
+    if export_items:
+        # 使用第一个选中项作为导出文件命名与表头日期的来源
+        first_meta = None
+        # 数据库中的签到在同一个只读快照中一次读出
+        live_sessions = get_sessions_with_records([int(item) for item in export_items if item.isdigit()])
+        for item in export_items:
+            recs = None
+            if item.isdigit():
+                if int(item) not in live_sessions:
+                    continue
+                session = live_sessions[int(item)]["session"]
+                c, st, cid = session["course"], session["save_time"], session["classroom_id"]
+                recs = live_sessions[int(item)]["records"]
+            else:
+                try:
+                    c, st, cid = item.split("||", 2)
+                except Exception:
+                    continue
+            if first_meta is None:
+                first_meta = (c, st, cid)
+                course, save_time, classroom_id = c, st, cid
 
-            # 准备生成 xlsx
-            try:
-                from io import BytesIO
-                import openpyxl
-            except ImportError:
-                self._send_import_result("服务器缺少 openpyxl 库，请 pip install openpyxl", success=False)
-                return
-            except Exception as e:
-                self._send_import_result(f"无法初始化导出模块: {e}", success=False)
-                return
+            # 首选 helper 查询
+            if recs is None and get_checkin_records_by_save_time:
+                try:
+                    recs = get_checkin_records_by_save_time(c, st, cid, include_archived=True)
+                except Exception:
+                    recs = None
 
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            # 确保 ws 不为 None；如果为 None 或者设置 title 失败，则创建新 sheet
-            if ws is None:
-                ws = wb.create_sheet(title="签到明细")
-            else:
+            # 回退到直连查询
+            if recs is None:
                 try:
-                    ws.title = "签到明细"
+                    conn = connect_reporting()
+                    cur = conn.cursor()
+                    cur.execute(
+                        "SELECT student_id, name, status FROM checkin_records WHERE course=? AND save_time=? AND classroom_id=?",
+                        (c, st, cid)
+                    )
+                    fetched = cur.fetchall()
+                    conn.close()
+                    recs = [{"student_id": r[0], "name": r[1], "status": r[2]} for r in fetched]
                 except Exception:
-                    ws = wb.create_sheet(title="签到明细")
-            # 移除多余的空默认 sheet（可选），保留名为 "签到明细" 的表
-            try:
-                if len(wb.sheetnames) > 1:
-                    for name in list(wb.sheetnames):
-                        if name != "签到明细":
-                            sh = wb[name]
-                            if sh.max_row == 1 and sh.max_column == 1 and sh.cell(1, 1).value is None:
-                                wb.remove(sh)
-            except Exception:
-                # 如果移除失败也不影响后续导出
-                pass
-
-            # 小工具：从各种字符串中提取并标准化为 yyyy-mm-dd
-            def _extract_date(val, fallback=""):
-                if not val:
-                    return fallback
-                s = str(val)
-                m = re.search(r'(\d{4}-\d{2}-\d{2})', s)
-                if m:
-                    return m.group(1)
-                m = re.search(r'(\d{4}/\d{2}/\d{2})', s)
-                if m:
-                    return m.group(1).replace('/', '-')
-                m = re.search(r'(\d{8})', s)
-                if m:
-                    g = m.group(1)
-                    return f"{g[0:4]}-{g[4:6]}-{g[6:8]}"
-                return fallback
-
-            # 第三列标题为指定的日期（yyyy-mm-dd），优先使用请求中的 save_time，否则使用今天
-            header_date = _extract_date(save_time, "")
-            if not header_date:
-                header_date = datetime.date.today().isoformat()
-            ws.append(["学号", "姓名", header_date])
-
-            # 列内容保留为签到状态（status）
-            for r in rows:
-                sid = name = status = ""
+                    recs = []
+
+            for r in recs:
                 if isinstance(r, dict):
-                    sid = r.get("student_id") or r.get("id") or r.get("学号") or ""
-                    name = r.get("name") or r.get("姓名") or ""
-                    status = r.get("status") or r.get("state") or r.get("状态") or ""
+                    rows.append(r)
                 else:
-                    vals = list(r)
-                    if len(vals) >= 1:
-                        sid = vals[0] or ""
-                    if len(vals) >= 2:
-                        name = vals[1] or ""
-                    if len(vals) >= 3:
-                        status = vals[2] or ""
-                ws.append([sid, name, status])
-
-            bio = BytesIO()
-            wb.save(bio)
-            bio.seek(0)
-
-            # 构造安全的文件名（移除潜在危险字符并限制长度）
-            def _safe_name(s: str, maxlen=60):
-                s = str(s or "")
-                s = re.sub(r'[\\/:*?"<>|]+', "_", s)
-                s = re.sub(r'\s+', "_", s)
-                return s[:maxlen]
-
-            # 当为批量导出时，若未提供明确 course/save_time/classroom_id，使用通用命名
-            if export_items:
-                now_tag = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                safe_course = "multiple"
-                safe_time = now_tag
-                safe_class = "multiple"
-            else:
-                safe_course = _safe_name(course)
-                safe_time = _safe_name(save_time)
-                safe_class = _safe_name(classroom_id)
-
-            raw_fname = f"checkin_{safe_class}_{safe_course}_{safe_time}.xlsx"
-            # 为 Content-Disposition 做 URL 引用，确保中文也可用
-            quoted = urllib.parse.quote(raw_fname)
-
-            # 构造仅包含 ASCII 的 header 值以避免 latin-1 编码错误：
-            # 用不可打印/非 ASCII 字符替换为下划线作为 filename 回退，
-            # 同时保留 RFC5987 的 filename*（使用 percent-encoding 的 UTF-8）。
-            ascii_fname = re.sub(r'[^\x20-\x7E]', '_', raw_fname) or "download.xlsx"
-            disposition = f'attachment; filename="{ascii_fname}"; filename*=UTF-8\'\'{quoted}'
-
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            self.send_header('Content-Disposition', disposition)
-            self.end_headers()
-            self.wfile.write(bio.read())
-            return
-
-    def _send_import_result(self, message, success=True):
-        """返回导入结果页面"""
-        status = 200 if success else 400
-        html = f"""<!DOCTYPE html>
-<html><head><meta charset="utf-8"><title>导入结果</title></head>
+                    rows.append({"student_id": r[0], "name": r[1], "status": r[2]})
+    # end of export_items handling, continue with rows aggregation...
+
+    if not rows:
+        handler._send_import_result("未找到符合条件的签到记录", success=False)
+        return
+
+    # 准备生成 xlsx
+    try:
+        from io import BytesIO
+        import openpyxl
+    except ImportError:
+        handler._send_import_result("服务器缺少 openpyxl 库，请 pip install openpyxl", success=False)
+        return
+    except Exception as e:
+        handler._send_import_result(f"无法初始化导出模块: {e}", success=False)
+        return
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    # 确保 ws 不为 None；如果为 None 或者设置 title 失败，则创建新 sheet
+    if ws is None:
+        ws = wb.create_sheet(title="签到明细")
+    else:
+        try:
+            ws.title = "签到明细"
+        except Exception:
+            ws = wb.create_sheet(title="签到明细")
+    # 移除多余的空默认 sheet（可选），保留名为 "签到明细" 的表
+    try:
+        if len(wb.sheetnames) > 1:
+            for name in list(wb.sheetnames):
+                if name != "签到明细":
+                    sh = wb[name]
+                    if sh.max_row == 1 and sh.max_column == 1 and sh.cell(1, 1).value is None:
+                        wb.remove(sh)
+    except Exception:
+        # 如果移除失败也不影响后续导出
+        pass
+
+    # 小工具：从各种字符串中提取并标准化为 yyyy-mm-dd
+    def _extract_date(val, fallback=""):
+        if not val:
+            return fallback
+        s = str(val)
+        m = re.search(r'(\d{4}-\d{2}-\d{2})', s)
+        if m:
+            return m.group(1)
+        m = re.search(r'(\d{4}/\d{2}/\d{2})', s)
+        if m:
+            return m.group(1).replace('/', '-')
+        m = re.search(r'(\d{8})', s)
+        if m:
+            g = m.group(1)
+            return f"{g[0:4]}-{g[4:6]}-{g[6:8]}"
+        return fallback
+
+    # 第三列标题为指定的日期（yyyy-mm-dd），优先使用请求中的 save_time，否则使用今天
+    header_date = _extract_date(save_time, "")
+    if not header_date:
+        header_date = datetime.date.today().isoformat()
+    ws.append(["学号", "姓名", header_date])
+
+    # 列内容保留为签到状态（status）
+    for r in rows:
+        sid = name = status = ""
+        if isinstance(r, dict):
+            sid = r.get("student_id") or r.get("id") or r.get("学号") or ""
+            name = r.get("name") or r.get("姓名") or ""
+            status = r.get("status") or r.get("state") or r.get("状态") or ""
+        else:
+            vals = list(r)
+            if len(vals) >= 1:
+                sid = vals[0] or ""
+            if len(vals) >= 2:
+                name = vals[1] or ""
+            if len(vals) >= 3:
+                status = vals[2] or ""
+        ws.append([sid, name, status])
+
+    bio = BytesIO()
+    wb.save(bio)
+    bio.seek(0)
+
+    # 构造安全的文件名（移除潜在危险字符并限制长度）
+    def _safe_name(s: str, maxlen=60):
+        s = str(s or "")
+        s = re.sub(r'[\\/:*?"<>|]+', "_", s)
+        s = re.sub(r'\s+', "_", s)
+        return s[:maxlen]
+
+    # 当为批量导出时，若未提供明确 course/save_time/classroom_id，使用通用命名
+    if export_items:
+        now_tag = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_course = "multiple"
+        safe_time = now_tag
+        safe_class = "multiple"
+    else:
+        safe_course = _safe_name(course)
+        safe_time = _safe_name(save_time)
+        safe_class = _safe_name(classroom_id)
+
+    raw_fname = f"checkin_{safe_class}_{safe_course}_{safe_time}.xlsx"
+    # 为 Content-Disposition 做 URL 引用，确保中文也可用
+    quoted = urllib.parse.quote(raw_fname)
+
+    # 构造仅包含 ASCII 的 header 值以避免 latin-1 编码错误：
+    # 用不可打印/非 ASCII 字符替换为下划线作为 filename 回退，
+    # 同时保留 RFC5987 的 filename*（使用 percent-encoding 的 UTF-8）。
+    ascii_fname = re.sub(r'[^\x20-\x7E]', '_', raw_fname) or "download.xlsx"
+    disposition = f'attachment; filename="{ascii_fname}"; filename*=UTF-8\'\'{quoted}'
+
+    handler._send_body(200, bio.getvalue(),
+                       content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                       headers={'Content-Disposition': disposition})
+    return
+
+
+# Prometheus 指标
+# 监控接口不经过准入控制，过载时也能查看
+@router.route("GET", "/checkin/metrics", priority=None)
+def metrics_page(handler):
+    handler._send_body(200, metrics.render().encode('utf-8'),
+                       content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# 健康检查：探测数据库延迟
+@router.route("GET", "/checkin/healthz", priority=None)
+def healthz(handler):
+    try:
+        latency = ping_database()
+    except Exception as e:
+        body = {"status": "error", "error": str(e)}
+        handler._send_body(503, json.dumps(body).encode('utf-8'), content_type='application/json')
+        return
+    body = {"status": "ok", "db_latency_ms": round(latency * 1000, 3)}
+    handler._send_body(200, json.dumps(body).encode('utf-8'), content_type='application/json')
+
+
+# 请求抽样分析：查看各路由的热点函数
+@router.route("GET", "/checkin/manage/profiling")
+def profiling_page(handler):
+    summary = profiler.summary()
+    routes = ",".join(sorted(profiler.routes)) if profiler.routes else ""
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>请求分析</title>
+<style>
+body {{ font-family: sans-serif; padding: 20px; }}
+table {{ border-collapse: collapse; margin-bottom: 20px; }}
+th, td {{ padding: 4px 8px; border: 1px solid #ddd; text-align: left; font-size: 13px; }}
+th {{ background-color: #f2f2f2; }}
+</style>
+</head>
 <body>
-<h2>导入结果</h2>
-<p>{message}</p>
-<p><a href="/checkin/manage.html">返回管理页面</a></p>
-</body></html>"""
-        self.send_response(status)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.end_headers()
-        self.wfile.write(html.encode('utf-8'))
-
+<h2>请求抽样分析</h2>
+<form method="POST" action="/checkin/manage/profiling">
+  <label>抽样比例 (0~1): <input name="rate" value="{profiler.rate}"></label>
+  <label>限定路由（逗号分隔，留空为全部）: <input name="routes" value="{routes}"></label>
+  <button type="submit" name="action" value="configure">保存</button>
+  <button type="submit" name="action" value="reset">清空统计</button>
+  <button type="submit" name="action" value="dump">立即写入文件</button>
+</form>
+<p>分析结果每 {profiler.dump_interval} 秒写入 {PROFILE_DIR}/&lt;路由&gt;.pstats</p>
+"""
+    if not summary:
+        html += "<p>暂无抽样数据</p>"
+    for route_name, info in sorted(summary.items()):
+        html += f"<h3>{route_name}（{info['samples']} 次抽样）</h3>"
+        html += "<table><tr><th>函数</th><th>调用次数</th><th>自身耗时(s)</th><th>累计耗时(s)</th></tr>"
+        for where, ncalls, tottime, cumtime in info["top"]:
+            html += f"<tr><td>{html_escape(where)}</td><td>{ncalls}</td><td>{tottime:.4f}</td><td>{cumtime:.4f}</td></tr>"
+        html += "</table>"
+    html += '<p><a href="/checkin/manage.html">返回管理页面</a></p></body></html>'
+    handler._send_body(200, html.encode('utf-8'))
+
+
+@router.route("POST", "/checkin/manage/profiling")
+def configure_profiling(handler):
+    params = urllib.parse.parse_qs(handler._read_body().decode('utf-8'))
+    action = params.get("action", [""])[0]
+    if action == "reset":
+        profiler.reset()
+    elif action == "dump":
+        profiler.dump()
+    else:
+        try:
+            rate = float(params.get("rate", ["0"])[0] or 0)
+        except ValueError:
+            rate = 0.0
+        routes = [r.strip() for r in params.get("routes", [""])[0].split(",") if r.strip()]
+        profiler.configure(rate=rate, routes=routes)
+    handler._send_redirect("/checkin/manage/profiling")
+
+
+# 数据库维护：查看最近一次各维护任务的结果，或立即运行
+@router.route("GET", "/checkin/manage/maintenance")
+def maintenance_page(handler):
+    windows = ", ".join(f"{start}-{end}" for start, end in maintenance.windows) or "未配置"
+    open_rooms = checkin_windows.open_classrooms()
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>数据库维护</title>
+<style>
+body {{ font-family: sans-serif; padding: 20px; }}
+table {{ border-collapse: collapse; margin-bottom: 20px; }}
+th, td {{ padding: 4px 8px; border: 1px solid #ddd; text-align: left; font-size: 13px; }}
+th {{ background-color: #f2f2f2; }}
+</style>
+</head>
+<body>
+<h2>数据库维护</h2>
+<p>维护时段：{html_escape(windows)}；临时签到数据保留 {maintenance.temp_ttl // 3600} 小时</p>
+<p>正在签到的教室：{html_escape(", ".join(sorted(open_rooms))) or "无"}（有教室签到时不会运行维护）</p>
+<form method="POST" action="/checkin/manage/maintenance">
+  <button type="submit" name="action" value="due">运行到期任务</button>
+  <button type="submit" name="action" value="force">立即运行全部任务</button>
+</form>
+<table><tr><th>任务</th><th>上次运行</th><th>耗时(s)</th><th>结果</th></tr>
+"""
+    for name in maintenance._jobs():
+        report = maintenance.reports.get(name)
+        if report:
+            html += (f"<tr><td>{name}</td><td>{report['at']}</td><td>{report['duration']:.3f}</td>"
+                     f"<td>{html_escape(report['result'])}</td></tr>")
+        else:
+            html += f"<tr><td>{name}</td><td>-</td><td>-</td><td>尚未运行</td></tr>"
+    html += '</table><p><a href="/checkin/manage.html">返回管理页面</a></p></body></html>'
+    handler._send_body(200, html.encode('utf-8'))
+
+
+@router.route("POST", "/checkin/manage/maintenance", priority=PRIORITY_BULK)
+def run_maintenance(handler):
+    params = urllib.parse.parse_qs(handler._read_body().decode('utf-8'))
+    force = params.get("action", [""])[0] == "force"
+    if checkin_windows.open_classrooms():
+        handler._send_body(409, "有教室正在签到，请结束签到后再运行维护".encode('utf-8'),
+                           content_type='text/plain; charset=utf-8')
+        return
+    maintenance.run_due(force=force)
+    handler._send_redirect("/checkin/manage/maintenance")
+
+
+# 数据库备份：列出已有备份，或在后台立即备份一次
+@router.route("GET", "/checkin/manage/backup")
+def backup_page(handler):
+    entries = load_backup_manifest(backups.backup_dir)["backups"]
+    interval = f"每 {backups.interval / 3600:g} 小时" if backups.interval else "未开启"
+    status = "正在备份…" if backups.running else html_escape(backups.last_result or "-")
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>数据库备份</title>
+<style>
+body {{ font-family: sans-serif; padding: 20px; }}
+table {{ border-collapse: collapse; margin-bottom: 20px; }}
+th, td {{ padding: 4px 8px; border: 1px solid #ddd; text-align: left; font-size: 13px; }}
+th {{ background-color: #f2f2f2; }}
+</style>
+</head>
+<body>
+<h2>数据库备份</h2>
+<p>备份目录：{html_escape(backups.backup_dir)}；定时备份：{interval}；保留 {backups.keep} 份</p>
+<p>最近一次：{status}</p>
+<form method="POST" action="/checkin/manage/backup">
+  <button type="submit">立即备份</button>
+</form>
+<table><tr><th>时间</th><th>文件</th><th>大小(字节)</th></tr>
+"""
+    for entry in reversed(entries):
+        html += f"<tr><td>{entry['created_at']}</td><td>{html_escape(entry['file'])}</td><td>{entry['bytes']}</td></tr>"
+    html += '</table><p><a href="/checkin/manage.html">返回管理页面</a></p></body></html>'
+    handler._send_body(200, html.encode('utf-8'))
+
+
+@router.route("POST", "/checkin/manage/backup")
+def run_backup(handler):
+    handler._read_body()
+    backups.run_async()
+    handler._send_redirect("/checkin/manage/backup")
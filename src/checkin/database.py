@@ -1,12 +1,48 @@
+import os
+import re
 import sqlite3
+import time
+import urllib.parse
 
-DATABASE_PATH = "checkin.db"
+from .metrics import metrics
 
+DATABASE_PATH = "checkin.db"
 
-def init_database():
-    """初始化数据库，创建 classrooms、students 和 checkin 表"""
-    conn = sqlite3.connect(DATABASE_PATH)
+# 签到状态，下标即 statuses 表中的整数编码；数据库中只保存编码，读取时换回文字
+STATUS_LABELS = ("已签", "迟到", "早退", "事假", "病假", "公假", "缺勤")
+
+# checkin 按 (session_id, student_ref) 聚簇：同一次签到的记录存放在一起
+_CHECKIN_SCHEMA = '''(
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    student_ref INTEGER NOT NULL REFERENCES checkin_students (id),
+    status INTEGER NOT NULL REFERENCES statuses (code),
+    PRIMARY KEY (session_id, student_ref)
+) WITHOUT ROWID'''
+
+_CHECKIN_TEMP_SCHEMA = '''(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    status INTEGER NOT NULL REFERENCES statuses (code),
+    class_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    seat_number INTEGER,
+    classroom_id TEXT NOT NULL,
+    created_at REAL DEFAULT (strftime('%s', 'now')),
+    FOREIGN KEY (student_id) REFERENCES students (student_id)
+)'''
+
+
+def _timed(func):
+    """记录数据库函数的耗时（checkin_db_query_duration_seconds）"""
+    return metrics.timed("checkin_db_query_duration_seconds", query=func.__name__)(func)
+
+
+def init_database(db_path=None):
+    """初始化数据库，创建 classrooms、students、sessions 和 checkin 等表，旧版数据库就地迁移"""
+    conn = sqlite3.connect(db_path or DATABASE_PATH)
     cursor = conn.cursor()
+    # WAL 模式：读不阻塞写，检查点由维护任务定期执行
+    cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS classrooms (
             id TEXT PRIMARY KEY,
@@ -23,33 +59,126 @@ def init_database():
             class_name TEXT NOT NULL
         )
     ''')
-    # 创建 checkin 表 - 添加 classroom_id 字段, 默认状态改为"缺勤"
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS checkin (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+    # 签到记录：sessions 每次保存一行（整数ID、epoch 时间），checkin_students 保存签到时的学号、姓名、班级
+    # （名单删除或重新导入不影响历史），checkin 每名学生一行，只保存整数ID和状态编码
+    cursor.execute("PRAGMA user_version")
+    schema_version = cursor.fetchone()[0]
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY,
+            course TEXT,
+            classroom_id TEXT NOT NULL,
+            saved_at INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_saved_at ON sessions (saved_at);
+        CREATE INDEX IF NOT EXISTS idx_sessions_course ON sessions (course, saved_at);
+        CREATE TABLE IF NOT EXISTS checkin_students (
+            id INTEGER PRIMARY KEY,
             student_id TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT '缺勤',
-            save_time TEXT NOT NULL,
-            class_name TEXT NOT NULL,
             name TEXT NOT NULL,
-            course TEXT,
-            classroom_id TEXT NOT NULL,  
-            FOREIGN KEY (student_id) REFERENCES students (student_id)
+            class_name TEXT NOT NULL,
+            UNIQUE (student_id, name, class_name)
+        );
+        CREATE TABLE IF NOT EXISTS statuses (
+            code INTEGER PRIMARY KEY,
+            label TEXT NOT NULL UNIQUE
+        );
+    ''')
+    cursor.executemany("INSERT OR IGNORE INTO statuses (code, label) VALUES (?, ?)", enumerate(STATUS_LABELS))
+    # 创建 checkin-temp 表（临时存储签到数据）
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS "checkin-temp" {_CHECKIN_TEMP_SCHEMA}')
+    # 旧数据库的 checkin-temp 没有 created_at，补上并把已有行的时间记为现在
+    cursor.execute('PRAGMA table_info("checkin-temp")')
+    if "created_at" not in [c[1] for c in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE "checkin-temp" ADD COLUMN created_at REAL')
+        cursor.execute('''UPDATE "checkin-temp" SET created_at = strftime('%s', 'now')''')
+    # 同一教室同一学号只保留最新一条，重复扫码时 INSERT OR REPLACE 覆盖旧记录
+    cursor.execute('''
+        DELETE FROM "checkin-temp" WHERE id NOT IN (
+            SELECT MAX(id) FROM "checkin-temp" GROUP BY classroom_id, student_id
         )
     ''')
-    # 创建 checkin-temp 表（临时存储签到数据）, 默认状态改为"缺勤"
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS "checkin-temp" (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            student_id TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT '缺勤',
-            class_name TEXT NOT NULL,
-            name TEXT NOT NULL,
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_checkin_temp_classroom_student
+        ON "checkin-temp" (classroom_id, student_id)
+    ''')
+    # 创建 checkin_windows 表：签到窗口状态及每日自动开始/结束时间，重启和多进程共享
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS checkin_windows (
+            classroom_id TEXT PRIMARY KEY,
+            enabled INTEGER NOT NULL DEFAULT 0,
+            open_time TEXT,
+            close_time TEXT,
+            changed_at REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    # 创建 scan_receipts 表：批量扫码中已签到成功的记录，同一 key 重复提交时直接返回成功
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scan_receipts (
+            key TEXT PRIMARY KEY,
+            classroom_id TEXT,
+            student_id TEXT,
             seat_number INTEGER,
-            classroom_id TEXT NOT NULL,
-            FOREIGN KEY (student_id) REFERENCES students (student_id)
+            scanned_at REAL,
+            received_at REAL NOT NULL,
+            message TEXT
+        ) WITHOUT ROWID
+    ''')
+    if schema_version < 2:
+        _report_duplicate_checkins(cursor)
+    if schema_version < 1:
+        _migrate_sessions(cursor)
+    if schema_version < 2:
+        _migrate_status_codes(cursor)
+    cursor.executescript(f'''
+        CREATE TABLE IF NOT EXISTS checkin {_CHECKIN_SCHEMA};
+        CREATE INDEX IF NOT EXISTS idx_checkin_student ON checkin (student_ref);
+        -- 与旧 checkin 表相同的列，供查询、导出和归档使用；id 由聚簇主键拼成，作为全文索引的 rowid
+        CREATE VIEW IF NOT EXISTS checkin_records AS
+            SELECT (c.session_id << 32) | c.student_ref AS id, c.session_id, p.student_id, st.label AS status,
+                   datetime(s.saved_at, 'unixepoch', 'localtime') AS save_time, s.saved_at,
+                   p.class_name, p.name, s.course, s.classroom_id
+            FROM checkin c
+            JOIN sessions s ON s.id = c.session_id
+            JOIN checkin_students p ON p.id = c.student_ref
+            JOIN statuses st ON st.code = c.status;
+        PRAGMA user_version = 2;
+    ''')
+    # 签到历史全文索引（外部内容为 checkin_records 视图），由 checkin 上的触发器同步
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'checkin_fts'")
+    fts_exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS checkin_fts USING fts5(
+            course, name, class_name, status, content='checkin_records', content_rowid='id'
         )
     ''')
+    cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS checkin_fts_insert AFTER INSERT ON checkin BEGIN
+            INSERT INTO checkin_fts (rowid, course, name, class_name, status)
+            SELECT (new.session_id << 32) | new.student_ref, s.course, p.name, p.class_name, st.label
+            FROM sessions s, checkin_students p, statuses st
+            WHERE s.id = new.session_id AND p.id = new.student_ref AND st.code = new.status;
+        END;
+        CREATE TRIGGER IF NOT EXISTS checkin_fts_delete AFTER DELETE ON checkin BEGIN
+            INSERT INTO checkin_fts (checkin_fts, rowid, course, name, class_name, status)
+            SELECT 'delete', (old.session_id << 32) | old.student_ref, s.course, p.name, p.class_name, st.label
+            FROM sessions s, checkin_students p, statuses st
+            WHERE s.id = old.session_id AND p.id = old.student_ref AND st.code = old.status;
+        END;
+        CREATE TRIGGER IF NOT EXISTS checkin_fts_update AFTER UPDATE ON checkin BEGIN
+            INSERT INTO checkin_fts (checkin_fts, rowid, course, name, class_name, status)
+            SELECT 'delete', (old.session_id << 32) | old.student_ref, s.course, p.name, p.class_name, st.label
+            FROM sessions s, checkin_students p, statuses st
+            WHERE s.id = old.session_id AND p.id = old.student_ref AND st.code = old.status;
+            INSERT INTO checkin_fts (rowid, course, name, class_name, status)
+            SELECT (new.session_id << 32) | new.student_ref, s.course, p.name, p.class_name, st.label
+            FROM sessions s, checkin_students p, statuses st
+            WHERE s.id = new.session_id AND p.id = new.student_ref AND st.code = new.status;
+        END;
+    ''')
+    if not fts_exists:
+        # 已有数据库首次建立索引
+        cursor.execute("INSERT INTO checkin_fts (checkin_fts) VALUES ('rebuild')")
     # 插入默认教室（仅当表为空时）
     cursor.execute("SELECT COUNT(*) FROM classrooms")
     if cursor.fetchone()[0] == 0:
@@ -58,6 +187,142 @@ def init_database():
     conn.close()
 
 
+def _report_duplicate_checkins(cursor):
+    """迁移前统计同一次签到中重复出现的学生，返回将被合并的行数
+
+    新结构中每次签到每名学生只有一行（主键 session_id, student_ref），迁移时重复的行只保留最后写入的一行，
+    被合并的行数和部分示例打印出来，运维人员可以据此核对或从备份中恢复历史数据。
+    """
+    cursor.execute("PRAGMA table_info(checkin)")
+    columns = [c[1] for c in cursor.fetchall()]
+    if "save_time" in columns:
+        query = '''
+            SELECT COUNT(*) - 1, course, save_time, classroom_id, student_id FROM checkin
+            GROUP BY course, save_time, classroom_id, student_id, name, class_name HAVING COUNT(*) > 1
+        '''
+    elif "id" in columns:
+        query = '''
+            SELECT COUNT(*) - 1, s.course, datetime(s.saved_at, 'unixepoch', 'localtime'), s.classroom_id, p.student_id
+            FROM checkin c JOIN sessions s ON s.id = c.session_id JOIN checkin_students p ON p.id = c.student_ref
+            GROUP BY c.session_id, c.student_ref HAVING COUNT(*) > 1
+        '''
+    else:
+        return 0
+    cursor.execute(query)
+    duplicates = cursor.fetchall()
+    dropped = sum(row[0] for row in duplicates)
+    if dropped:
+        print(f"Warning: checkin migration merges {dropped} duplicate rows "
+              f"({len(duplicates)} students repeated within one save); the last saved row of each is kept")
+        for row in duplicates[:10]:
+            print(f"  {', '.join(map(str, row[1:]))}: {row[0] + 1} rows")
+        if len(duplicates) > 10:
+            print(f"  ... and {len(duplicates) - 10} more")
+    return dropped
+
+
+def _migrate_sessions(cursor):
+    """把旧版 checkin 表（每行带 course、save_time、姓名、班级文本）迁移到 sessions + checkin_students + checkin
+
+    会话按保存时间编号，save_time（本地时间）转换为 epoch 秒。在一个事务中完成，全文索引随后按新结构重建。
+    """
+    cursor.execute("PRAGMA table_info(checkin)")
+    if "save_time" not in [c[1] for c in cursor.fetchall()]:
+        return
+    cursor.executescript('''
+        BEGIN;
+        INSERT INTO sessions (course, classroom_id, saved_at)
+            SELECT course, classroom_id, CAST(strftime('%s', save_time, 'utc') AS INTEGER) AS saved_at
+            FROM checkin
+            GROUP BY course, save_time, classroom_id
+            ORDER BY saved_at;
+        INSERT OR IGNORE INTO checkin_students (student_id, name, class_name)
+            SELECT DISTINCT student_id, name, class_name FROM checkin;
+        CREATE TABLE checkin_migrated (
+            id INTEGER PRIMARY KEY,
+            session_id INTEGER NOT NULL REFERENCES sessions (id),
+            student_ref INTEGER NOT NULL REFERENCES checkin_students (id),
+            status TEXT NOT NULL DEFAULT '缺勤'
+        );
+        INSERT INTO checkin_migrated (id, session_id, student_ref, status)
+            SELECT c.id, s.id, p.id, c.status
+            FROM checkin c
+            JOIN sessions s ON s.course IS c.course AND s.classroom_id = c.classroom_id
+                AND s.saved_at = CAST(strftime('%s', c.save_time, 'utc') AS INTEGER)
+            JOIN checkin_students p ON p.student_id = c.student_id AND p.name = c.name
+                AND p.class_name = c.class_name;
+        DROP TABLE IF EXISTS checkin_fts;
+        DROP TABLE checkin;
+        ALTER TABLE checkin_migrated RENAME TO checkin;
+        PRAGMA user_version = 1;
+        COMMIT;
+    ''')
+
+
+def _migrate_status_codes(cursor):
+    """把 checkin 和 checkin-temp 中的状态文字换成 statuses 表中的整数编码，checkin 改为 WITHOUT ROWID 聚簇表
+
+    不在 STATUS_LABELS 中的旧状态文字追加到 statuses 表，不会丢失。在一个事务中完成，全文索引随后重建。
+    """
+    cursor.execute("PRAGMA table_info(checkin)")
+    checkin_columns = [c[1] for c in cursor.fetchall()]
+    cursor.execute('PRAGMA table_info("checkin-temp")')
+    temp_status_text = any(c[1] == "status" and c[2].upper() == "TEXT" for c in cursor.fetchall())
+    script = ""
+    if "id" in checkin_columns:
+        script += f'''
+            INSERT OR IGNORE INTO statuses (label) SELECT DISTINCT status FROM checkin;
+            CREATE TABLE checkin_migrated {_CHECKIN_SCHEMA};
+            INSERT OR REPLACE INTO checkin_migrated (session_id, student_ref, status)
+                SELECT c.session_id, c.student_ref, st.code
+                FROM checkin c JOIN statuses st ON st.label = c.status
+                ORDER BY c.id;
+            DROP VIEW IF EXISTS checkin_records;
+            DROP TABLE IF EXISTS checkin_fts;
+            DROP TABLE checkin;
+            ALTER TABLE checkin_migrated RENAME TO checkin;
+        '''
+    if temp_status_text:
+        script += f'''
+            INSERT OR IGNORE INTO statuses (label) SELECT DISTINCT status FROM "checkin-temp";
+            CREATE TABLE checkin_temp_migrated {_CHECKIN_TEMP_SCHEMA};
+            INSERT INTO checkin_temp_migrated
+                (id, student_id, status, class_name, name, seat_number, classroom_id, created_at)
+                SELECT t.id, t.student_id, st.code, t.class_name, t.name, t.seat_number, t.classroom_id, t.created_at
+                FROM "checkin-temp" t JOIN statuses st ON st.label = t.status;
+            DROP TABLE "checkin-temp";
+            ALTER TABLE checkin_temp_migrated RENAME TO "checkin-temp";
+            CREATE UNIQUE INDEX idx_checkin_temp_classroom_student ON "checkin-temp" (classroom_id, student_id);
+        '''
+    if script:
+        cursor.executescript(f"BEGIN; {script} PRAGMA user_version = 2; COMMIT;")
+
+
+def connect_reporting():
+    """报表和导出用的只读连接
+
+    以 mode=ro 打开并设置 query_only，不会与扫码的写入争用写锁；连接上已开始读事务，
+    关闭前的所有查询看到同一个快照。用完应尽快关闭，长时间打开的读事务会推迟 WAL 检查点。
+    """
+    path = urllib.parse.quote(os.path.abspath(DATABASE_PATH))
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, isolation_level=None)
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("BEGIN")
+    return conn
+
+
+def ping_database():
+    """探测数据库：执行一次简单查询，返回耗时（秒）"""
+    start = time.perf_counter()
+    conn = sqlite3.connect(DATABASE_PATH, timeout=5)
+    try:
+        conn.execute("SELECT COUNT(*) FROM classrooms").fetchone()
+    finally:
+        conn.close()
+    return time.perf_counter() - start
+
+
+@_timed
 def get_all_classrooms():
     """从数据库获取所有教室配置"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -68,6 +333,52 @@ def get_all_classrooms():
     return [{"id": r[0], "row": r[1], "column": r[2]} for r in rows]
 
 
+@_timed
+def get_campus_overview():
+    """一次分组查询得到所有教室的签到概况
+
+    返回 list[dict]：id, row, column, enabled, open_time, close_time,
+    roster（该教室签到班级的名单人数）, statuses（各状态人数）
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        WITH room_classes AS (
+            SELECT DISTINCT classroom_id, class_name FROM "checkin-temp"
+        ),
+        roster AS (
+            SELECT rc.classroom_id, COUNT(s.student_id) AS n
+            FROM room_classes rc JOIN students s ON s.class_name = rc.class_name
+            GROUP BY rc.classroom_id
+        ),
+        room_statuses AS (
+            SELECT t.classroom_id, st.label AS status, COUNT(*) AS n
+            FROM "checkin-temp" t JOIN statuses st ON st.code = t.status
+            GROUP BY t.classroom_id, t.status
+        )
+        SELECT c.id, c.row, c.column, COALESCE(w.enabled, 0), w.open_time, w.close_time,
+               COALESCE(r.n, 0), st.status, st.n
+        FROM classrooms c
+        LEFT JOIN checkin_windows w ON w.classroom_id = c.id
+        LEFT JOIN roster r ON r.classroom_id = c.id
+        LEFT JOIN room_statuses st ON st.classroom_id = c.id
+        ORDER BY c.id
+    ''')
+    rows = cursor.fetchall()
+    conn.close()
+
+    rooms = {}
+    for cid, row, column, enabled, open_time, close_time, roster, status, count in rows:
+        room = rooms.setdefault(cid, {
+            "id": cid, "row": row, "column": column, "enabled": bool(enabled),
+            "open_time": open_time, "close_time": close_time, "roster": roster, "statuses": {},
+        })
+        if status is not None:
+            room["statuses"][status] = count
+    return list(rooms.values())
+
+
+@_timed
 def add_classroom(classroom_id, row, column):
     """添加教室到数据库"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -78,6 +389,22 @@ def add_classroom(classroom_id, row, column):
     conn.close()
 
 
+@_timed
+def sync_classrooms(upserts, deletes=()):
+    """在一个事务中批量新增/更新教室 [(id, row, column)] 并删除 deletes 中的教室"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT INTO classrooms (id, row, column) VALUES (?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET row = excluded.row, column = excluded.column
+            ''', upserts)
+            conn.executemany("DELETE FROM classrooms WHERE id = ?", [(cid,) for cid in deletes])
+    finally:
+        conn.close()
+
+
+@_timed
 def delete_classroom(classroom_id):
     """从数据库删除教室"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -87,6 +414,7 @@ def delete_classroom(classroom_id):
     conn.close()
 
 
+@_timed
 def get_classroom_by_id(classroom_id):
     """根据 ID 获取教室配置"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -97,6 +425,50 @@ def get_classroom_by_id(classroom_id):
     return row  # (id, row, col) or None
 
 
+@_timed
+def get_checkin_windows():
+    """获取所有教室的签到窗口状态"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT classroom_id, enabled, open_time, close_time, changed_at FROM checkin_windows")
+    rows = cursor.fetchall()
+    conn.close()
+    return [
+        {"classroom_id": r[0], "enabled": bool(r[1]), "open_time": r[2], "close_time": r[3], "changed_at": r[4]}
+        for r in rows
+    ]
+
+
+@_timed
+def set_checkin_enabled(classroom_id, enabled):
+    """开启或关闭指定教室的签到窗口；状态不变时保留 changed_at（批量扫码据此判断扫码是否在本次签到开始之后）"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO checkin_windows (classroom_id, enabled, changed_at)
+        VALUES (?, ?, strftime('%s', 'now'))
+        ON CONFLICT(classroom_id) DO UPDATE SET enabled = excluded.enabled,
+            changed_at = CASE WHEN enabled = excluded.enabled THEN changed_at ELSE excluded.changed_at END
+    """, (classroom_id, 1 if enabled else 0))
+    conn.commit()
+    conn.close()
+
+
+@_timed
+def set_checkin_schedule(classroom_id, open_time, close_time):
+    """设置指定教室每日自动开始/结束签到的时间（HH:MM，None 表示不自动）"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO checkin_windows (classroom_id, open_time, close_time)
+        VALUES (?, ?, ?)
+        ON CONFLICT(classroom_id) DO UPDATE SET open_time = excluded.open_time, close_time = excluded.close_time
+    """, (classroom_id, open_time, close_time))
+    conn.commit()
+    conn.close()
+
+
+@_timed
 def get_class_student_counts():
     """获取每个班级的学生数量"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -112,6 +484,7 @@ def get_class_student_counts():
     return [{"class": r[0], "count": r[1]} for r in rows]
 
 
+@_timed
 def delete_students_by_class_name(class_name):
     """删除指定班级的所有学生"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -123,6 +496,7 @@ def delete_students_by_class_name(class_name):
     return count
 
 
+@_timed
 def save_checkin_records(classroom_id, course_name):
     """将 checkin-temp 表中的临时签到记录写入 checkin 表，但不清空临时表"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -142,15 +516,24 @@ def save_checkin_records(classroom_id, course_name):
         if not temp_records:
             return 0  # 没有记录可保存
 
-        # 2. 插入到 checkin 表（主记录表）- 添加 classroom_id 字段, 状态从temp表获取
-        cursor.executemany("""
-            INSERT INTO checkin 
-            (student_id, status, save_time, class_name, name, course, classroom_id) 
-            VALUES (?, ?, datetime('now', 'localtime'), ?, ?, ?, ?)
-        """, [
-            (row[0], row[1], row[2], row[3], course_name, classroom_id)  # row[1] is status from temp table
-            for row in temp_records
-        ])
+        # 2. 新建一次签到（session），学生按 (学号, 姓名, 班级) 复用 checkin_students 中的行
+        cursor.execute("""
+            INSERT INTO sessions (course, classroom_id, saved_at) VALUES (?, ?, strftime('%s', 'now'))
+        """, (course_name, classroom_id))
+        session_id = cursor.lastrowid
+        cursor.execute("""
+            INSERT OR IGNORE INTO checkin_students (student_id, name, class_name)
+            SELECT DISTINCT student_id, name, class_name FROM "checkin-temp" WHERE classroom_id = ?
+        """, (classroom_id,))
+
+        # 3. 插入到 checkin 表（主记录表），状态从temp表获取
+        cursor.execute("""
+            INSERT INTO checkin (session_id, student_ref, status)
+            SELECT ?, p.id, t.status
+            FROM "checkin-temp" t
+            JOIN checkin_students p ON p.student_id = t.student_id AND p.name = t.name AND p.class_name = t.class_name
+            WHERE t.classroom_id = ?
+        """, (session_id, classroom_id))
 
         conn.commit()
         return len(temp_records)
@@ -161,69 +544,102 @@ def save_checkin_records(classroom_id, course_name):
         conn.close()
 
 
-def get_checkin_summary_by_course(course_name):
-    """根据课程名称获取签到记录汇总（包含详细状态统计）"""
+@_timed
+def get_checkin_summary_by_course(course_name, include_archived=False):
+    """根据课程名称获取签到记录汇总（包含详细状态统计）
+
+    每次签到一行（带 session_id）；include_archived 为 True 时同时汇总已归档学期中的记录
+    （带 "archived": True，session_id 为 None）
+    """
     if not course_name:
         return []
         
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    conn = connect_reporting()
+    try:
+        cursor = conn.cursor()
     
-    # 查询同一save_time下的签到记录详细统计，包含class_name
-    cursor.execute("""
-        SELECT 
-            course, 
-            classroom_id,
-            class_name,
-            save_time,
-            SUM(CASE WHEN status = '已签' THEN 1 ELSE 0 END) as signed,
-            SUM(CASE WHEN status = '事假' THEN 1 ELSE 0 END) as personal_leave,
-            SUM(CASE WHEN status = '病假' THEN 1 ELSE 0 END) as sick_leave,
-            SUM(CASE WHEN status = '公假' THEN 1 ELSE 0 END) as official_leave,
-            SUM(CASE WHEN status = '缺勤' THEN 1 ELSE 0 END) as absent,
-            SUM(CASE WHEN status = '迟到' THEN 1 ELSE 0 END) as late,
-            SUM(CASE WHEN status = '早退' THEN 1 ELSE 0 END) as early_leave
-        FROM checkin 
-        WHERE course = ? 
-        GROUP BY save_time, course, classroom_id, class_name  
-        ORDER BY save_time DESC
-    """, (course_name,))
+        # 按签到（session）、班级和状态编码分组计数，再在 Python 中按状态展开
+        cursor.execute("""
+            SELECT s.id, s.course, s.classroom_id, p.class_name,
+                   datetime(s.saved_at, 'unixepoch', 'localtime') as save_time,
+                   c.status, COUNT(*)
+            FROM sessions s
+            JOIN checkin c ON c.session_id = s.id
+            JOIN checkin_students p ON p.id = c.student_ref
+            WHERE s.course = ? 
+            GROUP BY s.id, p.class_name, c.status
+            ORDER BY s.saved_at DESC, s.id DESC
+        """, (course_name,))
     
-    rows = cursor.fetchall()
+        groups = {}
+        for session_id, course, classroom_id, class_name, save_time, code, count in cursor.fetchall():
+            group = groups.setdefault((session_id, class_name), {
+                "session_id": session_id, "course": course, "classroom_id": classroom_id,
+                "class_name": class_name, "save_time": save_time, "counts": {},
+            })
+            group["counts"][code] = count
     
-    # 获取班级总人数
-    results = []
-    for row in rows:
-        course, classroom_id, class_name, save_time, signed, personal_leave, sick_leave, official_leave, absent, late, early_leave = row
+        # 获取班级总人数
+        results = []
+        for group in groups.values():
+            class_name = group["class_name"]
+            counts = [group["counts"].get(code, 0) for code in range(len(STATUS_LABELS))]
+            signed, late, early_leave, personal_leave, sick_leave, official_leave, absent = counts
         
-        # 获取该班级的总学生数
-        class_student_count = 0
-        try:
-            cursor.execute("SELECT COUNT(*) FROM students WHERE class_name = ?", (class_name,))
-            count_row = cursor.fetchone()
-            if count_row:
-                class_student_count = count_row[0]
-        except Exception:
-            pass
+            # 获取该班级的总学生数
+            class_student_count = 0
+            try:
+                cursor.execute("SELECT COUNT(*) FROM students WHERE class_name = ?", (class_name,))
+                count_row = cursor.fetchone()
+                if count_row:
+                    class_student_count = count_row[0]
+            except Exception:
+                pass
         
-        results.append({
-            "course": course,
-            "classroom_id": classroom_id,
-            "class_total": class_student_count,
-            "signed": signed or 0,
-            "personal_leave": personal_leave or 0,
-            "sick_leave": sick_leave or 0,
-            "official_leave": official_leave or 0,
-            "absent": absent or 0,
-            "late": late or 0,
-            "early_leave": early_leave or 0,
-            "save_time": save_time
-        })
-    
-    conn.close()
-    return results
+            results.append({
+                "session_id": group["session_id"],
+                "course": group["course"],
+                "classroom_id": group["classroom_id"],
+                "class_total": class_student_count,
+                "signed": signed,
+                "personal_leave": personal_leave,
+                "sick_leave": sick_leave,
+                "official_leave": official_leave,
+                "absent": absent,
+                "late": late,
+                "early_leave": early_leave,
+                "save_time": group["save_time"]
+            })
+
+        if include_archived:
+            from .archive import archive_store
+            class_totals = {}
+            for (save_time, classroom_id, class_name), counts in archive_store.summary_rows(course_name).items():
+                if class_name not in class_totals:
+                    cursor.execute("SELECT COUNT(*) FROM students WHERE class_name = ?", (class_name,))
+                    class_totals[class_name] = cursor.fetchone()[0]
+                results.append({
+                    "session_id": None,
+                    "course": course_name,
+                    "classroom_id": classroom_id,
+                    "class_total": class_totals[class_name],
+                    "signed": counts.get("已签", 0),
+                    "personal_leave": counts.get("事假", 0),
+                    "sick_leave": counts.get("病假", 0),
+                    "official_leave": counts.get("公假", 0),
+                    "absent": counts.get("缺勤", 0),
+                    "late": counts.get("迟到", 0),
+                    "early_leave": counts.get("早退", 0),
+                    "save_time": save_time,
+                    "archived": True
+                })
+            results.sort(key=lambda r: r["save_time"], reverse=True)
+        return results
+    finally:
+        conn.close()
 
 
+@_timed
 def get_temp_checkins_by_classroom(classroom_id):
     """获取指定教室的临时签到数据"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -231,14 +647,15 @@ def get_temp_checkins_by_classroom(classroom_id):
     cursor.execute("""
         SELECT name, seat_number 
         FROM "checkin-temp" 
-        WHERE classroom_id = ? AND status = '已签'
+        WHERE classroom_id = ? AND status = ?
         ORDER BY seat_number
-    """, (classroom_id,))
+    """, (classroom_id, STATUS_LABELS.index("已签")))
     rows = cursor.fetchall()
     conn.close()
     return [(row[0], row[1]) for row in rows]
 
 
+@_timed
 def clear_temp_checkins(classroom_id):
     """清空指定教室的临时签到数据"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -250,6 +667,7 @@ def clear_temp_checkins(classroom_id):
     return count
 
 
+@_timed
 def add_temp_checkin(student_id, classroom_id, seat_number, status="已签"):
     """添加临时签到记录"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -266,7 +684,7 @@ def add_temp_checkin(student_id, classroom_id, seat_number, status="已签"):
     cursor.execute('''
         INSERT OR REPLACE INTO "checkin-temp" 
         (student_id, status, class_name, name, seat_number, classroom_id) 
-        VALUES (?, ?, ?, ?, ?, ?)
+        VALUES (?, (SELECT code FROM statuses WHERE label = ?), ?, ?, ?, ?)
     ''', (student_id, status, class_name, name, seat_number, classroom_id))
     
     conn.commit()
@@ -274,52 +692,245 @@ def add_temp_checkin(student_id, classroom_id, seat_number, status="已签"):
     return True
 
 
-def delete_checkin_record(course, save_time, classroom_id):
-    """删除指定签到记录"""
+@_timed
+def claim_temp_seat(student_id, classroom_id, seat_number, status="已签", conn=None):
+    """扫码占座：座位没有被其他学生占用时写入临时签到记录
+
+    返回 (结果, 姓名)，结果为 "ok"、"unknown"（学号不在名单中）或 "taken"（座位已有其他学生）。
+    检查和写入在同一个写事务中进行，以数据库为准，其它进程的写入和删除都能看到。
+    传入 conn 时在调用方的事务中执行。
+    """
+    if conn is not None:
+        return _claim_temp_seat(conn, student_id, classroom_id, seat_number, status)
+    conn = sqlite3.connect(DATABASE_PATH, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = _claim_temp_seat(conn, student_id, classroom_id, seat_number, status)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return result
+    finally:
+        conn.close()
+
+
+def _claim_temp_seat(conn, student_id, classroom_id, seat_number, status):
+    row = conn.execute("SELECT name, class_name FROM students WHERE student_id = ?", (student_id,)).fetchone()
+    if not row:
+        return "unknown", None
+    name, class_name = row
+    # 走 (classroom_id, student_id) 唯一索引，只扫描本教室的临时记录
+    taken = conn.execute('''
+        SELECT 1 FROM "checkin-temp"
+        WHERE classroom_id = ? AND seat_number = ? AND student_id <> ?
+        LIMIT 1
+    ''', (classroom_id, seat_number, student_id)).fetchone()
+    if taken:
+        return "taken", name
+    conn.execute('''
+        INSERT OR REPLACE INTO "checkin-temp"
+        (student_id, status, class_name, name, seat_number, classroom_id)
+        VALUES (?, (SELECT code FROM statuses WHERE label = ?), ?, ?, ?, ?)
+    ''', (student_id, status, class_name, name, seat_number, classroom_id))
+    return "ok", name
+
+
+@_timed
+def update_temp_checkins(classroom_id, class_name, changes):
+    """在一个事务中部分更新教室的临时签到数据，changes 为 [(学号, 座位号, 状态)]，返回更新人数
+
+    班级名单中还没有临时记录的学生先按缺勤补齐，保存时与逐人提交全部名单的结果一致
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+    try:
+        with conn:
+            conn.execute('''
+                INSERT INTO "checkin-temp" (student_id, status, class_name, name, seat_number, classroom_id)
+                SELECT s.student_id, ?, s.class_name, s.name, NULL, ?
+                FROM students s
+                WHERE s.class_name = ?
+                  AND NOT EXISTS (SELECT 1 FROM "checkin-temp" t
+                                  WHERE t.classroom_id = ? AND t.student_id = s.student_id)
+            ''', (STATUS_LABELS.index("缺勤"), classroom_id, class_name, classroom_id))
+            cursor = conn.executemany('''
+                INSERT INTO "checkin-temp" (student_id, status, class_name, name, seat_number, classroom_id)
+                SELECT student_id, (SELECT code FROM statuses WHERE label = ?), class_name, name, ?, ?
+                FROM students WHERE student_id = ?
+                ON CONFLICT (classroom_id, student_id)
+                DO UPDATE SET status = excluded.status, seat_number = excluded.seat_number
+            ''', [(status, seat_number, classroom_id, student_id) for student_id, seat_number, status in changes])
+            return cursor.rowcount
+    finally:
+        conn.close()
+
+
+@_timed
+def purge_stale_temp_checkins(ttl_seconds, keep_classrooms=()):
+    """删除超过 ttl_seconds 未被重置的临时签到数据（keep_classrooms 中的教室除外），返回删除行数"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    keep = list(keep_classrooms)
+    placeholders = ",".join("?" for _ in keep)
+    cursor.execute(f'''
+        DELETE FROM "checkin-temp"
+        WHERE created_at < strftime('%s', 'now') - ?
+        {f"AND classroom_id NOT IN ({placeholders})" if keep else ""}
+    ''', [ttl_seconds] + keep)
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+
+@_timed
+def purge_scan_receipts(ttl_seconds):
+    """删除超过 ttl_seconds 的批量扫码幂等记录，返回删除行数"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM scan_receipts WHERE received_at < strftime('%s', 'now') - ?", (ttl_seconds,))
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+
+@_timed
+def delete_checkin_record(session_id):
+    """删除一次签到的全部记录，返回被删除记录的学号列表（没有删除时为空列表）"""
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     try:
-        cursor.execute("""
-            DELETE FROM checkin 
-            WHERE course = ? 
-            AND save_time = ? 
-            AND classroom_id = ?
-        """, (course, save_time, classroom_id))
-        count = cursor.rowcount
-        conn.commit()
-        return count > 0
+        with conn:
+            cursor.execute("""
+                SELECT p.student_id FROM checkin c JOIN checkin_students p ON p.id = c.student_ref
+                WHERE c.session_id = ?
+            """, (session_id,))
+            student_ids = [row[0] for row in cursor.fetchall()]
+            # 先删明细，全文索引的触发器需要读取 sessions 中的课程名
+            cursor.execute("DELETE FROM checkin WHERE session_id = ?", (session_id,))
+            cursor.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        return student_ids
     except Exception as e:
         print(f"Error deleting record: {e}")
-        return False
+        return []
     finally:
         conn.close()
 
 
+# 全文搜索可以按列过滤，如 name:张三 status:缺勤
+FTS_COLUMNS = ("course", "name", "class_name", "status")
+
+
+def build_fts_query(text):
+    """把用户输入转换为 FTS5 查询：空格分隔的词全部匹配，"列:词" 限定列，词尾 * 为前缀匹配
+
+    每个词都加引号，用户输入中的 FTS5 运算符不会生效。没有有效词时返回 None。
+    """
+    terms = []
+    for token in text.split():
+        column = None
+        m = re.match(r"^(\w+)[:：](.+)$", token)
+        if m and m.group(1) in FTS_COLUMNS:
+            column, token = m.group(1), m.group(2)
+        prefix = token.endswith("*")
+        token = token.rstrip("*").replace('"', '""')
+        if not token:
+            continue
+        term = f'"{token}"' + ("*" if prefix else "")
+        terms.append(f"{column} : {term}" if column else term)
+    return " AND ".join(terms) or None
+
+
+@_timed
+def search_checkin_records(text, since=None, until=None, limit=20, offset=0):
+    """全文搜索签到历史，按相关度排序，返回 (总数, list[dict])
+
+    since / until 为 save_time 范围（含 since，不含 until），例如只查本学期
+    """
+    query = build_fts_query(text or "")
+    if query is None:
+        return 0, []
+    where = "checkin_fts MATCH ?"
+    args = [query]
+    if since:
+        where += " AND s.saved_at >= CAST(strftime('%s', ?, 'utc') AS INTEGER)"
+        args.append(since)
+    if until:
+        where += " AND s.saved_at < CAST(strftime('%s', ?, 'utc') AS INTEGER)"
+        args.append(until)
+
+    conn = connect_reporting()
+    try:
+        # 全文索引的 rowid 为 (session_id << 32) | student_ref，拆开后按 checkin 主键查找
+        joins = '''
+            JOIN checkin c ON c.session_id = checkin_fts.rowid >> 32 AND c.student_ref = checkin_fts.rowid & 4294967295
+            JOIN sessions s ON s.id = c.session_id
+            JOIN checkin_students p ON p.id = c.student_ref
+            JOIN statuses st ON st.code = c.status
+        '''
+        total = conn.execute(f'''
+            SELECT COUNT(*) FROM checkin_fts {joins} WHERE {where}
+        ''', args).fetchone()[0]
+        rows = conn.execute(f'''
+            SELECT s.course, datetime(s.saved_at, 'unixepoch', 'localtime'), s.classroom_id,
+                   p.student_id, p.name, p.class_name, st.label
+            FROM checkin_fts {joins}
+            WHERE {where}
+            ORDER BY bm25(checkin_fts), s.saved_at DESC
+            LIMIT ? OFFSET ?
+        ''', args + [limit, offset]).fetchall()
+    finally:
+        conn.close()
+    keys = ("course", "save_time", "classroom_id", "student_id", "name", "class_name", "status")
+    return total, [dict(zip(keys, row)) for row in rows]
+
+
+@_timed
+def get_student_checkins(student_id):
+    """获取学生的全部签到记录（按保存时间倒序），返回 list[(course, save_time, classroom_id, status, name, class_name)]"""
+    conn = connect_reporting()
+    try:
+        return conn.execute('''
+            SELECT course, save_time, classroom_id, status, name, class_name
+            FROM checkin_records
+            WHERE student_id = ?
+            ORDER BY saved_at DESC, session_id DESC
+        ''', (student_id,)).fetchall()
+    finally:
+        conn.close()
+
+
+@_timed
 def get_students_by_classroom(classroom_id):
     """获取指定教室的所有学生信息（包括学号、姓名和班级）"""
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     # 查询临时签到表中的学生信息
     cursor.execute('''
-        SELECT student_id, name, class_name, status
-        FROM "checkin-temp"
-        WHERE classroom_id = ?
+        SELECT t.student_id, t.name, t.class_name, st.label
+        FROM "checkin-temp" t JOIN statuses st ON st.code = t.status
+        WHERE t.classroom_id = ?
     ''', (classroom_id,))
     students = cursor.fetchall()
     conn.close()
     return students
 
 
+@_timed
 def get_students_by_class_name(class_name):
     """获取指定班级的所有学生"""
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
-    cursor.execute("SELECT student_id, name FROM students WHERE class_name = ?", (class_name,))
+    cursor.execute("SELECT student_id, name FROM students WHERE class_name = ? ORDER BY student_id", (class_name,))
     students = cursor.fetchall()
     conn.close()
     return students
 
 
+@_timed
 def get_class_name_by_classroom(classroom_id):
     """获取教室对应的班级名称"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -330,50 +941,79 @@ def get_class_name_by_classroom(classroom_id):
     return result[0] if result else ""
 
 
+@_timed
 def get_temp_checkins_with_ids_by_classroom(classroom_id):
     """获取指定教室的临时签到数据（包含学号和状态）"""
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT student_id, name, seat_number, status
-        FROM "checkin-temp" 
-        WHERE classroom_id = ? 
-        ORDER BY seat_number
+        SELECT t.student_id, t.name, t.seat_number, st.label
+        FROM "checkin-temp" t JOIN statuses st ON st.code = t.status
+        WHERE t.classroom_id = ? 
+        ORDER BY t.seat_number
     """, (classroom_id,))
     rows = cursor.fetchall()
     conn.close()
     return [(row[0], row[1], row[2], row[3]) for row in rows]
 
 
-def get_checkin_records_by_save_time(course, save_time, classroom_id):
+@_timed
+def get_sessions_with_records(session_ids):
+    """在同一个快照中读取多次签到及其明细，返回 {session_id: {"session": {...}, "records": [...]}}
+
+    session 为 {session_id, course, save_time, classroom_id}；records 为 list[dict]：
+    student_id, name, status, seat（固定为 None）。不存在的签到ID不出现在结果中。
+    """
+    results = {}
+    conn = connect_reporting()
+    try:
+        for session_id in session_ids:
+            row = conn.execute("""
+                SELECT id, course, datetime(saved_at, 'unixepoch', 'localtime'), classroom_id FROM sessions WHERE id = ?
+            """, (session_id,)).fetchone()
+            if row is None:
+                continue
+            records = conn.execute("""
+                SELECT student_id, name, status FROM checkin_records WHERE session_id = ? ORDER BY name
+            """, (session_id,)).fetchall()
+            results[row[0]] = {
+                "session": {"session_id": row[0], "course": row[1], "save_time": row[2], "classroom_id": row[3]},
+                "records": [{"student_id": r[0], "name": r[1], "status": r[2], "seat": None} for r in records],
+            }
+    finally:
+        conn.close()
+    return results
+
+
+@_timed
+def get_checkin_records_by_save_time(course, save_time, classroom_id, include_archived=False):
     """返回指定 course + save_time + classroom_id 的签到明细，格式为 list[dict]
     dict 包含: student_id, name, status, seat (seat 可能为 None)
+    include_archived 为 True 且数据库中没有该次签到时，从已归档学期中查找
     """
     if not course or not save_time or not classroom_id:
         return []
 
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = connect_reporting()
     cursor = conn.cursor()
     try:
-        # 试图查询 seat_number 字段（如果存在），否则返回 NULL 作为 seat
-        # 检查表结构中是否存在 seat_number 列
-        cursor.execute("PRAGMA table_info(checkin)")
-        cols = [c[1] for c in cursor.fetchall()]
-        if "seat_number" in cols:
-            cursor.execute(
-                "SELECT student_id, name, status, seat_number FROM checkin WHERE course=? AND save_time=? AND classroom_id=? ORDER BY name",
-                (course, save_time, classroom_id)
-            )
-        else:
-            cursor.execute(
-                "SELECT student_id, name, status, NULL as seat_number FROM checkin WHERE course=? AND save_time=? AND classroom_id=? ORDER BY name",
-                (course, save_time, classroom_id)
+        # checkin 不保存座位号，seat 固定为 None
+        cursor.execute("""
+            SELECT student_id, name, status, NULL AS seat_number FROM checkin_records
+            WHERE session_id IN (
+                SELECT id FROM sessions
+                WHERE course = ? AND classroom_id = ? AND saved_at = CAST(strftime('%s', ?, 'utc') AS INTEGER)
             )
+            ORDER BY name
+        """, (course, classroom_id, save_time))
         fetched = cursor.fetchall()
         results = [
             {"student_id": r[0], "name": r[1], "status": r[2], "seat": r[3]}
             for r in fetched
         ]
+        if not results and include_archived:
+            from .archive import archive_store
+            results = archive_store.records(course, save_time, classroom_id)
         return results
     except Exception:
         return []
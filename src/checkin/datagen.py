@@ -0,0 +1,167 @@
+import csv
+import datetime
+import os
+import random
+import sqlite3
+
+from . import database
+
+# 规模配置：班级数、每班人数、教室数、学期周数、每班每周课程数
+PROFILES = {
+    "tiny": {"classes": 2, "class_size": 30, "rooms": 4, "weeks": 4, "courses_per_class": 2},
+    "small": {"classes": 4, "class_size": 40, "rooms": 10, "weeks": 8, "courses_per_class": 3},
+    "medium": {"classes": 20, "class_size": 45, "rooms": 50, "weeks": 18, "courses_per_class": 4},
+    "semester": {"classes": 60, "class_size": 50, "rooms": 200, "weeks": 18, "courses_per_class": 4},
+    "college": {"classes": 200, "class_size": 50, "rooms": 400, "weeks": 18, "courses_per_class": 5},
+}
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍鹏辉玲宇浩然子轩梓涵欣怡博文天佑智博思远雨泽嘉怡俊杰晨阳一诺佳琪诗涵梦瑶雅婷"
+MAJORS = ["人工智能", "软件工程", "计算机应用", "大数据", "物联网", "网络工程", "电子信息", "机电一体化"]
+COURSES = ["高等数学", "大学英语", "程序设计基础", "人工智能导论", "线性代数", "数据结构", "Python编程",
+           "计算机网络", "操作系统", "数据库原理", "机器学习", "思想道德与法治", "体育", "大学物理"]
+# 每周上课的时间段（星期几, 开始时间）
+SLOTS = [(d, t) for d in range(5) for t in ("08:00", "10:00", "14:00", "16:00")]
+# 课表时间按学校所在时区（UTC+8）换算为 epoch 秒，同一随机种子在任何时区的机器上生成相同的数据库
+TERM_TZ = datetime.timezone(datetime.timedelta(hours=8))
+# 非缺勤状态在一次课中的概率
+STATUS_RATES = [("迟到", 0.03), ("事假", 0.015), ("病假", 0.01), ("公假", 0.005), ("早退", 0.008)]
+
+
+def _student_name(rng):
+    return rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.choice((1, 2))))
+
+
+def generate_students(spec, rng, year=24):
+    """生成学生名单：[(student_id, name, class_name)]，按班级排列"""
+    students = []
+    for c in range(spec["classes"]):
+        class_name = f"{year}{MAJORS[c % len(MAJORS)]}{c // len(MAJORS) + 1}班"
+        for i in range(spec["class_size"]):
+            student_id = f"{year}4341{c:03d}{i + 1:02d}"
+            students.append((student_id, _student_name(rng), class_name))
+    return students
+
+
+def _pick_status(rng, absent_rate):
+    r = rng.random()
+    if r < absent_rate:
+        return "缺勤"
+    r -= absent_rate
+    for status, rate in STATUS_RATES:
+        if r < rate:
+            return status
+        r -= rate
+    return "已签"
+
+
+def generate_database(path, profile="semester", seed=0, term_start="2025-09-01", roster_dir=None,
+                      active_rooms=10):
+    """按规模配置确定性地生成签到数据库，返回各表行数
+
+    path: 输出数据库路径（已存在时会被覆盖）
+    roster_dir: 如指定，同时按 config_example 中的格式（学号,姓名,班级）导出每个班级的名单 CSV
+    active_rooms: 模拟正在上课的教室数，这些教室在 checkin-temp 中有签到数据
+    """
+    spec = PROFILES[profile]
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    database.init_database(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("DELETE FROM classrooms")
+        rooms = [(f"{1001 + i}", rng.choice((4, 6, 8)), rng.choice((8, 12))) for i in range(spec["rooms"])]
+        conn.executemany("INSERT INTO classrooms (id, row, column) VALUES (?, ?, ?)", rooms)
+
+        students = generate_students(spec, rng)
+        conn.executemany("INSERT INTO students (student_id, name, class_name) VALUES (?, ?, ?)", students)
+        by_class = {}
+        for student in students:
+            by_class.setdefault(student[2], []).append(student)
+
+        # 每个学生有自己的缺勤倾向：大多数人很少缺勤，少数人经常缺勤
+        absent_rate = {s[0]: (rng.uniform(0.1, 0.3) if rng.random() < 0.05 else rng.uniform(0.0, 0.04))
+                       for s in students}
+
+        # 课表：每个班若干门课，每门课固定教室和每周时间段
+        timetable = []
+        for class_name in sorted(by_class):
+            for course in rng.sample(COURSES, spec["courses_per_class"]):
+                room = rng.choice(rooms)[0]
+                timetable.append((class_name, course, room, rng.choice(SLOTS)))
+
+        # 签到记录中的学生与名单一一对应
+        conn.executemany("INSERT INTO checkin_students (id, student_id, name, class_name) VALUES (?, ?, ?, ?)",
+                         [(i + 1, *student) for i, student in enumerate(students)])
+        student_ref = {student[0]: i + 1 for i, student in enumerate(students)}
+
+        start = datetime.datetime.strptime(term_start, "%Y-%m-%d").replace(tzinfo=TERM_TZ)
+        sessions = []
+        rows = []
+        session_id = 0
+        for week in range(spec["weeks"]):
+            for class_name, course, room, (weekday, at) in timetable:
+                hour, minute = map(int, at.split(":"))
+                when = start + datetime.timedelta(weeks=week, days=weekday, hours=hour, minutes=minute + 45,
+                                                  seconds=rng.randrange(600))
+                session_id += 1
+                sessions.append((session_id, course, room, int(when.timestamp())))
+                for student_id, name, _ in by_class[class_name]:
+                    status = _pick_status(rng, absent_rate[student_id])
+                    rows.append((session_id, student_ref[student_id], database.STATUS_LABELS.index(status)))
+            if len(rows) > 50000:
+                _insert_checkins(conn, sessions, rows)
+                sessions, rows = [], []
+        _insert_checkins(conn, sessions, rows)
+
+        # 当前正在签到的教室
+        temp = []
+        for class_name, _, room, _ in timetable[:active_rooms]:
+            seats = [r for r in rooms if r[0] == room][0]
+            capacity = min(seats[1] * seats[2], 48)
+            seat_numbers = rng.sample(range(1, capacity + 1), min(capacity, len(by_class[class_name])))
+            for (student_id, name, _), seat in zip(by_class[class_name], seat_numbers):
+                if rng.random() < 0.9:
+                    temp.append((student_id, database.STATUS_LABELS.index("已签"), class_name, name, seat, room))
+        conn.executemany("""
+            INSERT OR REPLACE INTO "checkin-temp" (student_id, status, class_name, name, seat_number, classroom_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, temp)
+        conn.commit()
+
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                  for table in ("classrooms", "students", "sessions", "checkin", "checkin-temp")}
+    finally:
+        conn.close()
+
+    if roster_dir:
+        os.makedirs(roster_dir, exist_ok=True)
+        for class_name, members in by_class.items():
+            with open(os.path.join(roster_dir, f"{class_name}.csv"), "w", encoding="utf-8", newline="") as f:
+                csv.writer(f).writerows(members)
+    return counts
+
+
+def _insert_checkins(conn, sessions, rows):
+    conn.executemany("INSERT INTO sessions (id, course, classroom_id, saved_at) VALUES (?, ?, ?, ?)", sessions)
+    conn.executemany("INSERT INTO checkin (session_id, student_ref, status) VALUES (?, ?, ?)", rows)
+
+
+def add_arguments(parser):
+    parser.add_argument("--profile", choices=list(PROFILES), default="semester",
+                        help="Size profile (default: semester)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--output", default="checkin-synthetic.db", help="Output database path")
+    parser.add_argument("--term-start", default="2025-09-01", help="First Monday of the term (YYYY-MM-DD)")
+    parser.add_argument("--roster-dir", default=None, help="Also write one roster CSV per class here")
+    parser.add_argument("--active-rooms", type=int, default=10,
+                        help="Classrooms with in-progress check-ins in checkin-temp (default: 10)")
+
+
+def main(args):
+    counts = generate_database(args.output, profile=args.profile, seed=args.seed, term_start=args.term_start,
+                               roster_dir=args.roster_dir, active_rooms=args.active_rooms)
+    print(f"Generated {args.output} ({args.profile}, seed {args.seed}): "
+          + ", ".join(f"{table} {n}" for table, n in counts.items()))
@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+
+from . import database
+
+# 计入出勤的状态，其余（缺勤和各类请假）不计入
+ATTENDED_STATUSES = ("已签", "迟到", "早退")
+
+
+def summarize_history(student_id, rows):
+    """把 get_student_checkins 的结果整理为签到历史，没有记录时返回 None"""
+    if not rows:
+        return None
+    courses = {}
+    for course, save_time, classroom_id, status, _, _ in rows:
+        entry = courses.setdefault(course or "", {"course": course or "", "sessions": 0, "attended": 0, "statuses": {}})
+        entry["sessions"] += 1
+        entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+        if status in ATTENDED_STATUSES:
+            entry["attended"] += 1
+    for entry in courses.values():
+        entry["attendance_rate"] = round(entry["attended"] / entry["sessions"], 4)
+    attended = sum(entry["attended"] for entry in courses.values())
+    _, _, _, _, name, class_name = rows[0]   # 最近一次记录中的姓名和班级
+    return {
+        "student_id": student_id,
+        "name": name,
+        "class_name": class_name,
+        "attendance_rate": round(attended / len(rows), 4),
+        "courses": sorted(courses.values(), key=lambda entry: entry["course"]),
+        "sessions": [
+            {"course": course, "save_time": save_time, "classroom_id": classroom_id, "status": status}
+            for course, save_time, classroom_id, status, _, _ in rows
+        ],
+    }
+
+
+class StudentHistoryCache:
+    """按学号缓存学生签到历史，最多保留 max_entries 人（最近最少使用的先淘汰）
+
+    保存或删除签到记录后对涉及的学号调用 invalidate，归档等批量改动后调用 invalidate() 清空。
+    查询与失效并发时，失效之前开始的查询结果不会写入缓存。
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+
+    def get(self, student_id):
+        with self._lock:
+            if student_id in self._entries:
+                self._entries.move_to_end(student_id)
+                return self._entries[student_id]
+            generation = self._generation
+        history = summarize_history(student_id, database.get_student_checkins(student_id))
+        with self._lock:
+            if generation == self._generation:
+                self._entries[student_id] = history
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return history
+
+    def invalidate(self, student_ids=None):
+        """使指定学号的缓存失效；不指定时清空全部"""
+        with self._lock:
+            self._generation += 1
+            if student_ids is None:
+                self._entries.clear()
+            else:
+                for student_id in student_ids:
+                    self._entries.pop(student_id, None)
+
+
+# 进程内共享的签到历史缓存
+student_history = StudentHistoryCache()
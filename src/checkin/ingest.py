@@ -0,0 +1,160 @@
+import json
+import re
+import sqlite3
+import time
+
+from . import database
+from .metrics import metrics
+from .occupancy import occupancy
+from .ratelimit import retry_after
+from .windows import checkin_windows
+
+# 一批最多处理的扫码记录数
+BATCH_MAX_RECORDS = 500
+# 客户端扫码时间早于该秒数的记录不再接受（与临时签到数据的默认保留时间一致）
+MAX_SCAN_AGE = 24 * 3600
+# 允许的客户端时钟误差（秒）：扫码时间最多比服务器晚这么多，或比签到开始时间早这么多
+SCAN_CLOCK_SKEW = 60
+_CLASSROOM_RE = re.compile(r"\d{3,4}")
+
+
+class BatchError(ValueError):
+    """请求体不是合法的扫码记录列表"""
+
+
+def parse_batch(body, content_type):
+    """把 JSON 数组（或 {"records": [...]}）或 NDJSON 请求体解析为记录列表"""
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError:
+        raise BatchError("请求体不是 UTF-8 编码")
+    try:
+        if 'ndjson' in content_type:
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            records = json.loads(text)
+            if isinstance(records, dict):
+                records = records.get("records")
+    except json.JSONDecodeError as e:
+        raise BatchError(f"JSON 格式错误：{e.msg}")
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise BatchError("请求体应为扫码记录数组")
+    if len(records) > BATCH_MAX_RECORDS:
+        raise BatchError(f"一次最多提交 {BATCH_MAX_RECORDS} 条记录")
+    return records
+
+
+def _normalize(record, now):
+    """校验一条记录，返回 (key, classroom_id, seat, student_id, scanned_at)，不合法时抛出 ValueError"""
+    classroom_id = str(record.get("classroom_id") or "").strip()
+    student_id = str(record.get("student_id") or "").strip()
+    if not _CLASSROOM_RE.fullmatch(classroom_id):
+        raise ValueError("教室编号无效")
+    if not student_id:
+        raise ValueError("缺少学号")
+    try:
+        seat = int(record.get("seat"))
+    except (TypeError, ValueError):
+        raise ValueError("座位号无效")
+    if not 1 <= seat <= 99:
+        raise ValueError("座位号无效")
+    scanned_at = record.get("scanned_at")
+    if scanned_at is not None:
+        if isinstance(scanned_at, bool) or not isinstance(scanned_at, (int, float)):
+            raise ValueError("scanned_at 应为 epoch 秒")
+        if now - scanned_at > MAX_SCAN_AGE:
+            raise ValueError("扫码记录已过期")
+    key = record.get("key")
+    if key is None:
+        # 没有 key 时用扫码内容生成；没有扫码时间就无法区分两次扫码
+        if scanned_at is None:
+            raise ValueError("缺少 key 或 scanned_at")
+        key = f"{classroom_id}:{seat:02d}:{student_id}:{scanned_at}"
+    return str(key), classroom_id, seat, student_id, scanned_at
+
+
+def _apply(conn, classroom_id, seat, student_id, scanned_at, now, student_limit):
+    """与单条扫码相同的检查和写入，返回 (状态码, 提示, 需要等待的秒数)"""
+    if scanned_at is None:
+        # 没有扫码时间就无法确认是在本次签到开始之后扫的
+        return 422, "缺少 scanned_at", 0
+    if scanned_at > now + SCAN_CLOCK_SKEW:
+        return 422, "扫码时间晚于服务器时间，请校准手机时间", 0
+    window = checkin_windows.get(classroom_id)
+    if not window["enabled"]:
+        return 403, "签到未开始或已结束", 0
+    if scanned_at < window["changed_at"] - SCAN_CLOCK_SKEW:
+        # 离线缓存的记录扫于本次签到开始之前（例如上一次签到或签到关闭期间）
+        return 403, "扫码时间早于本次签到开始时间", 0
+    wait = student_limit.check_key(student_id) if student_limit is not None else 0
+    if wait:
+        return 429, "请求过于频繁，请稍后再试", wait
+    result, name = database.claim_temp_seat(student_id, classroom_id, seat, "已签", conn=conn)
+    if result == "unknown":
+        return 400, "学号未找到，请确认是否已导入名单", 0
+    if result == "taken":
+        metrics.inc("checkin_occupancy_conflicts_total", kind="seat")
+        return 409, f"{seat:02d} 号座位已有其他同学签到，请确认座位号", 0
+    return 200, f"签到成功：{name}", 0
+
+
+def apply_scan_batch(records, student_limit=None):
+    """在一个事务中应用一批扫码记录，按提交顺序返回每条记录的结果
+
+    每条记录为 {"key", "classroom_id", "seat", "student_id", "scanned_at"}，检查与单条扫码
+    相同（签到窗口、学号限流 student_limit、名单、占座），另外 scanned_at 必须在当前签到窗口
+    开启之后（403）且不晚于服务器时间（缺少或超前时 422）。批内按 scanned_at 先后处理，先扫码
+    的同学先占座。只有签到成功的记录写入 scan_receipts：同一 key 再次提交同一条扫码时直接返回成功，
+    key 已用于其他扫码时返回 422；失败的记录没有副作用，重试时重新检查。事务失败时整批回滚并抛出异常。
+    """
+    now = time.time()
+    results = [None] * len(records)
+    pending = []
+    for i, record in enumerate(records):
+        try:
+            pending.append((i,) + _normalize(record, now))
+        except ValueError as e:
+            key = record.get("key")
+            results[i] = {"key": None if key is None else str(key), "status": 400, "message": str(e)}
+    pending.sort(key=lambda p: now if p[5] is None else p[5])
+
+    accepted = []
+    conn = sqlite3.connect(database.DATABASE_PATH, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for i, key, classroom_id, seat, student_id, scanned_at in pending:
+                row = conn.execute(
+                    "SELECT classroom_id, student_id, seat_number, message FROM scan_receipts WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[:3] == (classroom_id, student_id, seat):
+                    results[i] = {"key": key, "status": 200, "message": row[3], "duplicate": True}
+                    continue
+                if row:
+                    # key 已被另一条扫码（其他教室、座位或学号）使用，不能当作重复提交
+                    results[i] = {"key": key, "status": 422, "message": "key 已用于另一条扫码记录，请换一个 key 重新提交"}
+                    continue
+                status, message, wait = _apply(conn, classroom_id, seat, student_id, scanned_at, now, student_limit)
+                results[i] = {"key": key, "status": status, "message": message}
+                if wait:
+                    results[i]["retry_after"] = int(retry_after(wait))
+                if status == 200:
+                    accepted.append((student_id, classroom_id, seat))
+                    conn.execute('''
+                        INSERT INTO scan_receipts
+                        (key, classroom_id, student_id, seat_number, scanned_at, received_at, message)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (key, classroom_id, student_id, seat, scanned_at, now, message))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    # 提交之后再更新占座索引，回滚时索引不需要撤销
+    for student_id, classroom_id, seat in accepted:
+        if occupancy.record(student_id, classroom_id, seat):
+            metrics.inc("checkin_occupancy_conflicts_total", kind="multi_room")
+    for result in results:
+        metrics.inc("checkin_scan_batch_records_total", status=result["status"])
+    return results
@@ -0,0 +1,241 @@
+import argparse
+import http.client
+import json
+import random
+import sqlite3
+import threading
+import time
+import urllib.parse
+import uuid
+
+# 到达曲线：返回 [0, 1) 内的相对到达时刻
+CURVES = {
+    "uniform": lambda rng: rng.random(),
+    # 上课铃前后集中到达：三角分布，峰值在前 20%
+    "burst": lambda rng: rng.triangular(0.0, 1.0, 0.2),
+    # 逐渐增加
+    "ramp": lambda rng: rng.random() ** 0.5,
+}
+
+
+def load_scenario(db_path, rooms=None, seats=48):
+    """从数据库读取教室与学生，按教室分配班级（与 checkin-temp 中的班级一致，否则轮流分配）"""
+    conn = sqlite3.connect(db_path)
+    try:
+        all_rooms = [r[0] for r in conn.execute("SELECT id FROM classrooms ORDER BY id")]
+        students = conn.execute("SELECT student_id, class_name FROM students ORDER BY class_name, student_id").fetchall()
+        temp_classes = dict(conn.execute(
+            'SELECT classroom_id, MIN(class_name) FROM "checkin-temp" GROUP BY classroom_id'
+        ).fetchall())
+    finally:
+        conn.close()
+
+    by_class = {}
+    for student_id, class_name in students:
+        by_class.setdefault(class_name, []).append(student_id)
+    class_names = sorted(by_class)
+    if rooms:
+        all_rooms = [r for r in all_rooms if r in set(rooms)] or list(rooms)
+
+    scenario = {}
+    for i, room in enumerate(all_rooms):
+        class_name = temp_classes.get(room) or (class_names[i % len(class_names)] if class_names else None)
+        scenario[room] = by_class.get(class_name, [])[:seats]
+    return scenario
+
+
+def build_schedule(scenario, duration, curve="burst", unknown_ratio=0.0, seed=0):
+    """生成 (到达时刻, 教室, 座位号, 学号) 列表，按到达时刻排序"""
+    rng = random.Random(seed)
+    pick = CURVES[curve]
+    arrivals = []
+    for room, students in scenario.items():
+        for seat, student_id in enumerate(students, start=1):
+            if rng.random() < unknown_ratio:
+                student_id = f"X{rng.randrange(10 ** 9):09d}"
+            arrivals.append((pick(rng) * duration, room, seat, student_id))
+    arrivals.sort()
+    return arrivals
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, status, elapsed):
+        with self._lock:
+            entry = self.routes.setdefault(route, {"latencies": [], "statuses": {}})
+            entry["latencies"].append(elapsed)
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+
+    def report(self, wall_time):
+        report = {}
+        for route, entry in sorted(self.routes.items()):
+            lat = sorted(entry["latencies"])
+            n = len(lat)
+            errors = sum(c for s, c in entry["statuses"].items() if not isinstance(s, int) or s >= 500)
+
+            def q(p):
+                return lat[min(n - 1, int(p * n))] if n else 0.0
+            report[route] = {
+                "requests": n,
+                "throughput_rps": n / wall_time if wall_time else 0.0,
+                "error_rate": errors / n if n else 0.0,
+                "statuses": {str(k): v for k, v in sorted(entry["statuses"].items(), key=lambda kv: str(kv[0]))},
+                "p50_ms": q(0.5) * 1000,
+                "p95_ms": q(0.95) * 1000,
+                "p99_ms": q(0.99) * 1000,
+                "max_ms": (lat[-1] if n else 0.0) * 1000,
+            }
+        return report
+
+
+def _batch_status(data):
+    # 批量接口的 HTTP 状态总是 200，按第一条记录的结果计数
+    results = json.loads(data).get("results") or [{}]
+    return results[0].get("status", "empty")
+
+
+def _request(conn, recorder, route, method, path, body=None,
+             content_type="application/x-www-form-urlencoded", status_of=None):
+    headers = {"Content-Type": content_type} if body else {}
+    start = time.perf_counter()
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        status = status_of(data) if status_of and resp.status == 200 else resp.status
+    except Exception as e:
+        status = type(e).__name__
+        conn.close()
+    recorder.record(route, status, time.perf_counter() - start)
+    return status
+
+
+def run_load(host, port, arrivals, concurrency=64, timeout=10.0, mode="form"):
+    """开环压测：每个到达的手机新建连接，GET 签到页后提交学号
+
+    mode 为 "form" 时向签到页 POST 表单；为 "batch" 时与签到页脚本相同，把一条带 key 和
+    scanned_at 的记录 POST 到 /checkin/scan/batch，路由状态按记录的结果统计。
+    """
+    recorder = Recorder()
+    lock = threading.Lock()
+    queue = iter(arrivals)
+    lag = []
+    t0 = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                item = next(queue, None)
+            if item is None:
+                return
+            at, room, seat, student_id = item
+            delay = t0 + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lag.append(-delay)
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+            page = f"/checkin/{room}/checkin-{seat:02d}.html"
+            _request(conn, recorder, "GET checkin-XX.html", "GET", page)
+            if mode == "batch":
+                record = {"key": uuid.uuid4().hex, "classroom_id": room, "seat": seat,
+                          "student_id": student_id, "scanned_at": time.time()}
+                _request(conn, recorder, "POST scan/batch", "POST", "/checkin/scan/batch",
+                         json.dumps([record]), content_type="application/json", status_of=_batch_status)
+            else:
+                _request(conn, recorder, "POST checkin-XX.html", "POST", page,
+                         urllib.parse.urlencode({"student_id": student_id}))
+            conn.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    report = recorder.report(wall)
+    lag.sort()
+    return {
+        "wall_time_s": wall,
+        "arrivals": len(arrivals),
+        "late_arrivals": len(lag),
+        "max_start_lag_ms": (lag[-1] if lag else 0.0) * 1000,
+        "routes": report,
+    }
+
+
+def set_windows(host, port, rooms, closed_ratio, seed=0):
+    """开启大部分教室的签到窗口，按比例保留一部分为关闭状态"""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    closed = set()
+    for room in rooms:
+        action = "stop-checkin" if rng.random() < closed_ratio else "start-checkin"
+        if action == "stop-checkin":
+            closed.add(room)
+        conn.request("POST", f"/checkin/{room}/{action}", body=b"",
+                     headers={"Content-Type": "application/x-www-form-urlencoded"})
+        conn.getresponse().read()
+    conn.close()
+    return closed
+
+
+def print_report(result):
+    print(f"arrivals: {result['arrivals']}  wall time: {result['wall_time_s']:.1f}s  "
+          f"late starts: {result['late_arrivals']} (max lag {result['max_start_lag_ms']:.0f} ms)")
+    print(f"{'route':24s} {'reqs':>7s} {'rps':>8s} {'err%':>6s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}  statuses")
+    for route, r in result["routes"].items():
+        statuses = " ".join(f"{k}:{v}" for k, v in r["statuses"].items())
+        print(f"{route:24s} {r['requests']:7d} {r['throughput_rps']:8.1f} {r['error_rate'] * 100:6.2f} "
+              f"{r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['max_ms']:8.1f}  {statuses}")
+
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1", help="Server host (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Server port (default: 8000)")
+    parser.add_argument("--db", default="checkin.db", help="Database to read classrooms and students from")
+    parser.add_argument("--rooms", default=None, help="Comma-separated classroom ids (default: all, see --room-count)")
+    parser.add_argument("--room-count", type=int, default=30, help="Number of classrooms to drive (default: 30)")
+    parser.add_argument("--seats", type=int, default=48, help="Phones per classroom (default: 48)")
+    parser.add_argument("--duration", type=float, default=180, help="Length of the arrival curve in seconds (default: 180)")
+    parser.add_argument("--curve", choices=sorted(CURVES), default="burst", help="Arrival curve (default: burst)")
+    parser.add_argument("--mode", choices=("form", "batch"), default="form",
+                        help="Submit scans as form posts to checkin-XX.html or as JSON to /checkin/scan/batch "
+                             "like the seat page does (default: form)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent client threads (default: 64)")
+    parser.add_argument("--unknown-ratio", type=float, default=0.01, help="Fraction of scans with unknown ids (default: 0.01)")
+    parser.add_argument("--closed-ratio", type=float, default=0.0,
+                        help="Fraction of classrooms left with check-in closed (default: 0)")
+    parser.add_argument("--no-windows", action="store_true", help="Do not open/close check-in windows before the run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Write the report as JSON to this file")
+
+
+def main(args=None):
+    if args is None:
+        parser = argparse.ArgumentParser(description="Simulate a start-of-period scan storm against a check-in server.")
+        add_arguments(parser)
+        args = parser.parse_args()
+
+    rooms = [r.strip() for r in args.rooms.split(",")] if args.rooms else None
+    scenario = load_scenario(args.db, rooms=rooms, seats=args.seats)
+    if not rooms:
+        scenario = dict(list(scenario.items())[:args.room_count])
+    if not args.no_windows:
+        closed = set_windows(args.host, args.port, scenario, args.closed_ratio, seed=args.seed)
+        print(f"check-in open in {len(scenario) - len(closed)} classrooms, closed in {len(closed)}")
+    arrivals = build_schedule(scenario, args.duration, curve=args.curve,
+                              unknown_ratio=args.unknown_ratio, seed=args.seed)
+    result = run_load(args.host, args.port, arrivals, concurrency=args.concurrency, mode=args.mode)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,75 @@
+import time
+_IMPORT_START = time.perf_counter()
+
 import argparse
+import importlib
 from . import checkin_server
+from .startup import startup
+
+# 子命令 -> (模块, 说明)；模块只在运行该子命令时导入，启动服务器时不加载
+SUBCOMMANDS = {
+    "loadtest": ("loadgen", "Simulate a start-of-period scan storm against a running server"),
+    "gen-data": ("datagen", "Generate a deterministic synthetic checkin database"),
+    "archive": ("archive", "Move a closed term out of checkin into a compressed columnar archive"),
+    "backup": ("backup", "Take an online backup of the database without stopping the server"),
+}
+
+
+def run_subcommand(prog, command, argv):
+    """导入子命令模块，用它的 add_arguments 解析 argv 后运行 main"""
+    module_name, help_text = SUBCOMMANDS[command]
+    module = importlib.import_module(f".{module_name}", __package__)
+    parser = argparse.ArgumentParser(prog=f"{prog} {command}", description=help_text)
+    module.add_arguments(parser)
+    module.main(parser.parse_args(argv))
+
 
 def main():
     parser = argparse.ArgumentParser(description="Start the CIIT check-in server.")
     parser.add_argument("--host", type=str, default="127.0.0.1", help="Server host (default: 127.0.0.1)")
     parser.add_argument("--port", type=int, default=8000, help="Server port (default: 8000)")
-    parser.add_argument("--config", type=str, default=None, help="Path to room info config")
-    args = parser.parse_args()
+    parser.add_argument("-c", "--config", type=str, default=None, help="Path to room info config (room_info.yaml)")
+    parser.add_argument("--prune-classrooms", action="store_true",
+                        help="Delete classrooms that are not listed in --config (default: keep them)")
+    parser.add_argument("--profile-rate", type=float, default=None,
+                        help="Fraction of requests to profile with cProfile, 0-1 (default: CHECKIN_PROFILE_RATE or 0)")
+    parser.add_argument("--maintenance-window", type=str, default=None,
+                        help="Off-peak windows for database maintenance, e.g. 02:00-05:00,13:00-13:30 (default: 02:00-05:00)")
+    parser.add_argument("--backup-interval", type=float, default=None,
+                        help="Back up the database every N hours while serving (default: off)")
+    parser.add_argument("--backup-keep", type=int, default=14, help="Number of backups to keep (default: 14)")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="Disable per-student / per-IP scan rate limiting (e.g. for load tests)")
+    parser.add_argument("--trusted-proxy", type=str, default=None,
+                        help="Comma-separated reverse proxy addresses/networks whose X-Forwarded-For is used for "
+                             "per-IP rate limiting (default: CHECKIN_TRUSTED_PROXIES or none)")
+    parser.add_argument("--max-active", type=int, default=16,
+                        help="Requests processed concurrently before queueing by priority (default: 16)")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Print how long each startup phase took once the server is listening")
+    parser.add_argument("--no-prewarm", action="store_true",
+                        help="Do not preload QR/Excel libraries and caches after the socket is listening")
+    subparsers = parser.add_subparsers(dest="command")
+    for command, (_, help_text) in SUBCOMMANDS.items():
+        # 子命令的参数（包括 -h）原样交给 run_subcommand 解析
+        subparsers.add_parser(command, help=help_text, add_help=False)
+    args, extra = parser.parse_known_args()
+
+    if args.command:
+        run_subcommand(parser.prog, args.command, extra)
+        return
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
 
-    checkin_server(host=args.host, port=args.port, config=args.config)
+    startup.enabled = args.startup_profile
+    startup.begin(_IMPORT_START)
+    startup.mark("import cli")
+    checkin_server(host=args.host, port=args.port, config=args.config, prune_classrooms=args.prune_classrooms,
+                   profile_rate=args.profile_rate,
+                   maintenance_window=args.maintenance_window, backup_interval=args.backup_interval,
+                   backup_keep=args.backup_keep, rate_limit=not args.no_rate_limit,
+                   trusted_proxies=args.trusted_proxy,
+                   max_active=args.max_active, prewarm=not args.no_prewarm)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
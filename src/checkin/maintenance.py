@@ -0,0 +1,186 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+
+from . import database
+from .metrics import metrics
+from .occupancy import occupancy
+from .windows import checkin_windows, parse_hhmm
+
+# 任务名 -> 最小运行间隔（秒）
+JOB_INTERVALS = {
+    "purge_temp": 3600,
+    "wal_checkpoint": 3600,
+    "optimize": 24 * 3600,
+    "analyze": 24 * 3600,
+    "vacuum": 7 * 24 * 3600,
+}
+# 空闲页占比超过该值才执行 VACUUM
+VACUUM_FREE_RATIO = 0.2
+
+
+def parse_windows(spec):
+    """解析 '02:00-05:00,13:00-13:30' 为 [(start, end)]，跨零点的窗口如 '23:00-01:00' 也支持"""
+    windows = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition("-")
+        start, end = parse_hhmm(start), parse_hhmm(end)
+        if not sep or start is None or end is None:
+            raise ValueError(f"维护窗口应为 HH:MM-HH:MM: {part}")
+        windows.append((start, end))
+    return windows
+
+
+def in_windows(windows, now=None):
+    hhmm = (now or datetime.datetime.now()).strftime("%H:%M")
+    for start, end in windows:
+        if start <= end:
+            if start <= hhmm < end:
+                return True
+        elif hhmm >= start or hhmm < end:
+            return True
+    return False
+
+
+def _db_size(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_size, page_count, freelist
+
+
+def _wal_size():
+    try:
+        return os.path.getsize(database.DATABASE_PATH + "-wal")
+    except OSError:
+        return 0
+
+
+def job_purge_temp(ttl_seconds):
+    count = database.purge_stale_temp_checkins(ttl_seconds, keep_classrooms=checkin_windows.open_classrooms())
+    if count:
+        occupancy.invalidate()
+    receipts = database.purge_scan_receipts(ttl_seconds)
+    return f"删除 {count} 条过期临时签到数据、{receipts} 条批量扫码记录"
+
+
+def job_wal_checkpoint():
+    before = _wal_size()
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    try:
+        busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.close()
+    return f"检查点 {checkpointed}/{log_frames} 帧，WAL 文件 {before} -> {_wal_size()} 字节" + ("（有读者占用）" if busy else "")
+
+
+def job_optimize():
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    try:
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return "PRAGMA optimize 完成"
+
+
+def job_analyze():
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    try:
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return "ANALYZE 完成"
+
+
+def job_vacuum(force=False):
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    try:
+        page_size, page_count, freelist = _db_size(conn)
+        if not force and (not page_count or freelist / page_count < VACUUM_FREE_RATIO):
+            return f"空闲页 {freelist}/{page_count}，无需 VACUUM"
+        conn.execute("VACUUM")
+        _, after_count, _ = _db_size(conn)
+    finally:
+        conn.close()
+    return f"VACUUM 回收 {(page_count - after_count) * page_size} 字节"
+
+
+class MaintenanceScheduler:
+    """数据库维护调度器
+
+    每隔 check_interval 秒检查一次：只在配置的低峰时段内、且没有教室正在签到时，
+    依次运行到期的维护任务（清理过期临时数据、WAL 检查点、PRAGMA optimize、
+    ANALYZE、按需 VACUUM）。任务在独立线程中执行，不阻塞时间轮。
+    """
+
+    def __init__(self, windows="02:00-05:00", temp_ttl_hours=24, check_interval=600):
+        self.windows = parse_windows(windows)
+        self.temp_ttl = temp_ttl_hours * 3600
+        self.check_interval = check_interval
+        self.last_run = {}     # 任务名 -> 上次运行的 epoch 时间
+        self.reports = {}      # 任务名 -> {"at", "duration", "result"}
+        self._running = threading.Lock()
+        self._wheel = None
+
+    def start(self, wheel):
+        self._wheel = wheel
+        self._wheel.schedule(self.check_interval, self._tick)
+
+    def _tick(self):
+        try:
+            if in_windows(self.windows) and not checkin_windows.open_classrooms():
+                threading.Thread(target=self.run_due, name="checkin-maintenance", daemon=True).start()
+        finally:
+            self._wheel.schedule(self.check_interval, self._tick)
+
+    def _jobs(self, force=False):
+        return {
+            "purge_temp": lambda: job_purge_temp(self.temp_ttl),
+            "wal_checkpoint": job_wal_checkpoint,
+            "optimize": job_optimize,
+            "analyze": job_analyze,
+            "vacuum": lambda: job_vacuum(force=force),
+        }
+
+    def run_due(self, force=False):
+        """运行到期的任务；force=True 时忽略运行间隔（仍然不会在签到期间运行）"""
+        if not self._running.acquire(blocking=False):
+            return {}
+        try:
+            ran = {}
+            for name, job in self._jobs(force).items():
+                if not force and time.time() - self.last_run.get(name, 0) < JOB_INTERVALS[name]:
+                    continue
+                if checkin_windows.open_classrooms():
+                    ran["skipped"] = "有教室正在签到，停止维护"
+                    break
+                ran[name] = self.run_job(name, job)
+            return ran
+        finally:
+            self._running.release()
+
+    def run_job(self, name, job):
+        start = time.perf_counter()
+        try:
+            result = job()
+        except Exception as e:
+            result = f"失败: {e}"
+        duration = time.perf_counter() - start
+        metrics.observe("checkin_job_duration_seconds", duration, job=f"maintenance_{name}")
+        self.last_run[name] = time.time()
+        self.reports[name] = {
+            "at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "duration": duration,
+            "result": result,
+        }
+        print(f"[maintenance] {name}: {result} ({duration:.3f}s)")
+        return self.reports[name]
+
+
+# 进程内共享的维护调度器，由 run_server 配置并启动
+maintenance = MaintenanceScheduler()
@@ -0,0 +1,166 @@
+import bisect
+import collections
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# 延迟直方图的桶边界（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """固定桶直方图，另保留最近 window 个样本用于计算 p50/p95/p99"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=2048):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = collections.deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self, qs=QUANTILES):
+        samples = sorted(self.recent)
+        if not samples:
+            return {q: 0.0 for q in qs}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in qs}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    body = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """进程内指标注册表，按 Prometheus 文本格式导出"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = collections.defaultdict(dict)
+        self._gauges = collections.defaultdict(dict)
+        self._histograms = collections.defaultdict(dict)
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def gauge_add(self, name, value, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._gauges[name]
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[name][_labels(labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms[name]
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """with metrics.timer(...): 记录代码块耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """装饰器：记录函数调用耗时"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self, name):
+        """返回某个直方图各标签组合的 (count, sum, quantiles)，供页面展示"""
+        with self._lock:
+            return {
+                key: (hist.count, hist.sum, hist.quantiles())
+                for key, hist in self._histograms.get(name, {}).items()
+            }
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for kind, families in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(families):
+                    self._header(lines, name, kind)
+                    for key, value in sorted(families[name].items()):
+                        lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name in sorted(self._histograms):
+                series = sorted(self._histograms[name].items())
+                self._header(lines, name, "histogram")
+                for key, hist in series:
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(hist.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+                # 最近样本的分位数单独作为 summary 导出
+                recent = f"{name}_recent"
+                self._header(lines, recent, "summary", self._help.get(name, "") + " (recent window)")
+                for key, hist in series:
+                    for q, value in hist.quantiles().items():
+                        lines.append(f"{recent}{_format_labels(key, [('quantile', q)])} {_format_value(value)}")
+                    lines.append(f"{recent}_sum{_format_labels(key)} {_format_value(sum(hist.recent))}")
+                    lines.append(f"{recent}_count{_format_labels(key)} {len(hist.recent)}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, name, kind, text=None):
+        text = text if text is not None else self._help.get(name)
+        if text:
+            lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+# 进程内共享的指标注册表
+metrics = Metrics()
+metrics.describe("checkin_http_requests_total", "HTTP requests by route, method and status")
+metrics.describe("checkin_http_request_duration_seconds", "HTTP request latency by route")
+metrics.describe("checkin_http_requests_in_flight", "HTTP requests currently being handled")
+metrics.describe("checkin_http_rate_limited_total", "Requests rejected with 429 by route and limit")
+metrics.describe("checkin_admission_active", "Requests currently admitted for processing")
+metrics.describe("checkin_admission_queue_depth", "Requests waiting for admission by priority")
+metrics.describe("checkin_admission_shed_total", "Requests rejected with 503 by priority and reason")
+metrics.describe("checkin_occupancy_conflicts_total", "Scans hitting an occupied seat or made from several classrooms")
+metrics.describe("checkin_scan_batch_records_total", "Batch scan records by result status")
+metrics.describe("checkin_db_query_duration_seconds", "SQLite query latency by database function")
+metrics.describe("checkin_job_duration_seconds", "Background job duration (QR code, print file, maintenance, backup)")
@@ -0,0 +1,129 @@
+import sqlite3
+import threading
+import time
+
+from . import database
+
+
+class OccupancyIndex:
+    """checkin-temp 的内存索引：(教室, 座位) -> 学号集合，学号 -> {教室: 座位}
+
+    只记录有座位号的临时签到（即已在教室中签到的学生）。座位是否被占用以数据库为准
+    （database.claim_temp_seat 在写事务中检查）；扫码成功后用 record 更新索引并在常数
+    时间内得到该学生同时签到的其他教室，管理页面的冲突提示也来自索引。本进程写
+    checkin-temp 的地方都同步更新索引；其它进程的修改在索引与数据库不一致时、
+    开始签到或重置时、以及每 max_age 秒重新加载时同步。
+    """
+
+    def __init__(self, max_age=30.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._seats = {}      # (classroom_id, seat) -> {student_id}
+        self._presence = {}   # student_id -> {classroom_id: seat}
+        self._rooms = {}      # classroom_id -> {student_id: seat}
+
+    def _ensure_loaded(self):
+        if self._loaded and time.monotonic() - self._loaded_at < self.max_age:
+            return
+        conn = sqlite3.connect(database.DATABASE_PATH)
+        try:
+            rows = conn.execute(
+                'SELECT classroom_id, student_id, seat_number FROM "checkin-temp" WHERE seat_number IS NOT NULL'
+            ).fetchall()
+        finally:
+            conn.close()
+        self._seats.clear()
+        self._presence.clear()
+        self._rooms.clear()
+        for classroom_id, student_id, seat in rows:
+            self._add(student_id, classroom_id, seat)
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+
+    def _add(self, student_id, classroom_id, seat):
+        self._remove(student_id, classroom_id)
+        if seat is None:
+            return
+        self._seats.setdefault((classroom_id, seat), set()).add(student_id)
+        self._presence.setdefault(student_id, {})[classroom_id] = seat
+        self._rooms.setdefault(classroom_id, {})[student_id] = seat
+
+    def _remove(self, student_id, classroom_id):
+        rooms = self._presence.get(student_id)
+        if not rooms or classroom_id not in rooms:
+            return
+        key = (classroom_id, rooms.pop(classroom_id))
+        members = self._rooms[classroom_id]
+        del members[student_id]
+        if not members:
+            del self._rooms[classroom_id]
+        holders = self._seats.get(key)
+        if holders is not None:
+            holders.discard(student_id)
+            if not holders:
+                del self._seats[key]
+        if not rooms:
+            del self._presence[student_id]
+
+    def record(self, student_id, classroom_id, seat):
+        """数据库已确认占座后更新索引，返回该学生同时签到的其他教室列表
+
+        索引中该座位还有其他学生时说明索引已过期（其它进程删除或改动了临时数据），从数据库重新加载。
+        """
+        with self._lock:
+            self._ensure_loaded()
+            holders = self._seats.get((classroom_id, seat), ())
+            if any(h != student_id for h in holders):
+                self._loaded = False
+                self._ensure_loaded()
+            else:
+                self._add(student_id, classroom_id, seat)
+            return sorted(r for r in self._presence.get(student_id, {}) if r != classroom_id)
+
+    def release(self, student_id, classroom_id):
+        with self._lock:
+            self._ensure_loaded()
+            self._remove(student_id, classroom_id)
+
+    def reload_room(self, classroom_id, rows):
+        """用该教室最新的 (student_id, seat) 列表替换索引中的数据"""
+        with self._lock:
+            self._ensure_loaded()
+            for student_id in list(self._rooms.get(classroom_id, ())):
+                self._remove(student_id, classroom_id)
+            for student_id, seat in rows:
+                self._add(student_id, classroom_id, seat)
+
+    def clear_room(self, classroom_id):
+        self.reload_room(classroom_id, [])
+
+    def load(self):
+        """立即从数据库加载（启动预热时调用）"""
+        with self._lock:
+            self._ensure_loaded()
+
+    def invalidate(self):
+        """下次访问时从数据库重新加载（批量删除临时数据后调用）"""
+        with self._lock:
+            self._loaded = False
+
+    def conflicts(self, classroom_id):
+        """返回该教室的冲突：{"seats": {座位: [学号]}, "elsewhere": {学号: [其他教室]}}"""
+        with self._lock:
+            self._ensure_loaded()
+            seats = {}
+            elsewhere = {}
+            for student_id, seat in self._rooms.get(classroom_id, {}).items():
+                holders = self._seats[(classroom_id, seat)]
+                if len(holders) > 1:
+                    seats[seat] = sorted(holders)
+                others = [r for r in self._presence[student_id] if r != classroom_id]
+                if others:
+                    elsewhere[student_id] = sorted(others)
+            return {"seats": seats, "elsewhere": elsewhere}
+
+
+# 进程内共享的占座索引
+occupancy = OccupancyIndex()
@@ -0,0 +1,139 @@
+import os
+import random
+import re
+import threading
+
+PROFILE_DIR = os.path.join("data", "profiles")
+
+
+class RequestProfiler:
+    """按路由抽样的请求分析器
+
+    以 rate 的概率对请求运行 cProfile，同一路由的结果累加到一个 pstats.Stats
+    中。有新抽样的路由每 dump_interval 秒（或在分析页面点击时）由后台线程写入
+    data/profiles/<route>.pstats（可用 snakeviz、gprof2dot 等查看），请求线程不写文件。
+    cProfile 同一时刻只能有一个实例在运行，正在分析时其它请求直接跳过抽样。
+    """
+
+    def __init__(self, rate=0.0, routes=None, output_dir=PROFILE_DIR, dump_interval=60):
+        self.rate = rate
+        self.routes = set(routes) if routes else None
+        self.output_dir = output_dir
+        self.dump_interval = dump_interval
+        self._wheel = None
+        self._dirty = set()   # 上次写文件之后有新抽样的路由
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._samples = {}
+
+    def configure(self, rate=None, routes=None):
+        """设置抽样比例（0~1）及限定的路由名（None 表示全部路由）"""
+        if rate is not None:
+            self.rate = min(max(float(rate), 0.0), 1.0)
+        self.routes = set(routes) if routes else None
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def should_sample(self, route_name):
+        if self.rate <= 0:
+            return False
+        if self.routes is not None and route_name not in self.routes:
+            return False
+        return random.random() < self.rate
+
+    def run(self, route_name, func, *args):
+        """在 cProfile 下执行 func(*args)；已有请求在被分析时直接执行"""
+        if not self._busy.acquire(blocking=False):
+            return func(*args)
+        import cProfile  # 只在抽样时加载
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            self._busy.release()
+            self._aggregate(route_name, profile)
+
+    def _aggregate(self, route_name, profile):
+        import pstats
+        with self._lock:
+            stats = self._stats.get(route_name)
+            if stats is None:
+                stats = self._stats[route_name] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            self._samples[route_name] = self._samples.get(route_name, 0) + 1
+            self._dirty.add(route_name)
+
+    def dump(self):
+        """把有新抽样的路由写入 output_dir/<route>.pstats，返回写入的文件数"""
+        import marshal
+        # 加锁时只做序列化（与 pstats.Stats.dump_stats 的格式相同），写文件在锁外进行
+        with self._lock:
+            pending = {name: marshal.dumps(self._stats[name].stats) for name in self._dirty if name in self._stats}
+            self._dirty.clear()
+        if pending:
+            os.makedirs(self.output_dir, exist_ok=True)
+        for route_name, data in pending.items():
+            path = os.path.join(self.output_dir, re.sub(r'[^\w.-]+', '_', route_name) + ".pstats")
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        return len(pending)
+
+    def start(self, wheel):
+        """挂到时间轮上，定时把新的抽样结果写入文件"""
+        self._wheel = wheel
+        self._wheel.schedule(self.dump_interval, self._tick)
+
+    def _tick(self):
+        try:
+            if self._dirty:
+                threading.Thread(target=self.dump, name="checkin-profile-dump", daemon=True).start()
+        finally:
+            self._wheel.schedule(self.dump_interval, self._tick)
+
+    def summary(self, limit=10):
+        """返回 {route: {"samples": n, "top": [(函数, 调用次数, 自身耗时, 累计耗时), ...]}}"""
+        result = {}
+        with self._lock:
+            for route_name, stats in self._stats.items():
+                rows = []
+                for (filename, lineno, funcname), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+                    where = f"{os.path.basename(filename)}:{lineno}({funcname})" if lineno else funcname
+                    rows.append((where, ncalls, tottime, cumtime))
+                rows.sort(key=lambda r: r[3], reverse=True)
+                result[route_name] = {"samples": self._samples.get(route_name, 0), "top": rows[:limit]}
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._samples.clear()
+            self._dirty.clear()
+
+
+def _rate_from_env():
+    """CHECKIN_PROFILE_RATE 取值无效时忽略（不影响服务启动），有效值限制在 0~1"""
+    value = os.environ.get("CHECKIN_PROFILE_RATE", "").strip()
+    if not value:
+        return 0.0
+    try:
+        rate = float(value)
+    except ValueError:
+        rate = None
+    if rate is None or rate != rate:   # 无法解析或 NaN
+        print(f"Ignoring invalid CHECKIN_PROFILE_RATE: {value!r}")
+        return 0.0
+    return min(max(rate, 0.0), 1.0)
+
+
+def _routes_from_env():
+    value = os.environ.get("CHECKIN_PROFILE_ROUTES", "")
+    return [r.strip() for r in value.split(",") if r.strip()] or None
+
+
+# 进程内共享的分析器；CHECKIN_PROFILE_RATE / CHECKIN_PROFILE_ROUTES 环境变量可直接开启
+profiler = RequestProfiler(rate=_rate_from_env(), routes=_routes_from_env())
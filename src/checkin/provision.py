@@ -0,0 +1,80 @@
+import re
+import threading
+
+from .database import get_all_classrooms, sync_classrooms
+
+# 与路由中的 {classroom_id:room} 一致，否则教室页面无法访问
+_ROOM_ID_RE = re.compile(r"\d{3,4}")
+
+
+def load_room_info(path):
+    """读取 room_info.yaml，返回 ({教室ID: (row, column)}, public_ip)，格式错误抛出 ValueError"""
+    import yaml  # 只在启动和重新加载配置时需要
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: 顶层应为映射")
+    rooms = {}
+    for i, item in enumerate(data.get("classrooms") or []):
+        try:
+            classroom_id = str(item["id"])
+            row, column = int(item.get("row", 4)), int(item.get("column", 12))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{path}: 第 {i + 1} 个教室缺少 id 或行列数无效")
+        if not _ROOM_ID_RE.fullmatch(classroom_id):
+            raise ValueError(f"{path}: 教室ID {classroom_id} 应为 3~4 位数字")
+        if row < 1 or column < 1:
+            raise ValueError(f"{path}: 教室 {classroom_id} 的行列数必须为正数")
+        if classroom_id in rooms:
+            raise ValueError(f"{path}: 教室ID {classroom_id} 重复")
+        rooms[classroom_id] = (row, column)
+    public_ip = data.get("public_ip")
+    return rooms, str(public_ip) if public_ip else None
+
+
+def diff_classrooms(desired, existing):
+    """比较配置与数据库中的教室，返回 (新增, 修改, 仅存在于数据库) 的教室ID列表"""
+    added = sorted(cid for cid in desired if cid not in existing)
+    updated = sorted(cid for cid in desired if cid in existing and existing[cid] != desired[cid])
+    extra = sorted(cid for cid in existing if cid not in desired)
+    return added, updated, extra
+
+
+class RoomConfig:
+    """room_info.yaml 与 classrooms 表的同步
+
+    启动时和重新加载时读取配置，与数据库比较后在一个事务中批量写入差异。
+    只在数据库中存在的教室（如通过管理页面添加的）默认保留，prune=True 时删除。
+    """
+
+    def __init__(self, path=None, prune=False):
+        self.path = path
+        self.prune = prune
+        self.public_ip = None
+        self.last_result = None
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """重新读取配置并同步，返回 {"added", "updated", "removed", "kept", "public_ip"}"""
+        if not self.path:
+            raise ValueError("未指定教室配置文件")
+        with self._lock:
+            desired, public_ip = load_room_info(self.path)
+            existing = {room["id"]: (room["row"], room["column"]) for room in get_all_classrooms()}
+            added, updated, extra = diff_classrooms(desired, existing)
+            removed = extra if self.prune else []
+            if added or updated or removed:
+                sync_classrooms([(cid, *desired[cid]) for cid in added + updated], removed)
+            self.public_ip = public_ip
+            self.last_result = {
+                "added": added,
+                "updated": updated,
+                "removed": removed,
+                "kept": [] if self.prune else extra,
+                "public_ip": public_ip,
+            }
+            return self.last_result
+
+
+# 进程内共享的教室配置，由 run_server 设置路径
+room_config = RoomConfig()
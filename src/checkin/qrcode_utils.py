@@ -1,9 +1,5 @@
 import os
 import subprocess
-import qrcode
-from qrcode.constants import ERROR_CORRECT_L
-import qrcode.image.pil as qrcode_image_pil
-from PIL import ImageDraw, ImageFont
 
 def generate_qr_codes(handler, classroom_id):
     """
@@ -11,6 +7,12 @@ def generate_qr_codes(handler, classroom_id):
     classroom_id: 教室 id 字符串
     返回: True / False
     """
+    # qrcode 和 PIL 导入较慢，只在生成二维码时加载
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_L
+    import qrcode.image.pil as qrcode_image_pil
+    from PIL import ImageDraw, ImageFont
+
     classroom_id, row, col = handler._get_room_config(classroom_id)
     if not classroom_id:
         return False
@@ -0,0 +1,129 @@
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """按键独立计数的令牌桶：每个键每秒补充 rate 个令牌，最多积累 burst 个"""
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # key -> [剩余令牌, 上次更新时间]，按最近使用排序
+
+    def take(self, key, now=None):
+        """取一个令牌；成功返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._sweep(now)
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+    def _sweep(self, now):
+        # 从最久未使用的一端淘汰：已经补满的桶与新建的桶等价，可以直接丢弃；
+        # 仍超过 max_keys 时淘汰最久未使用的桶，保证表的大小有上限
+        refill = self.burst / self.rate
+        while self._buckets:
+            last = next(iter(self._buckets.values()))[1]
+            if now - last < refill and len(self._buckets) < self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+
+class RateLimit:
+    """路由上的一条限流规则
+
+    key(handler, params) 返回限流键（如客户端 IP、学号），返回 None 时不限流。
+    给出 setting 时可用环境变量 CHECKIN_RATE_LIMIT_<SETTING>=速率/突发（如 20/100）覆盖默认额度。
+    压测或基准测试时可把 RateLimit.enabled 设为 False 关闭全部限流。
+    """
+
+    enabled = True
+
+    def __init__(self, name, rate, burst, key, setting=None):
+        self.name = name
+        self.key = key
+        if setting:
+            rate, burst = _limit_from_env(f"CHECKIN_RATE_LIMIT_{setting.upper()}", rate, burst)
+        self.bucket = TokenBucket(rate, burst)
+
+    def check(self, handler, params):
+        """返回需要等待的秒数，0 表示放行"""
+        return self.check_key(self.key(handler, params))
+
+    def check_key(self, key):
+        """按给定的键计数（批量扫码时逐条记录调用），返回需要等待的秒数"""
+        if not self.enabled or key is None:
+            return 0.0
+        return self.bucket.take(key)
+
+
+def _limit_from_env(name, rate, burst):
+    """读取 '速率/突发' 形式的环境变量，取值无效时忽略（不影响服务启动）"""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return rate, burst
+    try:
+        env_rate, _, env_burst = value.partition("/")
+        env_rate = float(env_rate)
+        env_burst = float(env_burst) if env_burst.strip() else burst
+    except ValueError:
+        env_rate = env_burst = 0
+    if not (env_rate > 0 and env_burst >= 1):   # 同时排除 NaN
+        print(f"Ignoring invalid {name}: {value!r}")
+        return rate, burst
+    return env_rate, env_burst
+
+
+def parse_proxies(spec):
+    """解析 '127.0.0.1,10.0.0.0/8' 为网段列表，格式错误抛出 ValueError"""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in (spec or "").split(",") if part.strip()]
+
+
+# 可信的反向代理地址；只有直连地址在其中时才采用 X-Forwarded-For / X-Real-IP
+trusted_proxies = []
+
+
+def set_trusted_proxies(spec):
+    trusted_proxies[:] = parse_proxies(spec)
+
+
+def _is_trusted(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_ip(handler, params):
+    """客户端 IP：直连地址是可信代理时，取 X-Forwarded-For 中从右数第一个非代理地址，其次是 X-Real-IP"""
+    peer = handler.client_address[0]
+    if not trusted_proxies or not _is_trusted(peer):
+        return peer
+    forwarded = [hop.strip() for hop in (handler.headers.get("X-Forwarded-For") or "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if not _is_trusted(hop):
+            return hop
+    if forwarded:
+        return forwarded[0]
+    return (handler.headers.get("X-Real-IP") or "").strip() or peer
+
+
+def retry_after(wait):
+    """Retry-After 头的值（整秒，至少 1）"""
+    return str(max(1, math.ceil(wait)))
@@ -0,0 +1,160 @@
+import re
+import time
+
+# 路径参数类型：{name:type}，未写类型时默认为 str
+CONVERTERS = {
+    "str": r"[^/]+",
+    "room": r"\d{3,4}",
+    "seq": r"\d{2}",
+    "path": r".+",
+}
+
+DEFAULT_MAX_BODY = 1024 * 1024  # 默认请求体上限 1 MiB
+
+_PARAM_RE = re.compile(r"\{(\w+)(?::(\w+))?\}")
+
+
+class Route:
+    """一条路由：处理函数 + 元数据（请求体上限、允许的 Content-Type 等）"""
+
+    __slots__ = ("method", "pattern", "func", "name", "max_body", "content_types", "meta")
+
+    def __init__(self, method, pattern, func, name=None, max_body=DEFAULT_MAX_BODY,
+                 content_types=None, **meta):
+        self.method = method
+        self.pattern = pattern
+        self.func = func
+        self.name = name or func.__name__
+        self.max_body = max_body
+        self.content_types = tuple(content_types) if content_types else None
+        self.meta = meta
+
+    def accepts(self, content_type):
+        """检查请求的 Content-Type 是否被允许（未声明或请求未带类型时放行）"""
+        if not self.content_types or not content_type:
+            return True
+        base = content_type.split(";", 1)[0].strip().lower()
+        return base in self.content_types
+
+
+class _Node:
+    __slots__ = ("literals", "params", "rest", "routes")
+
+    def __init__(self):
+        self.literals = {}   # 固定路径段 -> 子节点
+        self.params = []     # [(编译后的段正则, 参数名列表, 子节点)]
+        self.rest = None     # (参数名, 子节点)，匹配剩余全部路径
+        self.routes = {}     # method -> Route
+
+
+class Router:
+    """路径段前缀树路由
+
+    纯静态路径通过 (method, path) 字典 O(1) 命中；带参数的路径按段在前缀树中
+    查找，固定段优先于参数段。段内参数（如 checkin-{seq:seq}.html）在注册时编译。
+    """
+
+    def __init__(self):
+        self._static = {}
+        self._root = _Node()
+        self._hooks = []
+        self.routes = []
+
+    def route(self, method, pattern, **options):
+        """装饰器：注册处理函数 func(handler, **path_params)"""
+        def decorator(func):
+            self.add(method, pattern, func, **options)
+            return func
+        return decorator
+
+    def add(self, method, pattern, func, **options):
+        route = Route(method, pattern, func, **options)
+        self.routes.append(route)
+        if "{" not in pattern:
+            self._static[(method, pattern)] = route
+            return route
+
+        node = self._root
+        segments = pattern.strip("/").split("/")
+        for i, segment in enumerate(segments):
+            names = _PARAM_RE.findall(segment)
+            if not names:
+                node = node.literals.setdefault(segment, _Node())
+                continue
+            if names[0][1] == "path":
+                if i != len(segments) - 1 or segment != "{%s:path}" % names[0][0]:
+                    raise ValueError(f"path 参数只能作为最后一个完整路径段: {pattern}")
+                if node.rest is None:
+                    node.rest = (names[0][0], _Node())
+                node = node.rest[1]
+                break
+            regex = self._compile_segment(segment)
+            for existing, _, child in node.params:
+                if existing.pattern == regex.pattern:
+                    node = child
+                    break
+            else:
+                child = _Node()
+                node.params.append((regex, [n for n, _ in names], child))
+                node = child
+        node.routes[method] = route
+        return route
+
+    @staticmethod
+    def _compile_segment(segment):
+        parts = []
+        pos = 0
+        for m in _PARAM_RE.finditer(segment):
+            parts.append(re.escape(segment[pos:m.start()]))
+            parts.append("(%s)" % CONVERTERS[m.group(2) or "str"])
+            pos = m.end()
+        parts.append(re.escape(segment[pos:]))
+        return re.compile("".join(parts))
+
+    def resolve(self, method, path):
+        """返回 (route, params)；未匹配时 route 为 None"""
+        route = self._static.get((method, path))
+        if route is not None:
+            return route, {}
+        if not path.startswith("/"):
+            return None, {}
+        node = self._match(self._root, path.strip("/").split("/"), 0, {})
+        if node is None:
+            return None, {}
+        node, params = node
+        return node.routes.get(method), params
+
+    def _match(self, node, segments, i, params):
+        if i == len(segments):
+            return (node, params) if node.routes else None
+        segment = segments[i]
+        child = node.literals.get(segment)
+        if child is not None:
+            found = self._match(child, segments, i + 1, params)
+            if found is not None:
+                return found
+        for regex, names, child in node.params:
+            m = regex.fullmatch(segment)
+            if m is None:
+                continue
+            found = self._match(child, segments, i + 1, dict(params, **dict(zip(names, m.groups()))))
+            if found is not None:
+                return found
+        if node.rest is not None and segment:
+            name, child = node.rest
+            return child, dict(params, **{name: "/".join(segments[i:])})
+        return None
+
+    def add_hook(self, hook):
+        """注册耗时回调 hook(route, handler, elapsed_seconds)，每次请求处理结束后调用"""
+        self._hooks.append(hook)
+
+    def call(self, route, handler, params):
+        """执行路由处理函数并回调耗时钩子"""
+        start = time.perf_counter()
+        try:
+            return route.func(handler, **params)
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in self._hooks:
+                hook(route, handler, elapsed)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+
+class Timer:
+    """时间轮中的一个定时任务，可通过 cancel() 取消"""
+
+    __slots__ = ("callback", "args", "rounds", "cancelled")
+
+    def __init__(self, callback, args, rounds):
+        self.callback = callback
+        self.args = args
+        self.rounds = rounds
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """哈希时间轮：每 tick 秒前进一格，schedule 为 O(1)
+
+    超过一圈的延迟通过 rounds 计数处理。回调在时间轮线程中执行，
+    耗时任务应自行转交给其它线程。
+    """
+
+    def __init__(self, tick=1.0, slots=3600):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def schedule(self, delay, callback, *args):
+        """delay 秒后执行 callback(*args)，返回 Timer"""
+        ticks = max(1, int(round(delay / self.tick)))
+        with self._lock:
+            rounds, offset = divmod(ticks, len(self._slots))
+            if offset == 0:
+                rounds, offset = rounds - 1, len(self._slots)
+            timer = Timer(callback, args, rounds)
+            self._slots[(self._cursor + offset) % len(self._slots)].append(timer)
+        return timer
+
+    def schedule_at(self, when, callback, *args):
+        """在 epoch 时间 when 执行 callback(*args)"""
+        return self.schedule(when - time.time(), callback, *args)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="checkin-timer-wheel", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        next_tick = time.monotonic() + self.tick
+        while not self._stop.wait(max(0.0, next_tick - time.monotonic())):
+            next_tick += self.tick
+            self._advance()
+
+    def _advance(self):
+        with self._lock:
+            self._cursor = (self._cursor + 1) % len(self._slots)
+            slot = self._slots[self._cursor]
+            due = [t for t in slot if t.rounds == 0 and not t.cancelled]
+            pending = []
+            for t in slot:
+                if t.cancelled or t.rounds == 0:
+                    continue
+                t.rounds -= 1
+                pending.append(t)
+            self._slots[self._cursor] = pending
+        for t in due:
+            try:
+                t.callback(*t.args)
+            except Exception as e:
+                print(f"Timer callback failed: {e}")
+
+
+# 进程内共享的时间轮，由 run_server 启动
+timer_wheel = TimerWheel()
@@ -0,0 +1,79 @@
+import bisect
+import sqlite3
+import threading
+
+from . import database
+
+
+class StudentIndex:
+    """学生名单的前缀索引：学号和姓名各一个有序数组，用二分查找定位前缀区间
+
+    索引在首次查询时从 students 表构建，导入或删除名单后调用 invalidate，
+    下次查询时重建。重建时先生成新数组再整体替换，查询不需要加锁。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None   # (学号键, 姓名键, 学生列表)
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _load(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None:
+                conn = sqlite3.connect(database.DATABASE_PATH)
+                try:
+                    students = conn.execute(
+                        "SELECT student_id, name, class_name FROM students ORDER BY student_id"
+                    ).fetchall()
+                finally:
+                    conn.close()
+                # 键为 (文本, 下标)，下标指向 students，同名学生按学号排列
+                by_id = [(s[0], i) for i, s in enumerate(students)]
+                by_name = sorted((s[1], i) for i, s in enumerate(students))
+                self._snapshot = (by_id, by_name, students)
+            return self._snapshot
+
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        """依次产出以 prefix 开头的键对应的下标"""
+        for pos in range(bisect.bisect_left(keys, (prefix,)), len(keys)):
+            text, i = keys[pos]
+            if not text.startswith(prefix):
+                return
+            yield i
+
+    def lookup(self, student_id):
+        """按学号精确查找，返回 (student_id, name, class_name) 或 None"""
+        by_id, _, students = self._load()
+        pos = bisect.bisect_left(by_id, (student_id,))
+        if pos < len(by_id) and by_id[pos][0] == student_id:
+            return students[by_id[pos][1]]
+        return None
+
+    def search(self, prefix, limit=10, class_name=None):
+        """学号或姓名以 prefix 开头的学生，学号精确匹配排在最前"""
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        by_id, by_name, students = self._load()
+        seen = set()
+        results = []
+        for keys in (by_id, by_name):
+            for i in self._prefix_range(keys, prefix):
+                if len(results) >= limit:
+                    break
+                if i in seen or (class_name is not None and students[i][2] != class_name):
+                    continue
+                seen.add(i)
+                results.append(students[i])
+        results.sort(key=lambda s: (s[0] != prefix, s[0]))
+        return results[:limit]
+
+
+# 进程内共享的名单索引
+student_index = StudentIndex()
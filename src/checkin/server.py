@@ -1,16 +1,116 @@
-from http.server import HTTPServer
+import importlib
+import os
+import signal
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from typing import Optional
 from .checkinhandler import CheckinHandler
-from .database import init_database
+from .admission import admission
+from .backup import backups
+from .database import init_database, ping_database
+from .maintenance import maintenance, parse_windows
+from .occupancy import occupancy
+from .profiling import profiler
+from .provision import room_config
+from .ratelimit import RateLimit, set_trusted_proxies
+from .scheduler import timer_wheel
+from .startup import startup
+from .windows import checkin_windows
 
-def run_server(host: str = "127.0.0.1", port: int = 8000):
+def _sync_room_config():
+    """按 room_info.yaml 同步教室并设置 public_ip，打印变更摘要"""
+    result = room_config.sync()
+    if result["public_ip"]:
+        CheckinHandler.public_ip = result["public_ip"]
+    print(f"Room config {room_config.path}: {len(result['added'])} added, {len(result['updated'])} updated, "
+          f"{len(result['removed'])} removed, {len(result['kept'])} kept (not in config)")
+    return result
+
+
+# 开始监听后在后台预先加载的模块：二维码、打印文件和导出 Excel 时才用到
+PREWARM_MODULES = ("qrcode", "qrcode.image.pil", "PIL.ImageDraw", "PIL.ImageFont", "openpyxl")
+
+
+def _prewarm():
+    """后台预热：导入较慢的可选依赖，加载占座索引并打开一次数据库，不影响已经开始的扫码请求"""
+    start = time.perf_counter()
+    for name in PREWARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    ping_database()
+    occupancy.load()
+    if startup.enabled:
+        print(f"Prewarm finished in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def run_server(host: str = "127.0.0.1", port: int = 8000, room_info_path: Optional[str] = None,
+               prune_classrooms: bool = False, keepalive_timeout: float = 15,
+               profile_rate: Optional[float] = None, maintenance_window: Optional[str] = None,
+               temp_ttl_hours: float = 24, backup_interval: Optional[float] = None, backup_keep: int = 14,
+               rate_limit: bool = True, trusted_proxies: Optional[str] = None,
+               max_active: int = 16, prewarm: bool = True):
     # 初始化数据库
     init_database()
+    # 上次归档在删除提交之后中断时，把清单中的 pending 学期标记为完成
+    if os.path.exists(os.path.join("data", "archive", "manifest.json")):
+        from .archive import recover_pending_terms
+        for term, status in recover_pending_terms(discard=False).items():
+            print(f"Archive term {term}: interrupted archive {status}")
+    startup.mark("init database")
     
     # 设置 public_ip
     CheckinHandler.public_ip = host
+    # 按 room_info.yaml 批量同步教室（配置中的 public_ip 优先），SIGHUP 时重新加载
+    if room_info_path:
+        room_config.path = room_info_path
+        room_config.prune = prune_classrooms
+        _sync_room_config()
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: _sync_room_config())
+        startup.mark("room config")
+    # 持久连接的空闲超时
+    CheckinHandler.timeout = keepalive_timeout
+    # 扫码限流（压测时可关闭）
+    RateLimit.enabled = rate_limit
+    # 部署在反向代理之后时，只信任这些地址转发的 X-Forwarded-For / X-Real-IP
+    if trusted_proxies is None:
+        trusted_proxies = os.environ.get("CHECKIN_TRUSTED_PROXIES")
+    set_trusted_proxies(trusted_proxies)
+    # 同时处理的请求数上限，超出时按优先级排队（扫码 > 管理页面 > 导出/二维码）
+    admission.max_active = max_active
+
+    # 请求抽样分析（也可通过 CHECKIN_PROFILE_RATE 或管理页面开启）
+    if profile_rate is not None:
+        profiler.configure(rate=profile_rate, routes=profiler.routes)
+
+    # 启动时间轮，按时间表自动开始/结束签到
+    timer_wheel.start()
+    checkin_windows.start(timer_wheel)
+
+    # 低峰时段的数据库维护（清理过期临时数据、WAL 检查点、ANALYZE 等）
+    if maintenance_window is not None:
+        maintenance.windows = parse_windows(maintenance_window)
+    maintenance.temp_ttl = temp_ttl_hours * 3600
+    maintenance.start(timer_wheel)
+    # 请求分析结果定时写入 data/profiles/
+    profiler.start(timer_wheel)
+
+    # 定时在线备份（backup_interval 为小时数，None 表示不开启）
+    backups.interval = backup_interval * 3600 if backup_interval else None
+    backups.keep = backup_keep
+    backups.start(timer_wheel)
+    startup.mark("background tasks")
     
     addr = (host, int(port))
-    server = HTTPServer(addr, CheckinHandler)
+    # HTTP/1.1 持久连接会占住处理线程，必须使用多线程服务器
+    server = ThreadingHTTPServer(addr, CheckinHandler)
+    startup.mark("listen")
+    startup.report()
+    if prewarm:
+        threading.Thread(target=_prewarm, name="checkin-prewarm", daemon=True).start()
     print(f"Serving on http://{addr[0]}:{addr[1]}/checkin/")
     print(f"Manage config at http://{addr[0]}:{addr[1]}/checkin/manage.html")
     try:
@@ -18,8 +118,10 @@ def run_server(host: str = "127.0.0.1", port: int = 8000):
     except KeyboardInterrupt:
         print("Shutting down server...")
         server.server_close()
+        timer_wheel.stop()
+        profiler.dump()
     return server
 
 
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    run_server()
@@ -0,0 +1,37 @@
+import time
+
+
+class StartupProfile:
+    """记录服务器启动各阶段耗时，checkin --startup-profile 时在开始监听后打印"""
+
+    def __init__(self):
+        self.enabled = False
+        self.phases = []
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def begin(self, at=None):
+        """从 at（perf_counter 时间，默认现在）开始计时"""
+        self._start = self._last = at if at is not None else time.perf_counter()
+        self.phases = []
+
+    def mark(self, name):
+        """记录从上一个阶段结束到现在的耗时"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def total(self):
+        return self._last - self._start
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("Startup profile:")
+        for name, elapsed in self.phases:
+            print(f"  {name:24s} {elapsed * 1000:9.1f} ms")
+        print(f"  {'total (ready to serve)':24s} {self.total() * 1000:9.1f} ms")
+
+
+# 进程内共享的启动计时
+startup = StartupProfile()
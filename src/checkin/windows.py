@@ -0,0 +1,133 @@
+import datetime
+import re
+import threading
+import time
+
+from .database import get_checkin_windows, set_checkin_enabled, set_checkin_schedule
+
+_TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+def parse_hhmm(value):
+    """把 'HH:MM' 规范化为两位格式，空值返回 None，格式错误抛出 ValueError"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    m = _TIME_RE.match(value)
+    if not m:
+        raise ValueError(f"无效的时间格式: {value}")
+    return f"{int(m.group(1)):02d}:{m.group(2)}"
+
+
+def next_occurrence(hhmm, now=None):
+    """返回下一次到达每日时刻 hhmm 的 epoch 时间（本地时区）"""
+    now = now or datetime.datetime.now()
+    hour, minute = map(int, hhmm.split(":"))
+    when = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if when <= now:
+        when += datetime.timedelta(days=1)
+    return when.timestamp()
+
+
+class CheckinWindows:
+    """签到窗口状态
+
+    状态持久化在 checkin_windows 表中，重启不丢失，多个进程共享同一数据库。
+    扫码路径只查询进程内字典（O(1)），字典每 refresh_interval 秒从数据库
+    重新加载一次，以感知其它进程的修改；其它进程修改了时间表的教室会重新安排定时器。
+    """
+
+    def __init__(self, refresh_interval=1.0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._loaded_at = 0.0
+        self._wheel = None
+        self._timers = {}
+        self._armed = {}   # classroom_id -> 定时器对应的 (open_time, close_time)
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._loaded_at < self.refresh_interval:
+            return
+        windows = {w["classroom_id"]: w for w in get_checkin_windows()}
+        with self._lock:
+            self._windows = windows
+            self._loaded_at = now
+            changed = [] if self._wheel is None else [
+                cid for cid in set(windows) | set(self._armed)
+                if self._armed.get(cid) != self._schedule_of(windows.get(cid))
+            ]
+        for classroom_id in changed:
+            self._schedule_room(classroom_id)
+
+    @staticmethod
+    def _schedule_of(window):
+        return (window["open_time"], window["close_time"]) if window else (None, None)
+
+    def is_open(self, classroom_id):
+        self._refresh()
+        window = self._windows.get(classroom_id)
+        return bool(window and window["enabled"])
+
+    def get(self, classroom_id):
+        self._refresh()
+        return self._windows.get(classroom_id) or {
+            "classroom_id": classroom_id, "enabled": False, "open_time": None, "close_time": None, "changed_at": 0
+        }
+
+    def open_classrooms(self):
+        """返回当前开放签到的教室集合"""
+        self._refresh()
+        return {cid for cid, w in self._windows.items() if w["enabled"]}
+
+    def set_enabled(self, classroom_id, enabled):
+        set_checkin_enabled(classroom_id, enabled)
+        self._refresh(force=True)
+
+    def set_schedule(self, classroom_id, open_time, close_time):
+        """设置每日自动开始/结束时间，时间格式 HH:MM，空值表示取消"""
+        open_time = parse_hhmm(open_time)
+        close_time = parse_hhmm(close_time)
+        set_checkin_schedule(classroom_id, open_time, close_time)
+        self._refresh(force=True)
+        self._schedule_room(classroom_id)
+
+    def start(self, wheel):
+        """挂到时间轮上，为所有设置了时间表的教室安排下一次自动开始/结束"""
+        self._wheel = wheel
+        # 尚未安排定时器的教室都视为时间表有变化，由 _refresh 统一安排
+        self._refresh(force=True)
+
+    def _schedule_room(self, classroom_id):
+        if self._wheel is None:
+            return
+        with self._lock:
+            for timer in self._timers.pop(classroom_id, []):
+                timer.cancel()
+            window = self._windows.get(classroom_id)
+            self._armed.pop(classroom_id, None)
+            if not window:
+                return
+            timers = []
+            for key, enabled in (("open_time", True), ("close_time", False)):
+                if window[key]:
+                    timers.append(self._wheel.schedule_at(
+                        next_occurrence(window[key]), self._fire, classroom_id, key, window[key], enabled))
+            self._timers[classroom_id] = timers
+            self._armed[classroom_id] = self._schedule_of(window)
+
+    def _fire(self, classroom_id, key, hhmm, enabled):
+        # 多个进程同时触发时写入的是相同的值，操作幂等；
+        # 定时器安排之后时间表被其它进程修改（或取消）时不执行
+        self._refresh(force=True)
+        window = self._windows.get(classroom_id)
+        if window and window[key] == hhmm:
+            set_checkin_enabled(classroom_id, enabled)
+            print(f"Checkin {'opened' if enabled else 'closed'} by schedule for classroom {classroom_id}")
+        self._schedule_room(classroom_id)
+        self._refresh(force=True)
+
+
+# 进程内共享的签到窗口状态
+checkin_windows = CheckinWindows()